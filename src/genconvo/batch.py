@@ -0,0 +1,237 @@
+"""
+Batch runner for GenConvo: many (document, prompt_type) jobs in one process.
+
+All jobs share one SharedWorkerPool, so the configured worker count is a global
+cap, and one set of provider rate limiters (verdict keeps these per provider in
+PROVIDER_RATE_LIMITER). A failing job is recorded and does not stop the others.
+"""
+
+import fnmatch
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import config  # noqa: F401  (registers Anthropic rate limits with verdict)
+from .clients.base import CartridgeConfig
+from .synthesizer import GenConvoSynthesizer
+from .tokasaurus_backend import TokasaurusBackend
+from .utils.journal import RunJournal
+from .utils.metrics import RunMetrics
+from .utils.prompt_cache import DocumentCacheWarmup
+from .utils.response_cache import ResponseCache
+from .utils.retrieval import RetrievalConfig
+from .utils.worker_pool import SharedWorkerPool
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """One unit of batch work: a document and the prompt type(s) run in one pipeline."""
+    doc_name: str
+    prompt_types: Tuple[str, ...]
+
+    @property
+    def prompt_type(self) -> str:
+        return "+".join(self.prompt_types)
+
+    @property
+    def filename(self) -> str:
+        return f"{self.doc_name}.md"
+
+
+@dataclass
+class BatchJobResult:
+    """Outcome of a single batch job."""
+    doc_name: str
+    prompt_type: str
+    status: str  # "ok" or "failed"
+    dataset_path: Optional[str] = None
+    dataset_paths: Dict[str, str] = field(default_factory=dict)
+    total_questions: Optional[int] = None
+    error: Optional[str] = None
+    elapsed_seconds: float = 0.0
+    context: Dict[str, Any] = field(default_factory=dict)
+    cartridge_comparison: Optional[Dict[str, Any]] = None
+    retrieval: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _strip_md(name: str) -> str:
+    return name[:-3] if name.endswith(".md") else name
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """Read document names from a manifest file.
+
+    One document name per line; blank lines and lines starting with '#' are ignored.
+    A trailing '.md' is accepted and stripped.
+    """
+    names = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            names.append(_strip_md(line))
+    return names
+
+
+def resolve_doc_names(
+    dataset_directory: str,
+    doc_names: Iterable[str] = (),
+    pattern: Optional[str] = None,
+    manifest: Optional[str] = None,
+) -> List[str]:
+    """Combine explicit names, a glob over `<dataset_directory>/*.md` and a manifest.
+
+    Order is preserved and duplicates are dropped.
+    """
+    names: List[str] = [_strip_md(n) for n in doc_names]
+
+    if pattern is not None:
+        pattern = pattern if pattern.endswith(".md") else f"{pattern}.md"
+        matches = sorted(
+            p.name for p in Path(dataset_directory).glob("*.md") if fnmatch.fnmatch(p.name, pattern)
+        )
+        names.extend(_strip_md(m) for m in matches)
+
+    if manifest is not None:
+        names.extend(read_manifest(manifest))
+
+    return list(dict.fromkeys(names))
+
+
+def build_jobs(
+    doc_names: Iterable[str], prompt_types: Iterable[str], single_pipeline: bool = False
+) -> List[BatchJob]:
+    """Cartesian product of documents and prompt types, document-major.
+
+    With `single_pipeline`, each document gets one job covering every prompt type,
+    so all branches share that document's prompt cache.
+    """
+    prompt_types = list(prompt_types)
+    if single_pipeline:
+        return [BatchJob(doc_name=d, prompt_types=tuple(prompt_types)) for d in doc_names]
+    return [BatchJob(doc_name=d, prompt_types=(p,)) for d in doc_names for p in prompt_types]
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    dataset_directory: str,
+    num_questions: int = 16,
+    model_name: str = "claude-sonnet-4-20250514",
+    temperature: float = 0.7,
+    max_workers: int = 8,
+    max_concurrent_jobs: int = 4,
+    resume: bool = False,
+    journal_dir: str = "data/journal",
+    stream_batch_size: Optional[int] = None,
+    response_cache: Optional[ResponseCache] = None,
+    cache_ttl_seconds: float = 300.0,
+    questions_per_call: int = 1,
+    tokasaurus: Optional[TokasaurusBackend] = None,
+    capture_tokens: bool = False,
+    answer_context: str = "document",
+    cartridges: Optional[Dict[str, CartridgeConfig]] = None,
+    metrics: Optional[RunMetrics] = None,
+    section_context: bool = False,
+    questions_per_section: int = 2,
+    retrieval: Optional[RetrievalConfig] = None,
+) -> List[BatchJobResult]:
+    """Run every job in this process against one shared worker pool.
+
+    With `resume`, work already recorded in the journal is replayed instead of re-sent.
+    With `response_cache`, requests identical to earlier ones (in this or any
+    previous run) are served from the cache. `cache_ttl_seconds` is the provider's
+    prompt cache TTL; documents are re-primed shortly before it runs out. With
+    `tokasaurus`, documents are generated on that server instead of through verdict,
+    and `capture_tokens` also saves answer token ids and top-k logprobs. With an
+    `answer_context` other than "document", each document answers from its entry in
+    `cartridges` (keyed by doc_name); a document without one fails its job.
+    `metrics` collects provider call latency and token usage across all jobs.
+    `section_context` sends section excerpts plus an outline instead of each document.
+    `retrieval` answers each question from its top BM25 passages.
+    Returns one BatchJobResult per job, in the order of `jobs`.
+    """
+    pool = SharedWorkerPool(max_workers)
+    # Shared so per-prompt-type jobs on the same document also reuse one cache write
+    cache_warmup = DocumentCacheWarmup(ttl_seconds=cache_ttl_seconds)
+    journal = RunJournal(journal_dir, resume=resume)
+
+    def _run_one(job: BatchJob) -> BatchJobResult:
+        t0 = time.time()
+        try:
+            synthesizer = GenConvoSynthesizer(
+                dataset_directory=dataset_directory,
+                filename=job.filename,
+                prompt_type=job.prompt_types[0],
+                prompt_types=list(job.prompt_types),
+                num_questions=num_questions,
+                model_name=model_name,
+                max_workers=max_workers,
+                temperature=temperature,
+                worker_pool=pool,
+                cache_warmup=cache_warmup,
+                journal=journal,
+                stream_batch_size=stream_batch_size,
+                response_cache=response_cache,
+                questions_per_call=questions_per_call,
+                tokasaurus=tokasaurus,
+                capture_tokens=capture_tokens,
+                answer_context=answer_context,
+                cartridge=(cartridges or {}).get(job.doc_name),
+                metrics=metrics,
+                section_context=section_context,
+                questions_per_section=questions_per_section,
+                retrieval=retrieval,
+                display=False,
+            )
+            results = synthesizer()
+            return BatchJobResult(
+                doc_name=job.doc_name,
+                prompt_type=job.prompt_type,
+                status="ok",
+                dataset_path=results.get("dataset_path"),
+                dataset_paths=results.get("dataset_paths") or {},
+                total_questions=results.get("total_questions"),
+                context=results.get("context") or {},
+                cartridge_comparison=results.get("cartridge_comparison"),
+                retrieval=results.get("retrieval"),
+                elapsed_seconds=time.time() - t0,
+            )
+        except Exception as exc:
+            return BatchJobResult(
+                doc_name=job.doc_name,
+                prompt_type=job.prompt_type,
+                status="failed",
+                error=f"{type(exc).__name__}: {exc}",
+                elapsed_seconds=time.time() - t0,
+            )
+
+    results: Dict[BatchJob, BatchJobResult] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrent_jobs)) as executor:
+        futures = {executor.submit(_run_one, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            results[job] = result = future.result()
+            status = "done" if result.status == "ok" else f"FAILED ({result.error})"
+            print(f"[{len(results)}/{len(jobs)}] {job.doc_name} / {job.prompt_type}: {status}", file=sys.stderr)
+
+    return [results[job] for job in jobs]
+
+
+def summarize_batch(results: List[BatchJobResult]) -> Dict[str, Any]:
+    """Aggregate batch results into a JSON-friendly summary."""
+    succeeded = [r for r in results if r.status == "ok"]
+    failed = [r for r in results if r.status != "ok"]
+    return {
+        "total_jobs": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "total_questions": sum(r.total_questions or 0 for r in succeeded),
+        "jobs": [r.to_dict() for r in results],
+    }
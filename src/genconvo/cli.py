@@ -4,6 +4,9 @@ Command-line interface for running the GenConvo pipeline.
 Entry point defined in pyproject:
   [project.scripts]
   genconvo = "genconvo.cli:main"
+
+`genconvo plan ...` estimates a run without sending any requests.
+`genconvo index ...` precomputes document sidecars (hash, sections, token counts).
 """
 
 from __future__ import annotations
@@ -11,23 +14,44 @@ from __future__ import annotations
 import argparse
 import json
 import sys
+from datetime import datetime
+from pathlib import Path
 
-from .synthesizer import GenConvoSynthesizer
+from .batch import build_jobs, resolve_doc_names, run_batch, summarize_batch
 from .data.finance import FINANCE_BENCH_PATH
+from .prompts.questions import GEN_CONVO_PROMPT_REGISTRY, PAPER_PROMPT_TYPES
+from .utils.metrics import RunMetrics
+from .utils.response_cache import ResponseCache
+from .utils.retrieval import RetrievalConfig
 
+DEFAULT_MODEL_NAME = "claude-sonnet-4-20250514"
 
-def _build_arg_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        prog="genconvo",
-        description="Run GenConvoBench pipeline for a FinanceBench document and export results",
-    )
 
+def _add_document_args(parser: argparse.ArgumentParser) -> None:
+    """Document selection, shared by the run, plan and index commands."""
+    parser.add_argument(
+        "doc_names",
+        type=str,
+        nargs="*",
+        help="FinanceBench document name(s), e.g., 'AMD_2022_10K'",
+    )
     parser.add_argument(
-        "doc_name",
+        "--glob",
         type=str,
-        help="FinanceBench document name, e.g., 'AMD_2022_10K'",
+        default=None,
+        help="Also run every document under FINANCE_BENCH_PATH matching this pattern, e.g., 'AMD_*'",
     )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Also run the documents listed in this file (one doc name per line, '#' comments)",
+    )
+
 
+def _add_run_shape_args(parser: argparse.ArgumentParser) -> None:
+    """Document selection and run shape, shared by the run and plan commands."""
+    _add_document_args(parser)
     parser.add_argument(
         "--num-questions",
         type=int,
@@ -37,27 +61,112 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--model-name",
         type=str,
-        default="claude-sonnet-4-20250514",
-        help="Model name for generation (default: claude-sonnet-4-20250514)",
-    )
-    parser.add_argument(
-        "--temperature",
-        type=float,
-        default=0.7,
-        help="Sampling temperature (default: 0.7)",
+        # None when not given: --engine tokasaurus requires it, other engines use DEFAULT_MODEL_NAME
+        default=None,
+        help=f"Model name for generation (default: {DEFAULT_MODEL_NAME})",
     )
     parser.add_argument(
         "--max-workers",
         type=int,
         default=8,
-        help="Maximum parallel workers for the pipeline (default: 8)",
+        help="Maximum parallel workers, shared across all jobs (default: 8)",
+    )
+    parser.add_argument(
+        "--max-concurrent-jobs",
+        type=int,
+        default=4,
+        help="Maximum (document, prompt_type) jobs in flight at once (default: 4)",
     )
     parser.add_argument(
         "--prompt-type",
+        dest="prompt_types",
         type=str,
-        default="factual",
-        choices=["factual", "knowledge", "disjoint", "synthesized", "structured", "creative", "counting", "reasoning", "factual_v2", "reasoning_v2", "counting_v2", "synthesis_v2"],
-        help="Prompt type for question generation (default: factual)",
+        nargs="+",
+        default=["factual"],
+        choices=["factual", "knowledge", "disjoint", "synthesized", "structured", "creative", "counting", "reasoning", "factual_v2", "reasoning_v2", "counting_v2", "synthesis_v2", "paper", "all"],
+        help=(
+            "Prompt type(s) for question generation (default: factual). "
+            "'paper' expands to the six GenConvoBench types, 'all' to every registered type."
+        ),
+    )
+    parser.add_argument(
+        "--single-pipeline",
+        action="store_true",
+        help="Run all prompt types of a document in one pipeline that shares the document prompt cache",
+    )
+    parser.add_argument(
+        "--questions-per-call",
+        type=int,
+        default=1,
+        help="Answer this many questions per provider call (default: 1)",
+    )
+    parser.add_argument(
+        "--section-context",
+        action="store_true",
+        help=(
+            "Send each question call an outline plus a few sections picked for its questions (pairs of distant "
+            "sections for disjoint) instead of the whole document, and answer each question from its sections"
+        ),
+    )
+    parser.add_argument(
+        "--questions-per-section",
+        type=int,
+        default=2,
+        help="With --section-context, questions generated per picked section (default: 2)",
+    )
+    parser.add_argument(
+        "--answer-retrieval",
+        action="store_true",
+        help=(
+            "Answer each question from its top BM25 passages instead of the whole document, falling back to the "
+            "whole document when the passages match too little of the question. The index is saved next to the markdown"
+        ),
+    )
+    parser.add_argument(
+        "--retrieval-top-k",
+        type=int,
+        default=RetrievalConfig.top_k,
+        help=f"With --answer-retrieval, passages considered per question (default: {RetrievalConfig.top_k})",
+    )
+    parser.add_argument(
+        "--retrieval-token-budget",
+        type=int,
+        default=RetrievalConfig.token_budget,
+        help=f"With --answer-retrieval, max tokens of passages per question (default: {RetrievalConfig.token_budget})",
+    )
+    parser.add_argument(
+        "--retrieval-min-coverage",
+        type=float,
+        default=RetrievalConfig.min_coverage,
+        help=(
+            "With --answer-retrieval, fraction of the question's IDF-weighted terms the passages must contain, "
+            f"else the whole document is sent (default: {RetrievalConfig.min_coverage})"
+        ),
+    )
+
+
+def _retrieval_config(args: argparse.Namespace) -> RetrievalConfig | None:
+    if not args.answer_retrieval:
+        return None
+    return RetrievalConfig(
+        top_k=args.retrieval_top_k,
+        token_budget=args.retrieval_token_budget,
+        min_coverage=args.retrieval_min_coverage,
+    )
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="genconvo",
+        description="Run GenConvoBench pipeline for FinanceBench documents and export results",
+    )
+
+    _add_run_shape_args(parser)
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=0.7,
+        help="Sampling temperature (default: 0.7)",
     )
     parser.add_argument(
         "--warmup",
@@ -69,6 +178,138 @@ def _build_arg_parser() -> argparse.ArgumentParser:
             "If provided, these settings override --num-questions/--max-workers/--model-name/--temperature/--prompt-type."
         ),
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip question batches and answers already recorded in the journal and send only the missing requests",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        type=str,
+        default="data/journal",
+        help="Directory of the append-only completion journal (default: data/journal)",
+    )
+    parser.add_argument(
+        "--stream-batch-size",
+        type=int,
+        default=None,
+        help="Stream Q&A pairs to the dataset directory in Arrow batches of this size as answers complete",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="verdict",
+        choices=["verdict", "batch", "tokasaurus"],
+        help=(
+            "'verdict' sends requests as they are ready; 'batch' submits them to a batch endpoint and polls; "
+            "'tokasaurus' sends each document's chats to a self-hosted Tokasaurus server in batches (default: verdict)"
+        ),
+    )
+    parser.add_argument(
+        "--tokasaurus-url",
+        type=str,
+        nargs="+",
+        default=None,
+        help=(
+            "Tokasaurus server URL for --engine tokasaurus; --model-name must name the served model. "
+            "With several replica URLs, each document is routed to one replica by consistent hash"
+        ),
+    )
+    parser.add_argument(
+        "--capture-tokens",
+        action="store_true",
+        help=(
+            "With --engine tokasaurus, also save each answer's completion token ids (and top-k logprobs "
+            "with --capture-top-logprobs) as compact memory-mappable dataset columns"
+        ),
+    )
+    parser.add_argument(
+        "--capture-top-logprobs",
+        type=int,
+        default=None,
+        metavar="K",
+        help="Top-k logprobs to request per answer token with --capture-tokens (default: token ids only)",
+    )
+    parser.add_argument(
+        "--answer-context",
+        type=str,
+        default="document",
+        choices=["document", "cartridge", "both"],
+        help=(
+            "What answers see with --engine tokasaurus: the full 'document', a 'cartridge' trained on it "
+            "(prompts carry only the question), or 'both', saving the cartridge answers as a separate split "
+            "and comparing them to the full-context ones (default: document)"
+        ),
+    )
+    parser.add_argument(
+        "--cartridges",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help=(
+            'JSON file mapping doc names to cartridges, {"<doc>": {"id": ..., "source": "huggingface"|"wandb"}}; '
+            "a plain string id means a huggingface cartridge"
+        ),
+    )
+    parser.add_argument(
+        "--batch-backend",
+        type=str,
+        default="anthropic",
+        choices=["anthropic", "local"],
+        help="Batch endpoint for --engine batch; 'local' is a file-backed stand-in for offline testing (default: anthropic)",
+    )
+    parser.add_argument(
+        "--batch-dir",
+        type=str,
+        default=None,
+        help="Work directory for --engine batch; re-use it to resume polling submitted batches (default: data/batches/<timestamp>)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between batch status polls (default: 60)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=300.0,
+        help="Provider prompt cache TTL in seconds; documents are re-primed shortly before it expires (default: 300)",
+    )
+    parser.add_argument(
+        "--response-cache",
+        type=str,
+        default="read-write",
+        choices=["read-write", "read-only", "bypass"],
+        help="Persistent response cache mode (default: read-write)",
+    )
+    parser.add_argument(
+        "--response-cache-path",
+        type=str,
+        default="data/response_cache.sqlite",
+        help="SQLite file backing the response cache (default: data/response_cache.sqlite)",
+    )
+    parser.add_argument(
+        "--response-cache-max-gb",
+        type=float,
+        default=2.0,
+        help="Evict least-recently-used responses beyond this size (default: 2.0)",
+    )
+    parser.add_argument(
+        "--metrics-dir",
+        type=str,
+        default=None,
+        help=(
+            "Record provider call latency, queue wait, token rates and prompt-cache hit ratio per unit and "
+            "prompt type, written to metrics.json and metrics.prom (Prometheus text format) in this directory"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between rewrites of the --metrics-dir files during the run (default: 10)",
+    )
     parser.add_argument(
         "--print-json",
         action="store_true",
@@ -78,21 +319,350 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     return parser
 
 
+def _build_plan_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="genconvo plan",
+        description="Estimate tokens, wall-clock time, rate-limit bottleneck and cost of a run without sending requests",
+    )
+
+    _add_run_shape_args(parser)
+    parser.add_argument(
+        "--question-tokens",
+        type=int,
+        default=40,
+        help="Expected tokens per generated question (default: 40)",
+    )
+    parser.add_argument(
+        "--answer-tokens",
+        type=int,
+        default=300,
+        help="Expected completion tokens per answer (default: 300)",
+    )
+    parser.add_argument(
+        "--output-tokens-per-second",
+        type=float,
+        default=60.0,
+        help="Assumed decoding speed per request (default: 60)",
+    )
+    parser.add_argument(
+        "--cache-reads-exempt",
+        action="store_true",
+        help="Do not count cache-read input tokens against the token limit",
+    )
+    parser.add_argument(
+        "--print-json",
+        action="store_true",
+        help="Print the plan as JSON to stdout",
+    )
+
+    return parser
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+def plan_main(argv: list[str]) -> int:
+    from .planner import LatencyModel, plan_run
+
+    parser = _build_plan_arg_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        dataset_directory = str(FINANCE_BENCH_PATH)
+        doc_names = resolve_doc_names(
+            dataset_directory, args.doc_names, pattern=args.glob, manifest=args.manifest
+        )
+        if not doc_names:
+            parser.error("no documents given: pass doc names, --glob or --manifest")
+
+        plan = plan_run(
+            dataset_directory,
+            doc_names,
+            _expand_prompt_types(args.prompt_types),
+            num_questions=args.num_questions,
+            model_name=args.model_name or DEFAULT_MODEL_NAME,
+            max_workers=args.max_workers,
+            max_concurrent_jobs=args.max_concurrent_jobs,
+            single_pipeline=args.single_pipeline,
+            questions_per_call=args.questions_per_call,
+            section_context=args.section_context,
+            questions_per_section=args.questions_per_section,
+            retrieval=_retrieval_config(args),
+            question_tokens=args.question_tokens,
+            answer_tokens=args.answer_tokens,
+            latency=LatencyModel(output_tokens_per_second=args.output_tokens_per_second),
+            cache_reads_count=not args.cache_reads_exempt,
+        )
+
+        if args.print_json:
+            print(json.dumps(plan))
+            return 0 if plan["error"] is None else 1
+
+        tokens = plan["tokens"]
+        print(f"Model: {plan['model']} (tokenizer: {plan['tokenizer']})")
+        for doc_name, doc_tokens in plan["documents"].items():
+            print(f"  {doc_name}: {doc_tokens:,} tokens")
+        print(f"Jobs: {plan['jobs']}, requests: {plan['requests']}")
+        print(
+            f"Tokens: {tokens['prompt']:,} prompt ({tokens['cache_write']:,} cache write, "
+            f"{tokens['cache_read']:,} cache read), {tokens['completion']:,} completion"
+        )
+        limits = ", ".join(
+            f"{limit['max_value']:,} {limit['metric']}/{limit['window_seconds']:g}s" for limit in plan["rate_limits"]
+        )
+        print(f"Rate limits: {limits or 'none'}")
+        if plan["error"] is not None:
+            print(f"Error: {plan['error']}", file=sys.stderr)
+            return 1
+        print(
+            f"Wall-clock at --max-workers {plan['max_workers']}: {_format_duration(plan['wall_clock_seconds'])} "
+            f"(bottleneck: {plan['bottleneck']})"
+        )
+        print(
+            f"Workers stop helping beyond {plan['saturation_workers']} "
+            f"({_format_duration(plan['saturation_wall_clock_seconds'])}, bottleneck: {plan['saturation_bottleneck']})"
+        )
+        cost = plan["cost_usd"]
+        if cost is None:
+            print("Cost: unknown pricing for this model")
+        else:
+            print(
+                f"Cost: ${cost['total']:.2f} (input ${cost['input']:.2f}, cache write ${cost['cache_write']:.2f}, "
+                f"cache read ${cost['cache_read']:.2f}, output ${cost['output']:.2f})"
+            )
+        return 0
+    except Exception as exc:  # pragma: no cover - CLI robustness
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+
+def _build_index_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="genconvo index",
+        description=(
+            "Write a sidecar next to each markdown with its hash, section offsets and token counts, "
+            "read by later runs and plans"
+        ),
+    )
+    _add_document_args(parser)
+    parser.add_argument(
+        "--tokenizer",
+        action="append",
+        default=None,
+        help=(
+            "Count tokens with this tokenizer (tiktoken encoding or model, or a Hugging Face name); "
+            "repeatable (default: the planner's tokenizer)"
+        ),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild sidecars even if they are current",
+    )
+    parser.add_argument(
+        "--print-json",
+        action="store_true",
+        help="Print the indexed documents as JSON to stdout",
+    )
+    return parser
+
+
+def index_main(argv: list[str]) -> int:
+    from .clients.usage import get_tokenizer, load_tokenizer
+    from .utils.sidecar import ensure_sidecar, sidecar_path
+
+    parser = _build_index_arg_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        dataset_directory = Path(FINANCE_BENCH_PATH)
+        doc_names = resolve_doc_names(
+            str(dataset_directory), args.doc_names, pattern=args.glob, manifest=args.manifest
+        )
+        if not doc_names:
+            parser.error("no documents given: pass doc names, --glob or --manifest")
+
+        if args.tokenizer:
+            tokenizers = {name: get_tokenizer(name) for name in args.tokenizer}
+        else:
+            tokenizer, tokenizer_name = load_tokenizer()
+            tokenizers = {tokenizer_name: tokenizer}
+
+        rows = []
+        for doc_name in doc_names:
+            markdown_path = dataset_directory / f"{doc_name}.md"
+            sidecar = ensure_sidecar(markdown_path, tokenizers=tokenizers, force=args.force)
+            rows.append({
+                "doc_name": doc_name,
+                "sidecar": str(sidecar_path(markdown_path)),
+                "document_hash": sidecar.document_hash,
+                "chars": sidecar.chars,
+                "sections": len(sidecar.sections),
+                "tokens": {name: sidecar.document_tokens(name) for name in tokenizers},
+            })
+
+        if args.print_json:
+            print(json.dumps(rows))
+            return 0
+        for row in rows:
+            tokens = ", ".join(f"{count:,} {name}" for name, count in row["tokens"].items())
+            print(f"{row['doc_name']}: {row['chars']:,} chars, {row['sections']} sections, {tokens} tokens")
+        print(f"Indexed {len(rows)} document(s)")
+        return 0
+    except Exception as exc:  # pragma: no cover - CLI robustness
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+
+def _expand_prompt_types(prompt_types: list[str]) -> list[str]:
+    expanded: list[str] = []
+    for prompt_type in prompt_types:
+        if prompt_type == "all":
+            expanded.extend(GEN_CONVO_PROMPT_REGISTRY)
+        elif prompt_type == "paper":
+            expanded.extend(PAPER_PROMPT_TYPES)
+        else:
+            expanded.append(prompt_type)
+    return list(dict.fromkeys(expanded))
+
+
+def _load_cartridges(path: str):
+    """doc_name -> CartridgeConfig from a --cartridges JSON file."""
+    from .clients.base import CartridgeConfig
+
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return {
+        doc_name.removesuffix(".md"): CartridgeConfig(
+            **({"id": entry, "source": "huggingface"} if isinstance(entry, str) else entry)
+        )
+        for doc_name, entry in entries.items()
+    }
+
+
+def _print_metrics(snapshot: dict, metrics_dir: str) -> None:
+    totals = snapshot["totals"]
+    hit_ratio = totals["prompt_cache_hit_ratio"]
+    print(
+        f"Metrics ({metrics_dir}): {totals['requests']} calls, {totals['failures']} failed, "
+        f"prompt-cache hit ratio {'n/a' if hit_ratio is None else f'{hit_ratio:.0%}'}"
+    )
+    for series in snapshot["series"]:
+        latency, wait = series["latency_seconds"], series["queue_wait_seconds"]
+        if not series["requests"]:
+            continue
+        ratio = series["prompt_cache_hit_ratio"]
+        print(
+            f"  {series['unit_type']} / {series['prompt_type']}: {series['requests']} calls, "
+            f"latency p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s, queue wait p50 {wait['p50']:.2f}s, "
+            f"cache hit {'n/a' if ratio is None else f'{ratio:.0%}'}"
+        )
+
+
+def _run_verdict(args: argparse.Namespace, jobs, dataset_directory: str, args_dict: dict):
+    """Run jobs through verdict pipelines (or Tokasaurus); returns (results, response cache stats)."""
+    response_cache = ResponseCache(
+        args.response_cache_path,
+        max_bytes=int(args.response_cache_max_gb * 1024**3),
+        mode=args.response_cache,
+    )
+    metrics = None
+    if args.metrics_dir is not None:
+        metrics = RunMetrics(
+            json_path=str(Path(args.metrics_dir) / "metrics.json"),
+            prometheus_path=str(Path(args.metrics_dir) / "metrics.prom"),
+            flush_interval=args.metrics_interval,
+        )
+    tokasaurus = None
+    if args.engine == "tokasaurus":
+        from .tokasaurus_backend import TokasaurusBackend
+
+        tokasaurus = TokasaurusBackend.from_url(
+            args.tokasaurus_url, model_name=args_dict["model_name"], capture_top_logprobs=args.capture_top_logprobs
+        )
+    try:
+        results = run_batch(
+            jobs,
+            dataset_directory=dataset_directory,
+            max_concurrent_jobs=args.max_concurrent_jobs,
+            resume=args.resume,
+            journal_dir=args.journal_dir,
+            stream_batch_size=args.stream_batch_size,
+            response_cache=response_cache,
+            cache_ttl_seconds=args.cache_ttl,
+            questions_per_call=args.questions_per_call,
+            section_context=args.section_context,
+            questions_per_section=args.questions_per_section,
+            retrieval=_retrieval_config(args),
+            tokasaurus=tokasaurus,
+            capture_tokens=args.capture_tokens,
+            answer_context=args.answer_context,
+            cartridges=_load_cartridges(args.cartridges) if args.cartridges else None,
+            metrics=metrics,
+            **args_dict,
+        )
+        if metrics is not None:
+            metrics.flush()
+            _print_metrics(metrics.snapshot(), args.metrics_dir)
+        if tokasaurus is not None:
+            print(f"Tokasaurus connection pool: {tokasaurus.pool_stats()}")
+            # The response cache only sits in front of verdict calls
+            return results, None
+        return results, response_cache.stats()
+    finally:
+        response_cache.close()
+        if tokasaurus is not None:
+            tokasaurus.close()
+
+
+def _run_offline(args: argparse.Namespace, jobs, dataset_directory: str, args_dict: dict):
+    """Run jobs through a batch-submission endpoint."""
+    from .clients.batches import AnthropicBatchBackend, LocalBatchBackend
+    from .offline import OfflineBatchEngine
+
+    work_dir = Path(args.batch_dir or f"data/batches/{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    if args.batch_backend == "local":
+        backend = LocalBatchBackend(root=str(work_dir / "local"))
+    else:
+        backend = AnthropicBatchBackend()
+    engine = OfflineBatchEngine(backend, str(work_dir), poll_interval=args.poll_interval)
+    return engine.run(
+        jobs,
+        dataset_directory,
+        num_questions=args_dict["num_questions"],
+        model_name=args_dict["model_name"],
+        temperature=args_dict["temperature"],
+    )
+
+
 def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "plan":
+        return plan_main(argv[1:])
+    if argv and argv[0] == "index":
+        return index_main(argv[1:])
+
     parser = _build_arg_parser()
     args = parser.parse_args(argv)
 
     try:
         # Hardcode FinanceBench dataset path
         dataset_directory = str(FINANCE_BENCH_PATH)
-        filename = f"{args.doc_name}.md"
+        doc_names = resolve_doc_names(
+            dataset_directory, args.doc_names, pattern=args.glob, manifest=args.manifest
+        )
+        if not doc_names:
+            parser.error("no documents given: pass doc names, --glob or --manifest")
 
         args_dict = {
             "num_questions": args.num_questions,
             "max_workers": args.max_workers,
-            "model_name": args.model_name,
+            "model_name": args.model_name or DEFAULT_MODEL_NAME,
             "temperature": args.temperature,
-            "prompt_type": args.prompt_type,
         }
 
         # Warmup overrides
@@ -109,32 +679,103 @@ def main(argv: list[str] | None = None) -> int:
             args_dict["num_questions"] = 1
             args_dict["max_workers"] = 1
 
+        if args.engine == "tokasaurus" and (args.tokasaurus_url is None or args.model_name is None):
+            parser.error("--engine tokasaurus needs --tokasaurus-url and --model-name naming the served model")
+        if args.capture_tokens and args.engine != "tokasaurus":
+            parser.error("--capture-tokens needs --engine tokasaurus (API providers do not return token ids)")
+        if args.section_context and args.engine != "verdict":
+            parser.error("--section-context needs --engine verdict")
+        if args.answer_retrieval and (args.engine != "verdict" or args.section_context):
+            parser.error("--answer-retrieval needs --engine verdict and cannot be combined with --section-context")
+        if args.answer_context != "document" and (args.engine != "tokasaurus" or args.cartridges is None):
+            parser.error(f"--answer-context {args.answer_context} needs --engine tokasaurus and --cartridges")
+        if args.engine == "batch":
+            # These only apply to live engines; the batch engine resumes from --batch-dir
+            ignored = [
+                flag for flag, is_set in [
+                    ("--resume", args.resume),
+                    ("--stream-batch-size", args.stream_batch_size is not None),
+                    ("--questions-per-call", args.questions_per_call != 1),
+                    ("--response-cache", args.response_cache != "read-write"),
+                    ("--metrics-dir", args.metrics_dir is not None),
+                ]
+                if is_set
+            ]
+            if ignored:
+                parser.error(f"{', '.join(ignored)} cannot be combined with --engine batch")
 
-        synthesizer = GenConvoSynthesizer(
-            dataset_directory=dataset_directory,
-            filename=filename,
-            **args_dict
-        )
-
-        results = synthesizer()
+        jobs = build_jobs(doc_names, _expand_prompt_types(args.prompt_types), args.single_pipeline)
+        if args.engine == "batch":
+            results, cache_stats = _run_offline(args, jobs, dataset_directory, args_dict), None
+        else:
+            results, cache_stats = _run_verdict(args, jobs, dataset_directory, args_dict)
 
-        summary = {
-            "dataset_path": results.get("dataset_path"),
-            "total_questions": results.get("total_questions"),
-            "context": results.get("context"),
-        }
+        if len(results) == 1:
+            # Single job: keep the original one-document summary format
+            result = results[0]
+            if result.status != "ok":
+                raise RuntimeError(result.error)
+            summary = {
+                "dataset_path": result.dataset_path,
+                "dataset_paths": result.dataset_paths,
+                "total_questions": result.total_questions,
+                "context": result.context,
+            }
+            if result.cartridge_comparison is not None:
+                summary["cartridge_comparison"] = result.cartridge_comparison
+            if result.retrieval is not None:
+                summary["retrieval"] = result.retrieval
+        else:
+            summary = summarize_batch(results)
+        if cache_stats is not None:
+            summary["response_cache"] = cache_stats
 
         if args.print_json:
             print(json.dumps(summary))
-        else:
+        elif len(results) == 1:
             dp = summary.get("dataset_path")
             tq = summary.get("total_questions")
             if args.warmup:
                 print("Warmup run complete.")
-            print(f"Saved dataset to: {dp}")
+            if dp is not None:
+                print(f"Saved dataset to: {dp}")
+            else:
+                for prompt_type, path in summary["dataset_paths"].items():
+                    print(f"Saved {prompt_type} dataset to: {path}")
             print(f"Total questions: {tq}")
+        else:
+            if args.warmup:
+                print("Warmup run complete.")
+            print(f"Jobs: {summary['succeeded']}/{summary['total_jobs']} succeeded, {summary['failed']} failed")
+            print(f"Total questions: {summary['total_questions']}")
+            for job in summary["jobs"]:
+                outcome = (
+                    ", ".join(job["dataset_paths"].values()) if job["status"] == "ok" else f"FAILED: {job['error']}"
+                )
+                print(f"  {job['doc_name']} / {job['prompt_type']}: {outcome}")
+        if not args.print_json:
+            for result in results:
+                for prompt_type, stats in (result.cartridge_comparison or {}).items():
+                    tokens = stats["prompt_tokens_per_answer"]
+                    print(
+                        f"Cartridge vs document ({result.doc_name} / {prompt_type}): {stats['questions']} answers, "
+                        f"exact match {stats['exact_match']:.0%}, token F1 {stats['mean_token_f1']:.2f}, "
+                        f"prompt tokens/answer {tokens['cartridge']:,.0f} vs {tokens['document']:,.0f}"
+                    )
+                if result.retrieval is not None and result.retrieval["contexts"]:
+                    stats = result.retrieval
+                    print(
+                        f"Retrieval ({result.doc_name} / {result.prompt_type}): {stats['contexts']} answer contexts, "
+                        f"{stats['fallbacks']} with the full document, {stats['mean_context_tokens']:,.0f} "
+                        f"tokens on average vs {stats['document_tokens']:,} for the document"
+                    )
+        if not args.print_json and cache_stats is not None and cache_stats["mode"] != "bypass":
+            print(
+                f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['coalesced']} coalesced ({cache_stats['entries']} entries)"
+            )
 
-        return 0
+        return 0 if all(r.status == "ok" for r in results) else 1
     except Exception as exc:  # pragma: no cover - CLI robustness
         print(f"Error: {exc}", file=sys.stderr)
         return 1
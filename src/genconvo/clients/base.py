@@ -6,7 +6,7 @@ From:
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
 import numpy as np
 from pydrantic import BaseConfig, ObjectConfig
@@ -61,7 +61,8 @@ class ClientResponse:
 @dataclass(slots=True)
 class ClientSample:
     text: str
-    token_ids: Optional[List[int]] = None
+    # An int32 array when the response came back in the binary format
+    token_ids: Optional[Union[List[int], np.ndarray]] = None
 
     top_logprobs: Optional[TopLogprobs] = None
 
@@ -91,20 +92,131 @@ class FlatTopLogprobs:
         dense_logp = np.full((T, K), -1000.0, dtype=self.logprobs.dtype)
         dense_ids  = np.full((T, K), -1,      dtype=self.token_id.dtype)
 
-        # The kept entries for each row always occupy the first *n*
-        # columns, where n = (token_idx == row).sum().
-        # We fill the matrix row-by-row (vectorised per row, tiny loop
-        # over T only – negligible cost).
-        for row in range(T):
-            row_mask = self.token_idx == row          # boolean mask
-            n_keep   = row_mask.sum()
-            if n_keep:                                # skip empty rows
-                dense_logp[row, :n_keep] = self.logprobs[row_mask]
-                dense_ids [row, :n_keep] = self.token_id[row_mask]
+        # `flatten` keeps, for each row, a prefix of its columns, and emits rows
+        # in order – so an entry's column is its position minus its row's start.
+        rows = self.token_idx
+        counts = np.bincount(rows, minlength=T)               # [T]
+        starts = np.cumsum(counts) - counts                   # [T]
+        cols = np.arange(len(rows)) - starts[rows]            # [N]
+        dense_logp[rows, cols] = self.logprobs
+        dense_ids [rows, cols] = self.token_id
 
         return TopLogprobs(logprobs=dense_logp, token_ids=dense_ids)
 
 
+@dataclass(slots=True)
+class RaggedTopLogprobs:
+    """
+    Flattened top logprobs of a whole batch of samples in shared 1-D arrays.
+
+    token_idx   – 1-D  [N]      row number within its sample
+    token_id    – 1-D  [N]      vocabulary id
+    logprobs    – 1-D  [N]      natural-log probabilities
+    offsets     – 1-D  [B + 1]  sample b owns entries offsets[b] : offsets[b + 1]
+    shapes      – 2-D  [B , 2]  (num_tokens , num_top_logprobs) of each sample
+
+    Samples without logprobs have shape (0, 0). Indexing returns a
+    `FlatTopLogprobs` whose arrays are views into the shared ones.
+    """
+    token_idx: np.ndarray
+    token_id:  np.ndarray
+    logprobs:  np.ndarray
+    offsets:   np.ndarray
+    shapes:    np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def __getitem__(self, b: int) -> FlatTopLogprobs:
+        lo, hi = self.offsets[b], self.offsets[b + 1]
+        T, K = self.shapes[b]
+        return FlatTopLogprobs(
+            token_idx=self.token_idx[lo:hi],
+            token_id=self.token_id[lo:hi],
+            logprobs=self.logprobs[lo:hi],
+            shape=(int(T), int(K)),
+        )
+
+    @classmethod
+    def from_flat(cls, flats: List[Optional[FlatTopLogprobs]]) -> "RaggedTopLogprobs":
+        present = [f for f in flats if f is not None]
+        lengths = [0 if f is None else len(f.token_idx) for f in flats]
+        return cls(
+            token_idx=np.concatenate([f.token_idx for f in present]) if present else np.zeros(0, np.int64),
+            token_id=np.concatenate([f.token_id for f in present]) if present else np.zeros(0, np.int32),
+            logprobs=np.concatenate([f.logprobs for f in present]) if present else np.zeros(0, np.float32),
+            offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            shapes=np.array([(0, 0) if f is None else f.shape for f in flats], dtype=np.int64).reshape(-1, 2),
+        )
+
+    # ──────────────────────────────────────────────────────────
+    # Flatten a whole batch at once: the samples' dense rows are
+    # stacked into one [ΣT , K] matrix and flattened in one call.
+    # ──────────────────────────────────────────────────────────
+    @classmethod
+    def from_top_logprobs(
+        cls, tops: List[Optional["TopLogprobs"]], threshold: float = 0.99
+    ) -> "RaggedTopLogprobs":
+        shapes = np.array(
+            [(0, 0) if t is None else t.logprobs.shape for t in tops], dtype=np.int64
+        ).reshape(-1, 2)
+        K = int(shapes[:, 1].max()) if len(shapes) else 0
+        present = [t for t in tops if t is not None]
+        if not present or K == 0:
+            return cls.from_flat([None] * len(tops))
+
+        def stack(arrays: List[np.ndarray], fill: float) -> np.ndarray:
+            # Pad narrower samples to K columns with entries `flatten` never keeps
+            return np.concatenate([
+                a if a.shape[1] == K else np.pad(a, ((0, 0), (0, K - a.shape[1])), constant_values=fill)
+                for a in arrays
+            ])
+
+        flat = TopLogprobs(
+            logprobs=stack([t.logprobs for t in present], -np.inf),
+            token_ids=stack([t.token_ids for t in present], -1),
+        ).flatten(threshold)
+
+        # Split the global rows back into samples
+        row_offsets = np.concatenate([[0], np.cumsum(shapes[:, 0])])   # [B + 1]
+        sample = np.searchsorted(row_offsets, flat.token_idx, side="right") - 1
+        return cls(
+            token_idx=flat.token_idx - row_offsets[sample],
+            token_id=flat.token_id,
+            logprobs=flat.logprobs,
+            offsets=np.searchsorted(flat.token_idx, row_offsets).astype(np.int64),
+            shapes=shapes,
+        )
+
+    @classmethod
+    def from_samples(cls, samples: List["ClientSample"], threshold: float = 0.99) -> "RaggedTopLogprobs":
+        return cls.from_top_logprobs([s.top_logprobs for s in samples], threshold)
+
+    def reconstruct(self) -> List[Optional["TopLogprobs"]]:
+        """Dense TopLogprobs per sample (None for samples without logprobs), in a few NumPy calls."""
+        B = len(self.shapes)
+        K = int(self.shapes[:, 1].max()) if B else 0
+        row_offsets = np.concatenate([[0], np.cumsum(self.shapes[:, 0])])
+        dense_logp = np.full((int(row_offsets[-1]), K), -1000.0, dtype=self.logprobs.dtype)
+        dense_ids  = np.full((int(row_offsets[-1]), K), -1,      dtype=self.token_id.dtype)
+
+        sample = np.repeat(np.arange(B), np.diff(self.offsets))
+        rows = row_offsets[sample] + self.token_idx
+        counts = np.bincount(rows, minlength=len(dense_logp))
+        starts = np.cumsum(counts) - counts
+        cols = np.arange(len(rows)) - starts[rows]
+        dense_logp[rows, cols] = self.logprobs
+        dense_ids [rows, cols] = self.token_id
+
+        return [
+            None if K_b == 0 else TopLogprobs(
+                logprobs=dense_logp[row_offsets[b]:row_offsets[b + 1], :K_b],
+                token_ids=dense_ids[row_offsets[b]:row_offsets[b + 1], :K_b],
+            )
+            for b, K_b in enumerate(self.shapes[:, 1])
+        ]
+
+
 @dataclass(slots=True)
 class TopLogprobs:
     """
@@ -0,0 +1,142 @@
+"""
+Batch-submission backends for the offline engine (see genconvo.offline).
+
+Requests and results use the Anthropic Message Batches shape, one JSON object
+per line:
+
+    request: {"custom_id": str, "params": {model, max_tokens, system, messages, ...}}
+    result:  {"custom_id": str, "result": {"type": "succeeded", "message": {...}}}
+             {"custom_id": str, "result": {"type": "errored", "error": {...}}}
+"""
+
+import hashlib
+import json
+import re
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class BatchBackend(ABC):
+    """A batch-style endpoint: submit a JSONL file of requests, poll, read results."""
+
+    @abstractmethod
+    def submit(self, requests_path: Path) -> str:
+        """Submit the requests in `requests_path`; returns the batch id."""
+
+    @abstractmethod
+    def is_done(self, batch_id: str) -> bool:
+        """True once every request in the batch has a result."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """Yield one result entry per request."""
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def placeholder_responder(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Deterministic stand-in for a model: fills the forced tool's schema with placeholders."""
+    user = params["messages"][-1]["content"]
+    digest = hashlib.md5(user.encode()).hexdigest()[:8]
+    properties = params["tools"][0]["input_schema"].get("properties", {})
+    if "questions" in properties:
+        match = re.search(r"Generate exactly (\d+)", user)
+        n = int(match.group(1)) if match else 1
+        return {"questions": [f"Placeholder question {i} ({digest})?" for i in range(n)]}
+    return {"answer": f"placeholder answer ({digest})"}
+
+
+class LocalBatchBackend(BatchBackend):
+    """File-backed stand-in for a batch endpoint, for running the offline engine without a provider.
+
+    Each batch is a directory under `root` holding requests.jsonl and, once done,
+    results.jsonl. A batch reports done `latency_seconds` after submission, at which
+    point `responder(params) -> tool input` is called for every request; an exception
+    from the responder becomes an errored result.
+    """
+
+    def __init__(
+        self,
+        root: str = "data/batches/local",
+        responder: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        latency_seconds: float = 0.0,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.responder = responder or placeholder_responder
+        self.latency_seconds = latency_seconds
+
+    def submit(self, requests_path: Path) -> str:
+        batch_id = f"localbatch_{uuid.uuid4().hex[:12]}"
+        batch_dir = self.root / batch_id
+        batch_dir.mkdir(parents=True)
+        shutil.copyfile(requests_path, batch_dir / "requests.jsonl")
+        (batch_dir / "submitted_at").write_text(str(time.time()))
+        return batch_id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch_dir = self.root / batch_id
+        if (batch_dir / "results.jsonl").exists():
+            return True
+        if time.time() - float((batch_dir / "submitted_at").read_text()) < self.latency_seconds:
+            return False
+        self._process(batch_dir)
+        return True
+
+    def _process(self, batch_dir: Path) -> None:
+        tmp_path = batch_dir / "results.jsonl.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for request in _read_jsonl(batch_dir / "requests.jsonl"):
+                params = request["params"]
+                try:
+                    tool_input = self.responder(params)
+                    result = {
+                        "type": "succeeded",
+                        "message": {
+                            "model": params["model"],
+                            "role": "assistant",
+                            "content": [{"type": "tool_use", "name": params["tools"][0]["name"], "input": tool_input}],
+                        },
+                    }
+                except Exception as exc:
+                    result = {"type": "errored", "error": {"type": type(exc).__name__, "message": str(exc)}}
+                f.write(json.dumps({"custom_id": request["custom_id"], "result": result}) + "\n")
+        tmp_path.replace(batch_dir / "results.jsonl")
+
+    def results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        return _read_jsonl(self.root / batch_id / "results.jsonl")
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Anthropic Message Batches API (needs the `anthropic` package and ANTHROPIC_API_KEY)."""
+
+    def __init__(self, client: Any = None):
+        if client is None:
+            try:
+                import anthropic
+            except ImportError as exc:
+                raise ImportError(
+                    "AnthropicBatchBackend requires the `anthropic` package (pip install anthropic)"
+                ) from exc
+            client = anthropic.Anthropic()
+        self.client = client
+
+    def submit(self, requests_path: Path) -> str:
+        batch = self.client.messages.batches.create(requests=list(_read_jsonl(requests_path)))
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        for entry in self.client.messages.batches.results(batch_id):
+            yield entry.model_dump()
@@ -0,0 +1,121 @@
+"""
+Zero-copy binary format for Tokasaurus batch chat responses.
+
+Negotiated with `Accept: application/x-tokasaurus-batch`. A response body is:
+
+    magic      4 bytes   b"TKB1"
+    header_len uint32    little-endian
+    header     JSON      utf-8, `header_len` bytes
+    padding    to an 8-byte boundary
+    data       contiguous little-endian arrays
+
+The header is {"responses": [...]} with one entry per chat:
+
+    {"content": str, "finish_reason": str | null, "error": str | null,
+     "prompt_tokens": int, "completion_tokens": int,
+     "completion_ids": [offset, count],              int32
+     "topk_ids":       [offset, num_tokens, k],      int32, row-major
+     "topk_logprobs":  [offset, num_tokens, k]}      float32, row-major
+
+Offsets are byte offsets into the data section, aligned to 8 bytes. Array
+fields may be null. A request that failed on the server has a non-null
+"error" and no content. Decoded arrays are read-only `np.frombuffer` views into
+the response body, so nothing is copied per token.
+"""
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CONTENT_TYPE = "application/x-tokasaurus-batch"
+MAGIC = b"TKB1"
+_ALIGN = 8
+
+
+@dataclass(slots=True)
+class BinaryChatResponse:
+    content: Optional[str]
+    finish_reason: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    completion_ids: Optional[np.ndarray]
+    topk_ids: Optional[np.ndarray]
+    topk_logprobs: Optional[np.ndarray]
+    error: Optional[str] = None
+
+
+def _pad(n: int) -> int:
+    return -n % _ALIGN
+
+
+def decode(payload: bytes) -> List[BinaryChatResponse]:
+    """Parse a binary batch response; arrays are views into `payload`."""
+    if payload[:4] != MAGIC:
+        raise ValueError("Not a Tokasaurus binary batch response")
+    (header_len,) = struct.unpack_from("<I", payload, 4)
+    header_end = 8 + header_len
+    header = json.loads(payload[8:header_end])
+    data_start = header_end + _pad(header_end)
+    buffer = memoryview(payload)
+
+    def view(spec: Optional[Sequence[int]], dtype: Any) -> Optional[np.ndarray]:
+        if spec is None:
+            return None
+        offset, *shape = spec
+        count = int(np.prod(shape))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + offset)
+        return array.reshape(shape) if len(shape) > 1 else array
+
+    return [
+        BinaryChatResponse(
+            content=entry.get("content"),
+            finish_reason=entry.get("finish_reason"),
+            prompt_tokens=entry.get("prompt_tokens", 0),
+            completion_tokens=entry.get("completion_tokens", 0),
+            completion_ids=view(entry.get("completion_ids"), "<i4"),
+            topk_ids=view(entry.get("topk_ids"), "<i4"),
+            topk_logprobs=view(entry.get("topk_logprobs"), "<f4"),
+            error=entry.get("error"),
+        )
+        for entry in header["responses"]
+    ]
+
+
+def encode(responses: Sequence[Dict[str, Any]]) -> bytes:
+    """Build a binary batch response (reference for servers and tests).
+
+    Each response dict has content, finish_reason, error, prompt_tokens, completion_tokens
+    and optional numpy arrays completion_ids [T], topk_ids [T, K], topk_logprobs [T, K].
+    """
+    chunks: List[bytes] = []
+    size = 0
+
+    def put(array: Optional[np.ndarray], dtype: str) -> Optional[List[int]]:
+        nonlocal size
+        if array is None:
+            return None
+        data = np.ascontiguousarray(array, dtype=dtype).tobytes()
+        spec = [size, *array.shape]
+        chunks.append(data + b"\0" * _pad(len(data)))
+        size += len(data) + _pad(len(data))
+        return spec
+
+    entries = []
+    for r in responses:
+        entries.append({
+            "content": r.get("content"),
+            "finish_reason": r.get("finish_reason"),
+            "error": r.get("error"),
+            "prompt_tokens": r.get("prompt_tokens", 0),
+            "completion_tokens": r.get("completion_tokens", 0),
+            "completion_ids": put(r.get("completion_ids"), "<i4"),
+            "topk_ids": put(r.get("topk_ids"), "<i4"),
+            "topk_logprobs": put(r.get("topk_logprobs"), "<f4"),
+        })
+
+    header = json.dumps({"responses": entries}).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    return b"".join([prefix, b"\0" * _pad(len(prefix)), *chunks])
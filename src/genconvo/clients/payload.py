@@ -0,0 +1,84 @@
+"""
+Deduplicated request bodies for Tokasaurus batch chat calls.
+
+Chats in one batch usually share a long document system message. Instead of
+serializing it once per chat, each distinct message body that is repeated (or
+longer than `min_chars`) is sent once in a content-addressed table and the
+messages reference it by sha256:
+
+    {"contents": {"<sha256>": "<message content>", ...},
+     "requests": [{"messages": [{"role": "system", "content_ref": "<sha256>"},
+                                {"role": "user", "content": "..."}], ...}]}
+
+The server side of this is `expand_requests`, which restores the plain
+{"requests": [...]} body.
+"""
+
+import gzip
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+DEDUP_HEADER = "X-Content-Refs"
+
+
+def dedup_requests(requests: List[Dict[str, Any]], min_chars: int = 4096) -> Dict[str, Any]:
+    """The batch body with repeated or long string message contents replaced by refs."""
+    # Identical document strings are usually the same object, so counting is cheap
+    counts = Counter(
+        message["content"]
+        for request in requests
+        for message in request["messages"]
+        if isinstance(message.get("content"), str)
+    )
+    refs: Dict[str, str] = {}
+    contents: Dict[str, str] = {}
+    out = []
+    for request in requests:
+        messages = []
+        for message in request["messages"]:
+            content = message.get("content")
+            if not isinstance(content, str) or (counts[content] < 2 and len(content) < min_chars):
+                messages.append(message)
+                continue
+            ref = refs.get(content)
+            if ref is None:
+                ref = refs[content] = hashlib.sha256(content.encode()).hexdigest()
+                contents[ref] = content
+            messages.append({k: v for k, v in message.items() if k != "content"} | {"content_ref": ref})
+        out.append({**request, "messages": messages})
+    return {"contents": contents, "requests": out}
+
+
+def expand_requests(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverse of dedup_requests (reference for servers and tests)."""
+    contents = body.get("contents", {})
+    return [
+        {
+            **request,
+            "messages": [
+                {k: v for k, v in m.items() if k != "content_ref"} | {"content": contents[m["content_ref"]]}
+                if "content_ref" in m else m
+                for m in request["messages"]
+            ],
+        }
+        for request in body["requests"]
+    ]
+
+
+def encode_body(
+    requests: List[Dict[str, Any]], dedup: bool, compress: bool, min_chars: int = 4096
+) -> Tuple[bytes, Dict[str, str]]:
+    """Serialized batch body and the headers describing its encoding."""
+    headers = {"Content-Type": "application/json"}
+    if dedup:
+        body: Dict[str, Any] = dedup_requests(requests, min_chars)
+        headers[DEDUP_HEADER] = "sha256"
+    else:
+        body = {"requests": requests}
+    data = json.dumps(body).encode()
+    if compress:
+        data = gzip.compress(data, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
@@ -0,0 +1,64 @@
+"""
+Consistent-hash ring for routing batches to model server replicas.
+
+Each replica owns `vnodes` points on a 64-bit ring, and a key goes to the first
+replica clockwise from its hash. Adding or removing a replica only moves the
+keys next to its points (about 1/N of them), so the other replicas keep the
+documents already in their KV caches.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: List[Tuple[int, str]] = []
+        self._nodes: Dict[str, None] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes[node] = None
+        for i in range(self.vnodes):
+            bisect.insort(self._points, (_hash(f"{node}#{i}"), node))
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        del self._nodes[node]
+        self._points = [p for p in self._points if p[1] != node]
+
+    def preference(self, key: str) -> List[str]:
+        """Distinct nodes in ring order starting at `key`; the first is the owner."""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, (_hash(key), ""))
+        order: Dict[str, None] = {}
+        for i in range(len(self._points)):
+            order.setdefault(self._points[(start + i) % len(self._points)][1], None)
+            if len(order) == len(self._nodes):
+                break
+        return list(order)
+
+    def get(self, key: str) -> Optional[str]:
+        nodes = self.preference(key)
+        return nodes[0] if nodes else None
@@ -5,9 +5,13 @@ From:
 
 import asyncio
 import aiohttp
+import hashlib
 import json
+import random
+import threading
 import time
-from typing import Any, Dict, List, Literal, Optional
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 import requests
 import base64
 
@@ -23,6 +27,8 @@ from genconvo.clients.base import (
     TopLogprobs,
     CartridgeConfig
 )
+from genconvo.clients import binary_format, payload
+from genconvo.clients.routing import ConsistentHashRing
 from genconvo.clients.usage import Usage
 from genconvo.utils import get_logger
 
@@ -30,6 +36,19 @@ from genconvo.utils import get_logger
 logger = get_logger(__name__)
 
 
+def _failed(response: Any) -> bool:
+    """True for a per-request failure inside an otherwise successful batch response."""
+    if response is None or isinstance(response, Exception):
+        return True
+    if isinstance(response, binary_format.BinaryChatResponse):
+        return response.error is not None
+    return isinstance(response, dict) and response.get("error") is not None
+
+
+class ServerUnreachableError(Exception):
+    """No attempt at a batch got a response from the server (as opposed to failures of single requests)."""
+
+
 class TokasaurusClient(Client):
     """Client for Tokasaurus with async gather support for batch calls."""
 
@@ -49,6 +68,36 @@ class TokasaurusClient(Client):
         timeout_multiplier: float = 1.5
 
         on_failure: Literal["raise", "continue"] = "raise"
+        # Raise ServerUnreachableError, whatever on_failure says, when no attempt at a
+        # batch got an answer; MultiTokasaurusClient fails over to the next replica on it
+        raise_if_unreachable: bool = False
+
+        # The client keeps one pooled session for its lifetime (see close()).
+        # 0 means no limit, as in aiohttp.TCPConnector.
+        max_connections: int = 100
+        max_connections_per_host: int = 0
+        keepalive_timeout: float = 60.0
+
+        # "auto" asks for the zero-copy binary format (see clients/binary_format.py)
+        # and falls back to pickle if the server answers with it; "binary" requires
+        # the binary format and "pickle" never asks for it.
+        response_format: Literal["auto", "binary", "pickle"] = "auto"
+
+        # Send each distinct long or repeated message body (the shared document) once
+        # per batch and reference it by sha256 (see clients/payload.py). Servers that
+        # reject the deduplicated body get the plain one for the rest of the session.
+        dedup_payload: bool = True
+        dedup_min_chars: int = 4096
+        compress_payload: bool = False
+
+        # Batches are split into sub-batches of this many chats, sent concurrently.
+        # A retry resubmits only the failed requests; None sends one request.
+        sub_batch_size: Optional[int] = None
+        # If set (e.g. 0.95), a sub-batch still running past this quantile of recent
+        # sub-batch latencies is sent again, and whichever copy finishes first wins
+        hedge_percentile: Optional[float] = None
+        hedge_min_samples: int = 20
+        max_backoff: float = 60.0
 
         cartridges: Optional[List[CartridgeConfig]] = None
 
@@ -76,59 +125,260 @@ class TokasaurusClient(Client):
         else:
             self.cartridges = None
 
-    async def _send_requests(self, requests: list[dict], modal_upstream_id: Optional[str] = None, use_cartridge_endpoint: bool = False) -> dict:
-        """Send a single request to the server with retries."""
-        if modal_upstream_id is not None:
-            headers = {
-                # "X-Modal-Flash-Upstream": modal_upstream_id,
-            }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool_stats = {
+            "requests": 0, "request_bytes": 0, "connections_created": 0, "connections_reused": 0, "sessions_created": 0,
+            "retried_requests": 0, "hedges": 0, "hedge_wins": 0,
+        }
+        self._latencies: deque = deque(maxlen=200)
+        self._dedup_supported: Optional[bool] = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            self._pool_stats["connections_created"] += 1
+
+        async def on_reuse(session, ctx, params):
+            self._pool_stats["connections_reused"] += 1
+
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The pooled session, created on first use in the running event loop.
+
+        A session is bound to its event loop, so it is rebuilt only if the client is
+        used from a different loop (callers should keep one loop, see TokasaurusBackend).
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._discard_session()
+            self._connector = aiohttp.TCPConnector(
+                limit=self.config.max_connections,
+                limit_per_host=self.config.max_connections_per_host,
+                keepalive_timeout=self.config.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=self._connector, trace_configs=[self._trace_config()]
+            )
+            self._session_loop = loop
+            self._pool_stats["sessions_created"] += 1
+        return self._session
+
+    def _discard_session(self) -> None:
+        """Close a session left over from another event loop; it can only be closed on its own loop."""
+        session, loop = self._session, self._session_loop
+        if session is None or session.closed or loop is None:
+            return
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        elif not loop.is_closed():
+            # A stopped loop can run again, but not on this thread while another loop runs here
+            closer = threading.Thread(target=loop.run_until_complete, args=(session.close(),))
+            closer.start()
+            closer.join()
         else:
-            headers = {}
-        response = None
-        for retry_idx in range(self.config.max_retries):
+            # Nothing can run on a closed loop any more: detach the session so it is not
+            # reported as unclosed; its sockets are released with the connector
+            session.detach()
+
+    async def close(self) -> None:
+        """Close the pooled session and its connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool metrics for sizing max_connections."""
+        stats: Dict[str, Any] = dict(self._pool_stats)
+        connector = self._connector
+        if connector is not None and not connector.closed:
+            # aiohttp does not expose these publicly
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        else:
+            in_use = idle = 0
+        stats["open_connections"] = in_use + idle
+        stats["in_use_connections"] = in_use
+        stats["idle_connections"] = idle
+        acquired = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_rate"] = stats["connections_reused"] / acquired if acquired else 0.0
+        return stats
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {
+            # "X-Modal-Flash-Upstream": modal_upstream_id,
+        }
+        if self.config.response_format != "pickle":
+            headers["Accept"] = binary_format.CONTENT_TYPE
+            if self.config.response_format == "auto":
+                headers["Accept"] += ", application/octet-stream;q=0.5"
+        return headers
+
+    async def _post(self, requests: list[dict], endpoint: str, timeout: float) -> list:
+        """One attempt at a batch; returns one decoded response (or failure marker) per request."""
+        while True:
+            dedup = self.config.dedup_payload and self._dedup_supported is not False
+            body, body_headers = payload.encode_body(
+                requests, dedup, self.config.compress_payload, self.config.dedup_min_chars
+            )
+            session = self._get_session()
+            self._pool_stats["requests"] += 1
+            self._pool_stats["request_bytes"] += len(body)
+            # Timeout escalates per attempt on the request; the pooled session is reused
+            async with session.post(
+                f"{self.config.url}{endpoint}",
+                data=body,
+                headers={**self._headers(), **body_headers},
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as resp:
+                if dedup and self._dedup_supported is None and resp.status in (400, 415, 422):
+                    logger.warning(
+                        f"Server rejected a deduplicated request body (HTTP {resp.status}); sending plain bodies"
+                    )
+                    self._dedup_supported = False
+                    continue
+                if resp.status != 200:
+                    # Get response text for better error info
+                    error_text = await resp.text()
+                    error_msg = f"HTTP {resp.status}: {error_text}"
+                    raise aiohttp.ClientResponseError(
+                        request_info=resp.request_info,
+                        history=resp.history,
+                        status=resp.status,
+                        message=error_msg
+                    )
+                if dedup:
+                    self._dedup_supported = True
+                content_type = resp.content_type
+                response = await resp.content.read()
+            break
+
+        if content_type == binary_format.CONTENT_TYPE:
+            response = binary_format.decode(response)
+        elif self.config.response_format == "binary":
+            raise ValueError(f"Expected a {binary_format.CONTENT_TYPE} response, got {content_type}")
+        else:
+            # Legacy servers only speak pickle; keep the import off the binary path
+            import pickle
+            response = pickle.loads(response)
+        if len(response) != len(requests):
+            raise ValueError(f"Expected {len(requests)} responses, got {len(response)}")
+        return response
+
+    async def _post_hedged(self, requests: list[dict], endpoint: str, timeout: float) -> list:
+        """_post, plus a duplicate if it runs past the hedge percentile of recent latencies."""
+        hedge_after = None
+        if self.config.hedge_percentile is not None and len(self._latencies) >= self.config.hedge_min_samples:
+            hedge_after = float(np.quantile(self._latencies, self.config.hedge_percentile))
+
+        t0 = time.monotonic()
+        primary = asyncio.ensure_future(self._post(requests, endpoint, timeout))
+        tasks = {primary}
+        if hedge_after is not None:
+            await asyncio.wait(tasks, timeout=hedge_after)
+            if not primary.done():
+                self._pool_stats["hedges"] += 1
+                tasks.add(asyncio.ensure_future(self._post(requests, endpoint, timeout)))
+
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is not primary:
+                        self._pool_stats["hedge_wins"] += 1
+                    self._latencies.append(time.monotonic() - t0)
+                    return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise error  # type: ignore[misc]
+
+    def _backoff(self, retry_idx: int) -> float:
+        # Full jitter, so clients retrying after the same failure do not hit the server in waves
+        return random.uniform(0, min(self.config.max_backoff, 2 ** retry_idx))
+
+    async def _iter_responses(
+        self, requests: list[dict], use_cartridge_endpoint: bool = False, sub_batch_size: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Yield (index, response) for a batch as each sub-batch completes, with per-request retries.
+
+        Requests are sent in concurrent sub-batches of `sub_batch_size`. Responses that
+        come back are yielded at once, and a retry resubmits only the requests whose
+        sub-batch failed or whose own response was an error. Requests still failing
+        after `max_retries` attempts are yielded last as None (or raise, with
+        on_failure="raise"). If the server never answered at all, this raises
+        ServerUnreachableError instead when `raise_if_unreachable` is set.
+        """
+        endpoint = "/batch/chat/completions" if not use_cartridge_endpoint else "/batch/cartridge/chat/completions"
+        size = sub_batch_size or self.config.sub_batch_size or len(requests) or 1
+        answered = False
+
+        async def attempt(chunk: List[int], retry_idx: int) -> Tuple[List[int], int, list]:
+            nonlocal answered
+            if retry_idx > 0:
+                self._pool_stats["retried_requests"] += len(chunk)
+                await asyncio.sleep(self._backoff(retry_idx - 1))
+            timeout = self.config.base_timeout * (self.config.timeout_multiplier ** retry_idx)
             try:
-                timeout = self.config.base_timeout * (self.config.timeout_multiplier ** retry_idx)
-                
-                import pickle
-                t0 = time.time()
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-                    endpoint = "/batch/chat/completions" if not use_cartridge_endpoint else "/batch/cartridge/chat/completions"
-                    async with session.post(
-                        f"{self.config.url}{endpoint}",
-                        json={"requests": requests},
-                        headers=headers,
-                    ) as resp:
-                        if resp.status != 200:
-                            # Get response text for better error info
-                            error_text = await resp.text()
-                            error_msg = f"HTTP {resp.status}: {error_text}"
-                            raise aiohttp.ClientResponseError(
-                                request_info=resp.request_info,
-                                history=resp.history,
-                                status=resp.status,
-                                message=error_msg
-                            )
-                        response = await resp.content.read()
-                
-                # print(f"batch/chat/completions took {time.time() - t0} seconds")
-                t0 = time.time()
-                response = pickle.loads(response)
-                # print(f"pickle.loads took {time.time() - t0} seconds")
-                break
+                response = await self._post_hedged([requests[i] for i in chunk], endpoint, timeout)
+                answered = True
+                return chunk, retry_idx, response
             except Exception as e:
-                logger.warning(f"Error sending request (retry {retry_idx + 1}/{self.config.max_retries}): {type(e).__name__}: {e}")
-                response = e
-                # Also use exponential backoff for sleep: 1 * (2 ** retry_idx) seconds
-                sleep_duration = 1 * (2 ** retry_idx)
-                await asyncio.sleep(sleep_duration)
-                continue
-    
-        if response is None or isinstance(response, Exception):
-            logger.error(f"Failed to get response after {self.config.max_retries} retries")
+                logger.warning(
+                    f"Error sending {len(chunk)} requests (retry {retry_idx + 1}/{self.config.max_retries}): "
+                    f"{type(e).__name__}: {e}"
+                )
+                return chunk, retry_idx, [None] * len(chunk)
+
+        indices = list(range(len(requests)))
+        tasks = {asyncio.ensure_future(attempt(indices[i:i + size], 0)) for i in range(0, len(indices), size)}
+        failed: List[int] = []
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    chunk, retry_idx, outcome = task.result()
+                    retry = []
+                    for i, response in zip(chunk, outcome):
+                        if _failed(response):
+                            retry.append(i)
+                        else:
+                            yield i, response
+                    if not retry:
+                        continue
+                    if retry_idx + 1 < self.config.max_retries:
+                        tasks.add(asyncio.ensure_future(attempt(retry, retry_idx + 1)))
+                    else:
+                        failed.extend(retry)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if failed:
+            logger.error(f"{len(failed)}/{len(requests)} requests failed after {self.config.max_retries} retries")
+            if not answered and self.config.raise_if_unreachable:
+                raise ServerUnreachableError(f"No response from {self.config.url}")
             if self.config.on_failure == "raise":
                 raise Exception("Failed to get response from server")
-        
-        return response # type: ignore
+            for i in sorted(failed):
+                yield i, None
+
+    async def _send_requests(self, requests: list[dict], modal_upstream_id: Optional[str] = None, use_cartridge_endpoint: bool = False) -> list:
+        """Send a batch with per-request retries (see _iter_responses); responses in request order."""
+        results: List[Any] = [None] * len(requests)
+        async for i, response in self._iter_responses(requests, use_cartridge_endpoint):
+            results[i] = response
+        return results
 
     def _extract_fingerprint_logprobs(self, fingerprint_data: dict) -> Optional[TopLogprobs]:
         """Extract logprobs data from the fingerprint if available."""
@@ -168,6 +418,75 @@ class TokasaurusClient(Client):
             logger.warning(f"Failed to extract logprobs from fingerprint: {e}")
         return None
 
+    def _construct_requests(
+        self,
+        chats: List[List[Dict[str, Any]]],
+        max_completion_tokens: int,
+        temperature: float,
+        top_logprobs: Optional[int],
+        cartridges: Optional[List[Dict[str, Any]]],
+    ) -> List[dict]:
+        def _construct_request(chat: List[Dict[str, Any]]) -> dict:
+            request = {
+                "messages": chat,
+                "model": self.config.model_name,
+                "max_completion_tokens": max_completion_tokens,
+                "temperature": temperature,
+                "logprobs_in_fingerprint": True,
+            }
+            all_cartridges = []
+            if self.cartridges is not None:
+                all_cartridges.extend(self.cartridges)
+            if cartridges is not None:
+                all_cartridges.extend(cartridges)
+            if len(all_cartridges) > 0:
+                request["cartridges"] = all_cartridges
+            if top_logprobs is not None:
+                request["logprobs"] = True
+                request["top_logprobs"] = top_logprobs
+            return request
+        return [_construct_request(chat) for chat in chats]
+
+    def _to_sample(self, response: Any, with_logprobs: bool, index: int = 0) -> Tuple[ClientSample, Usage]:
+        """A ClientSample (empty if the request failed) and its usage from one decoded response."""
+        if _failed(response):
+            logger.error(f"Request {index} failed: {response}")
+            return ClientSample(text="", token_ids=None, top_logprobs=None), Usage(prompt_tokens=0, completion_tokens=0)
+
+        if isinstance(response, binary_format.BinaryChatResponse):
+            return self._sample_from_binary(response, with_logprobs)
+
+        # SE (07/07): Running validation with ChatCompletion Pydantic model is very slow.
+        # So we use model_construct to create the objects.
+        response = ChatCompletion.model_construct(**response)
+        usage = Usage(prompt_tokens=0, completion_tokens=0)
+        # Extract usage information
+        if hasattr(response, 'usage') and response.usage:
+            usage = Usage(
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens,
+            )
+        
+        # Extract token IDs from fingerprint if available
+        fingerprint_data = json.loads(response.system_fingerprint) # type: ignore
+        sample = ClientSample(
+            text=response.choices[0].message.content, # type: ignore
+            token_ids=fingerprint_data["completion_ids"][0],
+            top_logprobs=(
+                self._extract_fingerprint_logprobs(fingerprint_data) if with_logprobs else None
+            )
+        )
+        return sample, usage
+
+    def _sample_from_binary(
+        self, r: binary_format.BinaryChatResponse, with_logprobs: bool
+    ) -> tuple[ClientSample, Usage]:
+        """Sample from a binary response entry; token arrays stay views into the body."""
+        top = None
+        if with_logprobs and r.topk_ids is not None and r.topk_logprobs is not None and len(r.topk_ids):
+            top = TopLogprobs(logprobs=r.topk_logprobs, token_ids=r.topk_ids)
+        sample = ClientSample(text=r.content or "", token_ids=r.completion_ids, top_logprobs=top)
+        return sample, Usage(prompt_tokens=r.prompt_tokens, completion_tokens=r.completion_tokens)
 
     async def chat(
         self,
@@ -205,69 +524,250 @@ class TokasaurusClient(Client):
         t0 = time.time()
         logger.info(f"[batch={modal_upstream_id}] Sending batch chat request")
 
-        def _construct_request(chat: List[Dict[str, Any]]) -> dict:
-            request = {
-                "messages": chat,
-                "model": self.config.model_name,
-                "max_completion_tokens": max_completion_tokens,
-                "temperature": temperature,
-                "logprobs_in_fingerprint": True,
-            }
-            all_cartridges = []
-            if self.cartridges is not None:
-                all_cartridges.extend(self.cartridges)
-            if cartridges is not None:
-                all_cartridges.extend(cartridges)
-            if len(all_cartridges) > 0:
-                request["cartridges"] = all_cartridges
-            if top_logprobs is not None:
-                request["logprobs"] = True
-                request["top_logprobs"] = top_logprobs
-            return request
         response = await self._send_requests(
-            [_construct_request(chat) for chat in chats], modal_upstream_id, 
+            self._construct_requests(chats, max_completion_tokens, temperature, top_logprobs, cartridges),
+            modal_upstream_id, 
             use_cartridge_endpoint=cartridges is not None or self.cartridges is not None
         )
-        # SE (07/07): Running validation with ChatCompletion Pydantic model is very slow.
-        # So we use model_construct to create the objects.
-        responses: List[ChatCompletion] = [ChatCompletion.model_construct(**r) for r in response]
         logger.info(f"[batch={modal_upstream_id}] Responses received")
-        
+
         samples = []
         usage = Usage(prompt_tokens=0, completion_tokens=0)
-        for i, response in enumerate(responses):
-            if isinstance(response, Exception) or response is None:
-                logger.error(f"Request {i} failed: {response}")
-                samples.append(
-                    ClientSample(
-                        text="", 
-                        token_ids=None, 
-                        top_logprobs=None
-                    )
-                )
-                continue
-            
-            # Extract usage information
-            if hasattr(response, 'usage') and response.usage:
-                usage += Usage(
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                )
-            
-            # Extract token IDs from fingerprint if available
-            fingerprint_data = json.loads(response.system_fingerprint) # type: ignore
-            samples.append(
-                ClientSample(
-                    text=response.choices[0].message.content, # type: ignore
-                    token_ids=fingerprint_data["completion_ids"][0],
-                    top_logprobs=(
-                        None if top_logprobs is None else 
-                        self._extract_fingerprint_logprobs(fingerprint_data)
-                    )
-                )
-            )
+        for i, r in enumerate(response):
+            sample, sample_usage = self._to_sample(r, top_logprobs is not None, i)
+            samples.append(sample)
+            usage += sample_usage
         
         logger.info(f"[batch={modal_upstream_id}] Batch chat completed in {time.time() - t0:.2f} seconds")
         
         assert len(samples) == len(chats), f"Expected {len(chats)} samples, got {len(samples)}"
-        return ClientResponse(samples=samples, usage=usage)
\ No newline at end of file
+        return ClientResponse(samples=samples, usage=usage)
+
+    async def chat_stream(
+        self,
+        chats: List[List[Dict[str, Any]]],
+        max_completion_tokens: int,
+        temperature: float = 0.6,
+        top_logprobs: Optional[int] = None,
+        modal_upstream_id: Optional[str] = None,
+        cartridges: Optional[List[Dict[str, Any]]] = None,
+        sub_batch_size: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[int, ClientSample]]:
+        """Like chat, but yields (index into chats, ClientSample) in completion order.
+
+        By default (no `sub_batch_size` here or in the config) the batch goes in one
+        request, so the server sees every chat sharing the prefix at once and the
+        samples arrive together. With sub-batches, each sample is yielded as soon as
+        its sub-batch returns, so callers can process early results while the tail is
+        generating. Failed requests are yielded last as empty samples (with
+        on_failure="continue").
+        """
+        requests = self._construct_requests(chats, max_completion_tokens, temperature, top_logprobs, cartridges)
+        async for i, response in self._iter_responses(
+            requests,
+            use_cartridge_endpoint=cartridges is not None or self.cartridges is not None,
+            sub_batch_size=sub_batch_size or self.config.sub_batch_size,
+        ):
+            yield i, self._to_sample(response, top_logprobs is not None, i)[0]
+
+
+class MultiTokasaurusClient(Client):
+    """Routes each batch to one of several Tokasaurus replicas by consistent hash of its prefix.
+
+    Batches for the same document (its `modal_upstream_id`, or else the first message
+    of the first chat) go to the same replica, whose KV cache already holds it. Replicas
+    are health-checked every `health_check_interval` seconds; a dead replica leaves the
+    ring (its documents move to their next replica) and rejoins once it answers again.
+
+    Only a replica that does not answer at all is failed over. Requests that fail on a
+    replica that is up come back as empty samples next to the successful ones;
+    `on_failure` applies when no replica answers.
+    """
+
+    class Config(TokasaurusClient.Config):
+        url: str = ""
+        urls: List[str]
+
+        vnodes: int = 64
+        health_check_interval: float = 30.0
+        health_check_timeout: float = 5.0
+
+        # Retries on one replica before it counts as unreachable and the batch fails over
+        replica_max_retries: int = 2
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.ring = ConsistentHashRing(vnodes=config.vnodes)
+        self.replicas: Dict[str, TokasaurusClient] = {}
+        self._urls: List[str] = []
+        self._batches: Counter = Counter()
+        self._failovers = 0
+        self._last_health_check = time.monotonic()
+
+        for url in config.urls:
+            self.add_replica(url)
+        if not self.ring:
+            raise ValueError(f"None of the Tokasaurus replicas {config.urls} is reachable")
+
+    def _replica_config(self, url: str) -> TokasaurusClient.Config:
+        fields = TokasaurusClient.Config.model_fields.keys() - {"target", "kwargs"}
+        return TokasaurusClient.Config(
+            **{k: getattr(self.config, k) for k in fields},
+        ).model_copy(update={
+            "url": url,
+            "max_retries": self.config.replica_max_retries,
+            # Failed requests come back empty; only an unreachable replica fails the batch over
+            "on_failure": "continue",
+            "raise_if_unreachable": True,
+        })
+
+    def _connect(self, url: str) -> bool:
+        if url not in self.replicas:
+            try:
+                self.replicas[url] = TokasaurusClient(self._replica_config(url))
+            except Exception as e:
+                logger.warning(f"Tokasaurus replica {url} is unavailable: {type(e).__name__}: {e}")
+                return False
+        self.ring.add(url)
+        return True
+
+    def add_replica(self, url: str) -> bool:
+        """Add a replica to the rotation; about 1/N of the documents move to it."""
+        if url not in self._urls:
+            self._urls.append(url)
+        return self._connect(url)
+
+    async def remove_replica(self, url: str) -> None:
+        """Take a replica out of rotation for good and close its connections."""
+        self.ring.remove(url)
+        if url in self._urls:
+            self._urls.remove(url)
+        replica = self.replicas.pop(url, None)
+        if replica is not None:
+            await replica.close()
+
+    async def check_health(self) -> Dict[str, bool]:
+        """Probe every replica's /v1/models; dead ones leave the ring and recovered ones rejoin."""
+        timeout = aiohttp.ClientTimeout(total=self.config.health_check_timeout)
+
+        async def probe(session: aiohttp.ClientSession, url: str) -> bool:
+            try:
+                async with session.get(f"{url}/v1/models", timeout=timeout) as resp:
+                    return resp.status == 200
+            except Exception:
+                return False
+
+        async with aiohttp.ClientSession() as session:
+            urls = list(self._urls)
+            healthy = dict(zip(urls, await asyncio.gather(*(probe(session, url) for url in urls))))
+
+        for url, ok in healthy.items():
+            if ok and url not in self.ring:
+                # The constructor checks the served model with a blocking request
+                if await asyncio.to_thread(self._connect, url):
+                    logger.info(f"Tokasaurus replica {url} is back in rotation")
+            elif not ok and url in self.ring:
+                logger.warning(f"Tokasaurus replica {url} failed its health check; taking it out of rotation")
+                self.ring.remove(url)
+        self._last_health_check = time.monotonic()
+        return healthy
+
+    def _routing_key(self, chats: List[List[Dict[str, Any]]], modal_upstream_id: Optional[str]) -> str:
+        if modal_upstream_id is not None:
+            return modal_upstream_id
+        content = chats[0][0].get("content", "") if chats and chats[0] else ""
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    async def chat(
+        self,
+        chats: List[List[Dict[str, Any]]],
+        max_completion_tokens: int,
+        modal_upstream_id: Optional[str] = None,
+        **kwargs,
+    ) -> ClientResponse:
+        """TokasaurusClient.chat on the replica that owns this batch's prefix, failing over along the ring."""
+        await self._maybe_check_health()
+        key = self._routing_key(chats, modal_upstream_id)
+        error: Optional[Exception] = None
+        for url in self.ring.preference(key):
+            try:
+                response = await self.replicas[url].chat(
+                    chats, max_completion_tokens, modal_upstream_id=modal_upstream_id, **kwargs
+                )
+                self._batches[url] += 1
+                return response
+            except ServerUnreachableError as e:
+                self._fail_over(url, e)
+                error = e
+
+        logger.error("No Tokasaurus replica could serve the batch")
+        if self.config.on_failure == "raise":
+            raise Exception("Failed to get response from any Tokasaurus replica") from error
+        return ClientResponse(
+            samples=[ClientSample(text="", token_ids=None, top_logprobs=None) for _ in chats],
+            usage=Usage(prompt_tokens=0, completion_tokens=0),
+        )
+
+    async def chat_stream(
+        self,
+        chats: List[List[Dict[str, Any]]],
+        max_completion_tokens: int,
+        modal_upstream_id: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[Tuple[int, ClientSample]]:
+        """TokasaurusClient.chat_stream on the owning replica; fails over only before the first sample."""
+        await self._maybe_check_health()
+        key = self._routing_key(chats, modal_upstream_id)
+        error: Optional[Exception] = None
+        for url in self.ring.preference(key):
+            started = False
+            try:
+                async for item in self.replicas[url].chat_stream(
+                    chats, max_completion_tokens, modal_upstream_id=modal_upstream_id, **kwargs
+                ):
+                    started = True
+                    yield item
+                self._batches[url] += 1
+                return
+            except ServerUnreachableError as e:
+                if started:
+                    raise
+                self._fail_over(url, e)
+                error = e
+
+        logger.error("No Tokasaurus replica could serve the batch")
+        if self.config.on_failure == "raise":
+            raise Exception("Failed to get response from any Tokasaurus replica") from error
+        for i in range(len(chats)):
+            yield i, ClientSample(text="", token_ids=None, top_logprobs=None)
+
+    async def _maybe_check_health(self) -> None:
+        if time.monotonic() - self._last_health_check >= self.config.health_check_interval:
+            self._last_health_check = time.monotonic()
+            await self.check_health()
+
+    def _fail_over(self, url: str, error: Exception) -> None:
+        logger.warning(f"Tokasaurus replica {url} failed ({type(error).__name__}: {error}); failing over")
+        self.ring.remove(url)
+        self._failovers += 1
+
+    async def close(self) -> None:
+        for replica in self.replicas.values():
+            await replica.close()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool metrics summed over replicas, plus routing per replica."""
+        per_replica = {url: replica.pool_stats() for url, replica in self.replicas.items()}
+        stats: Dict[str, Any] = Counter()
+        for replica_stats in per_replica.values():
+            stats.update({k: v for k, v in replica_stats.items() if isinstance(v, int)})
+        stats = dict(stats)
+        acquired = stats.get("connections_created", 0) + stats.get("connections_reused", 0)
+        stats["reuse_rate"] = stats.get("connections_reused", 0) / acquired if acquired else 0.0
+        stats["failovers"] = self._failovers
+        stats["replicas"] = {
+            url: {"in_rotation": url in self.ring, "batches": self._batches[url]} for url in self._urls
+        }
+        return stats
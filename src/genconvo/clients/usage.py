@@ -1,5 +1,9 @@
+import hashlib
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import tiktoken
 
@@ -74,80 +78,214 @@ def num_tokens_from_messages_openai(
     return num_tokens
 
 
+# Chat-format overhead per message, per name field and for priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PROMPT_TOKENS = 3
+
+# Texts up to this long are memoized by value; longer ones by a digest of their content
+_INLINE_KEY_CHARS = 256
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name: str) -> Any:
+    """Tokenizer by name, loaded once per process.
+
+    tiktoken encoding or model names (e.g. "cl100k_base", "gpt-4o") give a
+    tiktoken.Encoding; anything else is loaded as a Hugging Face tokenizer, through
+    transformers when it is installed, else as a `tokenizers.Tokenizer`.
+    """
+    try:
+        return tiktoken.get_encoding(name)
+    except ValueError:
+        pass
+    try:
+        return tiktoken.encoding_for_model(name)
+    except KeyError:
+        pass
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        from tokenizers import Tokenizer
+
+        return Tokenizer.from_pretrained(name)
+    return AutoTokenizer.from_pretrained(name)
+
+
+def message_texts(message: Dict[str, Any]) -> List[str]:
+    """The strings of a chat message that count as tokens.
+
+    `content` may be a string or a list of content blocks, as produced by
+    `CachedPromptMessage.to_messages`; only text blocks count (cache_control and
+    other block metadata are not sent as tokens).
+    """
+    texts = []
+    for key, value in message.items():
+        if isinstance(value, str):
+            texts.append(value)
+        elif key == "content" and isinstance(value, list):
+            for block in value:
+                if isinstance(block, str):
+                    texts.append(block)
+                elif isinstance(block, dict) and block.get("type") == "text":
+                    texts.append(block.get("text", ""))
+    return texts
+
+
+def _backend_tokenizer(tokenizer: Any) -> Any:
+    """The Rust `tokenizers.Tokenizer` behind a Hugging Face fast tokenizer, or None."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        return backend
+    if type(tokenizer).__module__.split(".")[0] == "tokenizers":
+        return tokenizer
+    return None
+
+
+class TokenCounter:
+    """Token counts for one tokenizer, memoized by content.
+
+    Counting the same document again (for another request, prompt type or plan)
+    costs a hash of its text instead of a re-encode. Cache misses are encoded in
+    one batch call: `encode_batch` on a tiktoken encoding or on the Rust backend of
+    a Hugging Face fast tokenizer, both of which tokenize in parallel. Without a
+    tokenizer, counts are estimated at 4 characters per token. Thread-safe.
+    """
+
+    def __init__(self, tokenizer: Any = None, max_entries: int = 100_000):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Union[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str) -> Union[str, bytes]:
+        if len(text) <= _INLINE_KEY_CHARS:
+            return text
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _encode_batch(self, texts: List[str]) -> List[int]:
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return [len(text) // 4 for text in texts]
+        if isinstance(tokenizer, tiktoken.Encoding):
+            return [len(ids) for ids in tokenizer.encode_batch(texts, disallowed_special=())]
+        backend = _backend_tokenizer(tokenizer)
+        if backend is not None:
+            return [len(encoding.ids) for encoding in backend.encode_batch(texts, add_special_tokens=False)]
+        counts = []
+        for text in texts:
+            try:
+                try:
+                    tokens = tokenizer.encode(text, add_special_tokens=False)
+                except TypeError:
+                    tokens = tokenizer.encode(text)
+                counts.append(len(tokens) if hasattr(tokens, "__len__") else len(text) // 4)
+            except Exception:
+                # Last resort: character-based estimation
+                counts.append(len(text) // 4)
+        return counts
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        """Token count of each text; texts not seen before are encoded in one batch."""
+        keys = [self._key(text) for text in texts]
+        found: Dict[Union[str, bytes], int] = {}
+        missing: Dict[Union[str, bytes], str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                count = self._counts.get(key)
+                if count is None:
+                    missing[key] = text
+                else:
+                    self._counts.move_to_end(key)
+                    found[key] = count
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            counts = self._encode_batch(list(missing.values()))
+            found.update(zip(missing, counts))
+            with self._lock:
+                for key, count in zip(missing, counts):
+                    self._counts[key] = count
+                    self._counts.move_to_end(key)
+                while len(self._counts) > self.max_entries:
+                    self._counts.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def count_messages(self, messages: Iterable[Dict[str, Any]], include_reply_prompt: bool = False) -> int:
+        return self.count_conversations([list(messages)], include_reply_prompt)[0]
+
+    def count_conversations(
+        self, conversations: Sequence[Sequence[Dict[str, Any]]], include_reply_prompt: bool = False
+    ) -> List[int]:
+        """Prompt tokens of each conversation, with every distinct text encoded at most once."""
+        per_message = [[message_texts(m) for m in messages] for messages in conversations]
+        counts = iter(self.count_batch([t for texts in per_message for m in texts for t in m]))
+        totals = []
+        for messages, texts in zip(conversations, per_message):
+            if self.tokenizer is None:
+                # No chat overhead in the character estimate
+                totals.append(sum(next(counts) for m in texts for _ in m))
+                continue
+            total = REPLY_PROMPT_TOKENS if include_reply_prompt else 0
+            for message, message_text in zip(messages, texts):
+                total += TOKENS_PER_MESSAGE + sum(next(counts) for _ in message_text)
+                if "name" in message:
+                    total += TOKENS_PER_NAME
+            totals.append(total)
+        return totals
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._counts)}
+
+
+_COUNTERS: Dict[int, TokenCounter] = {}
+_COUNTERS_LOCK = threading.Lock()
+
+
+def token_counter(tokenizer: Any = None) -> TokenCounter:
+    """The process-wide memoizing counter for `tokenizer` (None: 4 characters per token)."""
+    with _COUNTERS_LOCK:
+        # The counter holds the tokenizer, so its id stays valid while the entry exists
+        counter = _COUNTERS.get(id(tokenizer))
+        if counter is None:
+            counter = _COUNTERS[id(tokenizer)] = TokenCounter(tokenizer)
+        return counter
+
+
 def num_tokens_from_messages_flexible(
-    messages: List[Dict[str, str]], 
+    messages: List[Dict[str, Any]],
     tokenizer: Union[tiktoken.Encoding, Any],
     include_reply_prompt: bool = False,
 ):
     """Return the number of tokens used by a list of messages.
-    
-    Works with both tiktoken.Encoding and Huggingface tokenizers.
+
+    Works with tiktoken encodings, Huggingface tokenizers and anything with an
+    `encode` method; without a usable tokenizer, estimates 4 characters per token.
+    Message content may be a string or a list of content blocks. Counts are
+    memoized per tokenizer (see `token_counter`).
     """
-    
-    # Check if it's a tiktoken encoding
-    if hasattr(tokenizer, 'encode') and hasattr(tokenizer, 'name'):
-        # Use the original OpenAI counting logic for tiktoken
-        return num_tokens_from_messages_openai(messages, tokenizer, include_reply_prompt)
-    
-    # Handle Huggingface tokenizers
+    if not hasattr(tokenizer, "encode") and _backend_tokenizer(tokenizer) is None:
+        tokenizer = None
+    return token_counter(tokenizer).count_messages(messages, include_reply_prompt)
+
+
+def load_tokenizer() -> Tuple[Any, str]:
+    """tiktoken cl100k_base as a stand-in for the Claude tokenizer, else ~4 chars per token."""
     try:
-        # Import here to avoid dependency issues if transformers isn't installed
-        from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast
-        
-        if isinstance(tokenizer, (PreTrainedTokenizer, PreTrainedTokenizerFast)):
-            # For Huggingface tokenizers, we need to estimate the overhead
-            # Different models have different chat templates and overhead
-            tokens_per_message = 3  # Conservative estimate
-            tokens_per_name = 1
-            
-            num_tokens = 0
-            for message in messages:
-                num_tokens += tokens_per_message
-                for key, value in message.items():
-                    # Use the tokenizer's encode method
-                    tokens = tokenizer.encode(value, add_special_tokens=False)
-                    num_tokens += len(tokens)
-                    if key == "name":
-                        num_tokens += tokens_per_name
-                        
-            if include_reply_prompt:
-                num_tokens += 3  # Rough estimate for reply prompt
-                
-            return num_tokens
-        
-    except ImportError:
-        pass
-    
-    # Fallback: if we can't identify the tokenizer type, try to use it anyway
-    # This handles custom tokenizers that implement an encode method
-    if hasattr(tokenizer, 'encode'):
-        tokens_per_message = 3
-        tokens_per_name = 1
-        
-        num_tokens = 0
-        for message in messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                try:
-                    tokens = tokenizer.encode(value)
-                    # Handle different return types (list of ints, tensor, etc.)
-                    if hasattr(tokens, '__len__'):
-                        num_tokens += len(tokens)
-                    else:
-                        # Fallback to character-based estimation
-                        num_tokens += len(value) // 4  # Rough estimate: 4 chars per token
-                except Exception:
-                    # Last resort: character-based estimation
-                    num_tokens += len(value) // 4
-                    
-                if key == "name":
-                    num_tokens += tokens_per_name
-                    
-        if include_reply_prompt:
-            num_tokens += 3
-            
-        return num_tokens
-    
-    # Final fallback: character-based estimation
-    total_chars = sum(len(str(message.get(key, ""))) for message in messages for key in message)
-    return total_chars // 4  # Very rough estimate
\ No newline at end of file
+        return get_tokenizer("cl100k_base"), "cl100k_base"
+    except Exception:
+        return None, "chars/4"
+
+
+def count_message_tokens(tokenizer: Any, role: str, text: str) -> int:
+    """Tokens of a single chat message with `role` and `text` (see num_tokens_from_messages_flexible)."""
+    return num_tokens_from_messages_flexible([{"role": role, "content": text}], tokenizer)
@@ -0,0 +1,264 @@
+"""
+Offline batch engine for GenConvo: bulk jobs through a batch-submission endpoint.
+
+Instead of driving request/response calls through verdict's workers and rate
+limiter, every request is serialized into a batch job file and submitted to a
+BatchBackend, which is then polled for results. Answers depend on questions, so
+a run has two phases: one question request per (document, prompt type), then
+one answer request per generated question. Answer requests that fail or come
+back unparseable are resubmitted once.
+
+Batch ids are saved in `<work_dir>/state.json` as soon as they are submitted, so
+re-running with the same work_dir resumes polling instead of paying again.
+Results go through parse_results and GenConvoDatasetManager like a normal run.
+"""
+
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import ValidationError
+from verdict.schema import Schema
+
+from .batch import BatchJob, BatchJobResult
+from .clients.batches import BatchBackend
+from .prompts.questions import GEN_CONVO_PROMPT_REGISTRY
+from .units.answer import AnswerUnit
+from .units.question import QuestionsUnit
+from .utils.dataset_manager import GenConvoDatasetManager
+from .utils.parser import layout_results, parse_results
+from .utils.schemas import ParseContext
+from .utils.sidecar import read_markdown
+
+# Structured output is obtained by forcing a single tool call with the response schema
+RESPONSE_TOOL = "respond"
+
+
+def build_request(
+    custom_id: str,
+    model_name: str,
+    system: str,
+    user: str,
+    response_schema: Type[Schema],
+    temperature: float,
+    max_tokens: int,
+) -> Dict[str, Any]:
+    """One batch request; the document is sent as a cached system block."""
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": model_name.split("/")[-1],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "system": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+            "messages": [{"role": "user", "content": user}],
+            "tools": [
+                {
+                    "name": RESPONSE_TOOL,
+                    "description": "Return the response.",
+                    "input_schema": response_schema.model_json_schema(),
+                }
+            ],
+            "tool_choice": {"type": "tool", "name": RESPONSE_TOOL},
+        },
+    }
+
+
+def parse_result(entry: Dict[str, Any], response_schema: Type[Schema]) -> Optional[Schema]:
+    """The response carried by a result entry, or None if it errored or does not validate."""
+    result = entry.get("result") or {}
+    if result.get("type") != "succeeded":
+        return None
+    for block in result.get("message", {}).get("content", []):
+        if block.get("type") == "tool_use" and block.get("name") == RESPONSE_TOOL:
+            try:
+                return response_schema.model_validate(block["input"])
+            except ValidationError:
+                return None
+    return None
+
+
+class OfflineBatchEngine:
+    """Runs BatchJobs through a BatchBackend in a question phase and an answer phase."""
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        work_dir: str,
+        poll_interval: float = 60.0,
+        max_tokens: int = 4096,
+    ):
+        self.backend = backend
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.max_tokens = max_tokens
+        self._state_path = self.work_dir / "state.json"
+
+    def _load_state(self) -> Dict[str, str]:
+        if self._state_path.exists():
+            return json.loads(self._state_path.read_text())
+        return {}
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        tmp_path = self._state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2))
+        tmp_path.replace(self._state_path)
+
+    def _check_fingerprint(self, jobs: List[BatchJob], *settings: Any) -> None:
+        """Custom ids are positional, so a work_dir can only be resumed with the same jobs."""
+        fingerprint = hashlib.md5(
+            json.dumps([[j.doc_name, list(j.prompt_types)] for j in jobs] + list(settings)).encode()
+        ).hexdigest()
+        state = self._load_state()
+        if state.get("fingerprint", fingerprint) != fingerprint:
+            raise ValueError(f"{self.work_dir} holds batches for different jobs or settings; use a new work_dir")
+        state["fingerprint"] = fingerprint
+        self._save_state(state)
+
+    def _submit_and_wait(self, phase: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Submit `requests` as one batch (or resume the one already submitted) and wait for it."""
+        if not requests:
+            return {}
+        state = self._load_state()
+        batch_id = state.get(phase)
+        if batch_id is None:
+            requests_path = self.work_dir / f"{phase}.jsonl"
+            with open(requests_path, "w", encoding="utf-8") as f:
+                for request in requests:
+                    f.write(json.dumps(request) + "\n")
+            batch_id = self.backend.submit(requests_path)
+            state[phase] = batch_id
+            self._save_state(state)
+            print(f"Submitted {phase} batch {batch_id} ({len(requests)} requests)", file=sys.stderr)
+        else:
+            print(f"Resuming {phase} batch {batch_id}", file=sys.stderr)
+
+        t0 = time.time()
+        while not self.backend.is_done(batch_id):
+            print(f"Waiting for {phase} batch {batch_id} ({time.time() - t0:.0f}s)", file=sys.stderr)
+            time.sleep(self.poll_interval)
+        return {entry["custom_id"]: entry for entry in self.backend.results(batch_id)}
+
+    def run(
+        self,
+        jobs: List[BatchJob],
+        dataset_directory: str,
+        num_questions: int = 16,
+        model_name: str = "claude-sonnet-4-20250514",
+        temperature: float = 0.7,
+    ) -> List[BatchJobResult]:
+        """Generate and save datasets for `jobs`. Returns one BatchJobResult per job, in order."""
+        t0 = time.time()
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._check_fingerprint(jobs, num_questions, model_name, temperature)
+        documents: Dict[str, str] = {}
+        errors: Dict[int, str] = {}
+
+        for j, job in enumerate(jobs):
+            if job.doc_name in documents:
+                continue
+            try:
+                documents[job.doc_name] = read_markdown(Path(dataset_directory) / job.filename)
+            except OSError as exc:
+                errors[j] = f"{type(exc).__name__}: {exc}"
+
+        def request(custom_id: str, doc_name: str, user: str, schema: Type[Schema]) -> Dict[str, Any]:
+            return build_request(
+                custom_id, model_name, documents[doc_name], user, schema, temperature, self.max_tokens
+            )
+
+        # Phase 1: questions
+        question_requests = [
+            request(
+                f"q-{j}-{p}", job.doc_name,
+                QuestionsUnit.format_user(GEN_CONVO_PROMPT_REGISTRY[pt], num_questions),
+                QuestionsUnit.ResponseSchema,
+            )
+            for j, job in enumerate(jobs) if j not in errors
+            for p, pt in enumerate(job.prompt_types)
+        ]
+        question_results = self._submit_and_wait("questions", question_requests)
+
+        questions: Dict[Tuple[int, int], List[str]] = {}
+        for j, job in enumerate(jobs):
+            for p, pt in enumerate(job.prompt_types):
+                if j in errors:
+                    continue
+                response = parse_result(question_results.get(f"q-{j}-{p}", {}), QuestionsUnit.ResponseSchema)
+                if response is None:
+                    errors[j] = f"question request for {pt} failed"
+                else:
+                    questions[(j, p)] = response.questions  # type: ignore[attr-defined]
+
+        # Phase 2: answers, with one resubmission of anything that failed
+        answer_requests = {
+            f"a-{j}-{p}-{i}": request(f"a-{j}-{p}-{i}", jobs[j].doc_name, AnswerUnit.format_user(q), AnswerUnit.ResponseSchema)
+            for (j, p), qs in questions.items() if j not in errors
+            for i, q in enumerate(qs)
+        }
+        answers: Dict[str, str] = {}
+        pending = list(answer_requests)
+        for phase in ("answers", "answers_retry"):
+            results = self._submit_and_wait(phase, [answer_requests[cid] for cid in pending])
+            for cid in pending:
+                response = parse_result(results.get(cid, {}), AnswerUnit.ResponseSchema)
+                if response is not None:
+                    answers[cid] = response.answer  # type: ignore[attr-defined]
+            pending = [cid for cid in pending if cid not in answers]
+        if pending:
+            print(f"Warning: {len(pending)} answer requests failed twice and were dropped", file=sys.stderr)
+
+        dataset_manager = GenConvoDatasetManager()
+        batch_results = []
+        for j, job in enumerate(jobs):
+            if j in errors:
+                batch_results.append(BatchJobResult(
+                    doc_name=job.doc_name, prompt_type=job.prompt_type, status="failed",
+                    error=errors[j], elapsed_seconds=time.time() - t0,
+                ))
+                continue
+
+            context = ParseContext(
+                filename=job.filename,
+                dataset_directory=str(dataset_directory),
+                model=model_name,
+                temperature=temperature,
+                prompt_type=job.prompt_type,
+            )
+            branches = {
+                pt: (
+                    questions[(j, p)],
+                    {i: answers[f"a-{j}-{p}-{i}"] for i in range(len(questions[(j, p)])) if f"a-{j}-{p}-{i}" in answers},
+                )
+                for p, pt in enumerate(job.prompt_types)
+            }
+            try:
+                results = layout_results(documents[job.doc_name], branches, name="GenConvoBatch")
+                qa_pairs = parse_results(results, context, run_id)
+                if not qa_pairs:
+                    raise ValueError("all answer requests failed")
+                dataset_paths = dataset_manager.save_qa_pairs_by_prompt_type(qa_pairs)
+            except Exception as exc:
+                # One job's failure must not keep the others from being saved (as in run_batch)
+                batch_results.append(BatchJobResult(
+                    doc_name=job.doc_name, prompt_type=job.prompt_type, status="failed",
+                    error=f"{type(exc).__name__}: {exc}", elapsed_seconds=time.time() - t0,
+                ))
+                continue
+            batch_results.append(BatchJobResult(
+                doc_name=job.doc_name,
+                prompt_type=job.prompt_type,
+                status="ok",
+                dataset_path=dataset_paths.get(job.prompt_type),
+                dataset_paths=dataset_paths,
+                # Questions asked, as the live engines report it (failed answers are dropped)
+                total_questions=num_questions * len(job.prompt_types),
+                context=context.to_dict(),
+                elapsed_seconds=time.time() - t0,
+            ))
+        return batch_results
@@ -0,0 +1,535 @@
+"""
+Pre-flight planner for GenConvo runs: token, wall-clock and cost estimates.
+
+The planner tokenizes the target documents, builds the exact request list a run
+would send (one question call per prompt type plus one answer call per question),
+and replays it through a small discrete-event simulation of the worker pool,
+the document cache warmup gate, job concurrency and the provider's time-window
+rate limits from genconvo.config. Nothing is sent to a provider.
+"""
+
+import heapq
+import math
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import config  # noqa: F401  (registers Anthropic rate limits with verdict)
+from .batch import BatchJob, build_jobs
+from .clients.usage import count_message_tokens, load_tokenizer, token_counter
+from .prompts.questions import GEN_CONVO_PROMPT_REGISTRY
+from .units.answer import AnswerUnit, BatchedAnswerUnit
+from .units.question import QuestionsUnit
+from .utils.retrieval import RetrievalConfig
+from .utils.markdown import MarkdownSection
+from .utils.sections import plan_sections
+from .utils.sidecar import ensure_sidecar, read_markdown
+
+# A worker count is "saturated" once its wall-clock is within this factor of unlimited workers
+SATURATION_TOLERANCE = 1.01
+
+
+@dataclass(frozen=True)
+class ModelPricing:
+    """USD per million tokens."""
+    input: float
+    output: float
+    cache_write: float
+    cache_read: float
+
+
+# Longest matching prefix wins
+MODEL_PRICING: Dict[str, ModelPricing] = {
+    "claude-opus-4": ModelPricing(input=15.0, output=75.0, cache_write=18.75, cache_read=1.50),
+    "claude-sonnet-4": ModelPricing(input=3.0, output=15.0, cache_write=3.75, cache_read=0.30),
+    "claude-3-7-sonnet": ModelPricing(input=3.0, output=15.0, cache_write=3.75, cache_read=0.30),
+    "claude-3-5-sonnet": ModelPricing(input=3.0, output=15.0, cache_write=3.75, cache_read=0.30),
+    "claude-3-5-haiku": ModelPricing(input=0.80, output=4.0, cache_write=1.0, cache_read=0.08),
+    "claude-3-haiku": ModelPricing(input=0.25, output=1.25, cache_write=0.30, cache_read=0.03),
+}
+
+
+def pricing_for(model_name: str) -> Optional[ModelPricing]:
+    name = model_name.split("/")[-1]
+    matches = [prefix for prefix in MODEL_PRICING if name.startswith(prefix)]
+    return MODEL_PRICING[max(matches, key=len)] if matches else None
+
+
+@dataclass
+class RequestEstimate:
+    """Token footprint of one provider call."""
+    doc_name: str
+    prompt_type: str
+    kind: str  # "questions" or "answer"
+    prompt_tokens: int
+    completion_tokens: int
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    # Whether the call waits on the document cache warmup gate; section-targeted and
+    # retrieval answer calls skip it (see GenConvoSynthesizer._attach)
+    gated: bool = True
+
+    @property
+    def uncached_prompt_tokens(self) -> int:
+        return self.prompt_tokens - self.cache_read_tokens - self.cache_write_tokens
+
+
+@dataclass
+class BranchEstimate:
+    """One prompt type on one document: a question call, then its answer fan-out."""
+    questions: RequestEstimate
+    answers: List[RequestEstimate]
+
+
+@dataclass
+class JobEstimate:
+    job: BatchJob
+    branches: List[BranchEstimate]
+
+    @property
+    def requests(self) -> List[RequestEstimate]:
+        return [r for b in self.branches for r in [b.questions, *b.answers]]
+
+
+@dataclass
+class LatencyModel:
+    """Per-request latency: fixed overhead + prefill of uncached input + decoding."""
+    base_seconds: float = 1.0
+    prefill_tokens_per_second: float = 20_000.0
+    output_tokens_per_second: float = 60.0
+
+    def seconds(self, request: RequestEstimate) -> float:
+        return (
+            self.base_seconds
+            + (request.prompt_tokens - request.cache_read_tokens) / self.prefill_tokens_per_second
+            + request.completion_tokens / self.output_tokens_per_second
+        )
+
+
+@dataclass(frozen=True)
+class WindowLimit:
+    metric: str  # "requests" or "tokens"
+    max_value: int
+    window_seconds: float
+
+
+def rate_limits_for(model_name: str) -> List[WindowLimit]:
+    """Time-window limits verdict would apply to `model_name` (see genconvo.config)."""
+    from litellm import get_llm_provider  # type: ignore[import-untyped]
+    from verdict.config import DEFAULT_RATE_LIMITER, PROVIDER_RATE_LIMITER
+
+    try:
+        _, provider, _, _ = get_llm_provider(model_name)
+    except Exception:
+        provider = None
+    policy = PROVIDER_RATE_LIMITER.get(provider, DEFAULT_RATE_LIMITER)
+
+    limits = []
+    for limiter, metric in policy.rate_limiters.items():
+        # Concurrency limiters are covered by max_workers
+        if hasattr(limiter, "window_seconds"):
+            limits.append(WindowLimit(metric.value, limiter.max_value, limiter.window_seconds))
+    return limits
+
+
+def estimate_jobs(
+    dataset_directory: str,
+    jobs: List[BatchJob],
+    num_questions: int,
+    tokenizer: Any = None,
+    question_tokens: int = 40,
+    answer_tokens: int = 300,
+    questions_per_call: int = 1,
+    section_context: bool = False,
+    questions_per_section: int = 2,
+    retrieval: Optional[RetrievalConfig] = None,
+    tokenizer_name: Optional[str] = None,
+) -> Tuple[List[JobEstimate], Dict[str, int]]:
+    """Build the request list for `jobs` with token counts.
+
+    With `questions_per_call` > 1, answer calls are grouped as BatchedAnswerUnit
+    groups them, each carrying its questions and returning their answers.
+
+    With `section_context`, system prompts are the section plans' contexts (see
+    utils/sections.py) instead of the document, counted as uncached input.
+    With `retrieval`, each answer call is assumed to fill its token budget with
+    retrieved passages (uncached), or to send the document if it is smaller;
+    fallbacks to the full document are not predicted.
+
+    With `tokenizer_name`, document token counts come from each document's sidecar
+    (see utils/sidecar.py), which is built or extended under that name if needed, so
+    indexed documents are not read at all.
+
+    The first call on a document writes its cached system prompt; every later call
+    on that document (any prompt type, any job) reads it, as with DocumentCacheWarmup.
+
+    Returns (job estimates, document tokens by doc name).
+    """
+    document_tokens: Dict[str, int] = {}
+    question_prompt_tokens = {
+        pt: count_message_tokens(tokenizer, "user", QuestionsUnit.format_user(GEN_CONVO_PROMPT_REGISTRY[pt], num_questions))
+        for job in jobs for pt in job.prompt_types
+    }
+    questions_per_call = max(1, questions_per_call)
+    if questions_per_call == 1:
+        answer_prompt_tokens = count_message_tokens(tokenizer, "user", AnswerUnit.format_user("")) + question_tokens
+    else:
+        blank = BatchedAnswerUnit.format_user_batch([""] * questions_per_call)
+        answer_prompt_tokens = count_message_tokens(tokenizer, "user", blank) + questions_per_call * question_tokens
+    # The last group may be short; close enough for planning
+    answer_calls = math.ceil(num_questions / questions_per_call)
+
+    filenames = {job.doc_name: job.filename for job in jobs}
+    texts: Dict[str, str] = {}
+    sections: Dict[str, List[MarkdownSection]] = {}
+    if tokenizer_name is not None:
+        # The system message adds the same few tokens to every document
+        overhead = count_message_tokens(tokenizer, "system", "")
+        for doc_name, filename in filenames.items():
+            path = Path(dataset_directory) / filename
+            sidecar = ensure_sidecar(path, tokenizers={tokenizer_name: tokenizer})
+            document_tokens[doc_name] = overhead + (sidecar.document_tokens(tokenizer_name) or 0)
+            if section_context:
+                texts[doc_name] = read_markdown(path)
+                sections[doc_name] = sidecar.markdown_sections(texts[doc_name])
+    else:
+        # Every document in one batch encode; counts are memoized for later plans and runs
+        for doc_name, filename in filenames.items():
+            texts[doc_name] = read_markdown(Path(dataset_directory) / filename)
+        conversations = [[{"role": "system", "content": t}] for t in texts.values()]
+        document_tokens.update(zip(texts, token_counter(tokenizer).count_conversations(conversations)))
+        if not section_context:
+            texts.clear()
+
+    primed: set[str] = set()
+    estimates = []
+    for job in jobs:
+        system_tokens = document_tokens[job.doc_name]
+
+        def request(prompt_type: str, kind: str, user_tokens: int, completion_tokens: int) -> RequestEstimate:
+            est = RequestEstimate(
+                doc_name=job.doc_name,
+                prompt_type=prompt_type,
+                kind=kind,
+                prompt_tokens=system_tokens + user_tokens,
+                completion_tokens=completion_tokens,
+            )
+            if job.doc_name in primed:
+                est.cache_read_tokens = system_tokens
+            else:
+                est.cache_write_tokens = system_tokens
+                primed.add(job.doc_name)
+            return est
+
+        def narrowed(prompt_type: str, kind: str, system: str, user_tokens: int, completion_tokens: int):
+            return RequestEstimate(
+                doc_name=job.doc_name,
+                prompt_type=prompt_type,
+                kind=kind,
+                prompt_tokens=count_message_tokens(tokenizer, "system", system) + user_tokens,
+                completion_tokens=completion_tokens,
+                gated=False,
+            )
+
+        branches = []
+        for pt in job.prompt_types:
+            if section_context:
+                plan = plan_sections(
+                    texts[job.doc_name], pt, num_questions, questions_per_section, sections=sections.get(job.doc_name)
+                )
+                instructions = count_message_tokens(tokenizer, "user", plan.question_instructions())
+                questions = narrowed(
+                    pt, "questions", plan.question_context(), question_prompt_tokens[pt] + instructions,
+                    num_questions * question_tokens,
+                )
+                answers = [
+                    narrowed(
+                        pt, "answer",
+                        plan.answer_context(range(i, min(i + questions_per_call, num_questions))),
+                        answer_prompt_tokens, questions_per_call * answer_tokens,
+                    )
+                    for i in range(0, num_questions, questions_per_call)
+                ]
+            else:
+                questions = request(pt, "questions", question_prompt_tokens[pt], num_questions * question_tokens)
+                if retrieval is not None and system_tokens > retrieval.token_budget:
+                    passage_tokens = questions_per_call * retrieval.token_budget
+                    answers = [
+                        RequestEstimate(
+                            doc_name=job.doc_name,
+                            prompt_type=pt,
+                            kind="answer",
+                            prompt_tokens=min(system_tokens, passage_tokens) + answer_prompt_tokens,
+                            completion_tokens=questions_per_call * answer_tokens,
+                            gated=False,
+                        )
+                        for _ in range(answer_calls)
+                    ]
+                else:
+                    answers = [
+                        request(pt, "answer", answer_prompt_tokens, questions_per_call * answer_tokens)
+                        for _ in range(answer_calls)
+                    ]
+                    if retrieval is not None:
+                        # Short documents are sent whole, but still outside the gate
+                        for answer in answers:
+                            answer.gated = False
+            branches.append(BranchEstimate(questions=questions, answers=answers))
+        estimates.append(JobEstimate(job=job, branches=branches))
+
+    return estimates, document_tokens
+
+
+class _Window:
+    """Sliding-window counter; callers advance time monotonically."""
+
+    def __init__(self, limit: WindowLimit):
+        self.limit = limit
+        self.entries: deque[Tuple[float, int]] = deque()
+        self.total = 0
+
+    def earliest(self, t: float, value: int) -> float:
+        """Earliest time >= t at which `value` fits in the window."""
+        while self.entries and (
+            self.entries[0][0] + self.limit.window_seconds <= t or self.total + value > self.limit.max_value
+        ):
+            start, v = self.entries.popleft()
+            self.total -= v
+            t = max(t, start + self.limit.window_seconds)
+        return t
+
+    def add(self, t: float, value: int) -> None:
+        self.entries.append((t, value))
+        self.total += value
+
+
+@dataclass
+class SimulationResult:
+    max_workers: int
+    wall_clock_seconds: float
+    # Seconds requests spent ready but held back, by cause
+    waits: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def bottleneck(self) -> str:
+        """The limit requests waited on most, or 'latency' if they rarely waited."""
+        cause, waited = max(self.waits.items(), key=lambda kv: kv[1], default=("latency", 0.0))
+        return cause if waited > 0.05 * self.wall_clock_seconds else "latency"
+
+
+def _limit_value(request: RequestEstimate, metric: str, cache_reads_count: bool) -> int:
+    if metric == "requests":
+        return 1
+    prompt = request.prompt_tokens if cache_reads_count else request.prompt_tokens - request.cache_read_tokens
+    return prompt + request.completion_tokens
+
+
+def simulate(
+    estimates: List[JobEstimate],
+    limits: List[WindowLimit],
+    max_workers: int,
+    max_concurrent_jobs: int = 4,
+    latency: Optional[LatencyModel] = None,
+    cache_reads_count: bool = True,
+) -> SimulationResult:
+    """Replay the run's schedule and return its simulated wall-clock.
+
+    Mirrors run_batch: at most `max_concurrent_jobs` jobs in flight, a shared pool of
+    `max_workers`, question calls before their answers, and every gated call on a
+    document held until the first gated call on it has written the cache. Requests
+    are dispatched FIFO by ready time, and a request must fit every rate-limit window
+    when it starts.
+    """
+    latency = latency or LatencyModel()
+    windows = [_Window(limit) for limit in limits]
+    workers = [0.0] * max(1, max_workers)
+    waits = {"workers": 0.0, **{limit.metric: 0.0 for limit in limits}}
+
+    queue: List[Tuple[float, int, int, RequestEstimate, Optional[BranchEstimate]]] = []
+    seq = 0
+    warm_at: Dict[str, float] = {}
+    remaining: Dict[int, int] = {}
+    job_finish: Dict[int, float] = {}
+    pending_jobs = deque(range(len(estimates)))
+
+    def push(ready: float, job_index: int, request: RequestEstimate, branch: Optional[BranchEstimate]) -> None:
+        nonlocal seq
+        heapq.heappush(queue, (ready, seq, job_index, request, branch))
+        seq += 1
+
+    def admit(t: float) -> None:
+        job_index = pending_jobs.popleft()
+        estimate = estimates[job_index]
+        remaining[job_index] = len(estimate.requests)
+        job_finish[job_index] = t
+        for branch in estimate.branches:
+            push(t, job_index, branch.questions, branch)
+
+    for _ in range(min(max(1, max_concurrent_jobs), len(estimates))):
+        admit(0.0)
+
+    clock = 0.0
+    end = 0.0
+    while queue:
+        ready, _, job_index, request, branch = heapq.heappop(queue)
+        leader_done = warm_at.get(request.doc_name) if request.gated else None
+        if leader_done is not None and leader_done > ready:
+            # The cache warmup gate holds this call until the leader finishes
+            push(leader_done, job_index, request, branch)
+            continue
+
+        t = max(ready, clock)
+        started = max(t, workers[0])
+        waits["workers"] += started - t
+        t = started
+        for window in windows:
+            value = _limit_value(request, window.limit.metric, cache_reads_count)
+            if value > window.limit.max_value:
+                raise ValueError(
+                    f"A single {request.kind} request on {request.doc_name} needs {value} "
+                    f"{window.limit.metric}, above the limit of {window.limit.max_value} "
+                    f"per {window.limit.window_seconds:g}s"
+                )
+            allowed = window.earliest(t, value)
+            waits[window.limit.metric] += allowed - t
+            t = allowed
+        for window in windows:
+            window.add(t, _limit_value(request, window.limit.metric, cache_reads_count))
+
+        clock = t
+        finish = t + latency.seconds(request)
+        heapq.heapreplace(workers, finish)
+        end = max(end, finish)
+        if request.gated:
+            warm_at.setdefault(request.doc_name, finish)
+
+        if branch is not None:
+            for answer in branch.answers:
+                push(finish, job_index, answer, None)
+
+        remaining[job_index] -= 1
+        job_finish[job_index] = max(job_finish[job_index], finish)
+        if remaining[job_index] == 0 and pending_jobs:
+            admit(job_finish[job_index])
+
+    return SimulationResult(max_workers=max_workers, wall_clock_seconds=end, waits=waits)
+
+
+def saturation_point(
+    estimates: List[JobEstimate],
+    limits: List[WindowLimit],
+    max_concurrent_jobs: int = 4,
+    latency: Optional[LatencyModel] = None,
+    cache_reads_count: bool = True,
+) -> Tuple[SimulationResult, SimulationResult]:
+    """Smallest max_workers whose wall-clock is within SATURATION_TOLERANCE of unlimited workers.
+
+    Returns (saturated result, unlimited-workers result). The latter's bottleneck is
+    what caps the run once workers are no longer the constraint.
+    """
+    def run(workers: int) -> SimulationResult:
+        return simulate(estimates, limits, workers, max_concurrent_jobs, latency, cache_reads_count)
+
+    upper = max(1, sum(len(e.requests) for e in estimates))
+    unlimited = best = run(upper)
+    target = unlimited.wall_clock_seconds * SATURATION_TOLERANCE
+    lo, hi = 1, upper
+    while lo < hi:
+        mid = (lo + hi) // 2
+        result = run(mid)
+        if result.wall_clock_seconds <= target:
+            hi, best = mid, result
+        else:
+            lo = mid + 1
+    return best, unlimited
+
+
+def estimate_cost(requests: List[RequestEstimate], pricing: ModelPricing) -> Dict[str, float]:
+    per_token = 1 / 1_000_000
+    cost = {
+        "input": sum(r.uncached_prompt_tokens for r in requests) * pricing.input * per_token,
+        "cache_write": sum(r.cache_write_tokens for r in requests) * pricing.cache_write * per_token,
+        "cache_read": sum(r.cache_read_tokens for r in requests) * pricing.cache_read * per_token,
+        "output": sum(r.completion_tokens for r in requests) * pricing.output * per_token,
+    }
+    cost["total"] = sum(cost.values())
+    return cost
+
+
+def plan_run(
+    dataset_directory: str,
+    doc_names: List[str],
+    prompt_types: List[str],
+    num_questions: int = 16,
+    model_name: str = "claude-sonnet-4-20250514",
+    max_workers: int = 8,
+    max_concurrent_jobs: int = 4,
+    single_pipeline: bool = False,
+    questions_per_call: int = 1,
+    question_tokens: int = 40,
+    answer_tokens: int = 300,
+    latency: Optional[LatencyModel] = None,
+    cache_reads_count: bool = True,
+    section_context: bool = False,
+    questions_per_section: int = 2,
+    retrieval: Optional[RetrievalConfig] = None,
+) -> Dict[str, Any]:
+    """Estimate tokens, wall-clock, bottleneck, useful max_workers and cost of a run.
+
+    Args:
+        question_tokens: Expected tokens per generated question.
+        answer_tokens: Expected completion tokens per answer (reasoning + final answer).
+        cache_reads_count: Count cache-read input tokens against the token limit.
+            Matches the "input + output combined" limits in genconvo.config; turn off
+            for models whose provider exempts cache reads from input-token limits.
+
+    Returns:
+        JSON-friendly summary; "error" is set if a single request can never fit a limit.
+    """
+    latency = latency or LatencyModel()
+    tokenizer, tokenizer_name = load_tokenizer()
+    jobs = build_jobs(doc_names, prompt_types, single_pipeline)
+    estimates, document_tokens = estimate_jobs(
+        dataset_directory, jobs, num_questions, tokenizer, question_tokens, answer_tokens, questions_per_call,
+        section_context, questions_per_section, retrieval, tokenizer_name,
+    )
+    requests = [r for e in estimates for r in e.requests]
+    limits = rate_limits_for(model_name)
+    pricing = pricing_for(model_name)
+
+    summary: Dict[str, Any] = {
+        "model": model_name,
+        "tokenizer": tokenizer_name,
+        "documents": document_tokens,
+        "jobs": len(jobs),
+        "requests": len(requests),
+        "tokens": {
+            "prompt": sum(r.prompt_tokens for r in requests),
+            "cache_write": sum(r.cache_write_tokens for r in requests),
+            "cache_read": sum(r.cache_read_tokens for r in requests),
+            "completion": sum(r.completion_tokens for r in requests),
+        },
+        "rate_limits": [asdict(limit) for limit in limits],
+        "latency_model": asdict(latency),
+        "cost_usd": estimate_cost(requests, pricing) if pricing else None,
+        "max_workers": max_workers,
+        "error": None,
+    }
+
+    try:
+        result = simulate(estimates, limits, max_workers, max_concurrent_jobs, latency, cache_reads_count)
+        saturated, unlimited = saturation_point(estimates, limits, max_concurrent_jobs, latency, cache_reads_count)
+    except ValueError as exc:
+        summary["error"] = str(exc)
+        return summary
+
+    summary.update({
+        "wall_clock_seconds": result.wall_clock_seconds,
+        "bottleneck": result.bottleneck,
+        "waits_seconds": result.waits,
+        "saturation_workers": saturated.max_workers,
+        "saturation_wall_clock_seconds": saturated.wall_clock_seconds,
+        "saturation_bottleneck": unlimited.bottleneck,
+    })
+    return summary
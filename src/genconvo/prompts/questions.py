@@ -152,3 +152,6 @@ GEN_CONVO_PROMPT_REGISTRY = {
     "counting_v2": COUNTING_V2_PROMPT, # Mauri's prompts
     "synthesis_v2": SYNTHESIS_V2_PROMPT, # Mauri's prompts
 }
+
+# The six prompt types used for GenConvoBench in the paper
+PAPER_PROMPT_TYPES = ["factual", "disjoint", "synthesized", "structured", "creative", "reasoning"]
@@ -3,20 +3,44 @@ Verdict pipeline for the GenConvoBench dataset. https://arxiv.org/pdf/2506.06266
 
 Simple pipeline that processes one question prompt type and generates N questions + N answers.
 Each question/answer is generated with document cached in system message.
+
+With several prompt types, one pipeline holds a QuestionsUnit branch per prompt type
+(each with its own answer fan-out) so every branch reuses the same warm document cache.
 """
 
 import json
+import math
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from verdict import Pipeline, Layer
 
+from .clients.base import CartridgeConfig
+from .clients.usage import count_message_tokens, load_tokenizer, token_counter
 from .prompts.questions import GEN_CONVO_PROMPT_REGISTRY
 from .units.question import QuestionsUnit
-from .units.answer import AnswerUnit
+from .units.answer import AnswerUnit, BatchedAnswerUnit
+from .utils.answer_compare import compare_answers
 from .utils.schemas import DocumentInput, ParseContext
-from .utils.parser import parse_results
-from .utils.dataset_manager import GenConvoDatasetManager
+from .utils.retrieval import DocumentRetriever, RetrievalConfig, load_or_build_index
+from .utils.sections import SectionPlan, plan_sections
+from .utils.sidecar import DocumentSidecar, ensure_sidecar, read_markdown
+from .utils.token_capture import TokenCapture
+from .utils.parser import QAPair, layout_results, parse_results
+from .utils.dataset_manager import GenConvoDatasetManager, StreamingQAWriter
+from .utils.journal import RunJournal
+from .utils.metrics import RunMetrics
+from .utils.prompt_cache import DocumentCacheWarmup
+from .utils.response_cache import ResponseCache
+from .utils.worker_pool import SharedWorkerPool
+from .tokasaurus_backend import TokasaurusBackend
+
+
+ANSWER_CONTEXTS = ("document", "cartridge", "both")
+
+# Split name of datasets answered from a cartridge
+CARTRIDGE_SPLIT = "cartridge"
 
 
 class GenConvoSynthesizer:
@@ -31,37 +55,177 @@ class GenConvoSynthesizer:
         model_name: str = "claude-sonnet-4-20250514",
         max_workers: int = 8,
         temperature: float = 0.7,
+        worker_pool: Optional[SharedWorkerPool] = None,
+        display: bool = True,
+        prompt_types: Optional[List[str]] = None,
+        cache_warmup: Optional[DocumentCacheWarmup] = None,
+        resume: bool = False,
+        journal: Optional[RunJournal] = None,
+        stream_batch_size: Optional[int] = None,
+        response_cache: Optional[ResponseCache] = None,
+        questions_per_call: int = 1,
+        tokasaurus: Optional[TokasaurusBackend] = None,
+        capture_tokens: bool = False,
+        answer_context: str = "document",
+        cartridge: Optional[CartridgeConfig] = None,
+        metrics: Optional[RunMetrics] = None,
+        section_context: bool = False,
+        questions_per_section: int = 2,
+        retrieval: Optional[RetrievalConfig] = None,
     ):
         self.dataset_directory = Path(dataset_directory)
         self.filename = filename
-        self.prompt_type = prompt_type
+        # prompt_types (if given) runs every listed prompt type in one pipeline
+        self.prompt_types = list(prompt_types) if prompt_types else [prompt_type]
+        self.prompt_type = "+".join(self.prompt_types)
         self.num_questions = num_questions
         self.model_name = model_name
         self.max_workers = max_workers
         self.temperature = temperature
-        self.prompt_template = GEN_CONVO_PROMPT_REGISTRY[prompt_type]
+        self.prompt_templates = {pt: GEN_CONVO_PROMPT_REGISTRY[pt] for pt in self.prompt_types}
+        self.worker_pool = worker_pool
+        self.display = display
+        self.cache_warmup = cache_warmup or DocumentCacheWarmup()
+        # Every completed call is journaled; resume=True replays finished work
+        self.journal = journal or RunJournal(resume=resume)
+        # If set, Q&A pairs are written to disk in batches of this size as answers complete
+        self.stream_batch_size = stream_batch_size
+        self._writers: Dict[str, StreamingQAWriter] = {}
+        # Identical requests (same model, params, system and user text) are served from here
+        self.response_cache = response_cache
+        # Questions answered per provider call; >1 uses BatchedAnswerUnit
+        self.questions_per_call = max(1, questions_per_call)
+        # If set, generate on a self-hosted Tokasaurus server instead of through verdict
+        self.tokasaurus = tokasaurus
+        # Save answer token ids and top-k logprobs with the dataset (Tokasaurus only)
+        if capture_tokens and tokasaurus is None:
+            raise ValueError("capture_tokens needs a Tokasaurus backend; API providers do not return token ids")
+        self.capture_tokens = capture_tokens
+        self._captures: Dict[Tuple[str, int], TokenCapture] = {}
+        # "document" answers with the document in context, "cartridge" with a cartridge
+        # trained on it instead, "both" does both and compares them (Tokasaurus only)
+        if answer_context not in ANSWER_CONTEXTS:
+            raise ValueError(f"answer_context must be one of {ANSWER_CONTEXTS}, got {answer_context!r}")
+        if answer_context != "document" and (tokasaurus is None or cartridge is None):
+            raise ValueError(f"answer_context={answer_context!r} needs a Tokasaurus backend and a cartridge")
+        self.answer_context = answer_context
+        self.cartridge = cartridge
+        # If set, every provider call's latency, queue wait and token usage is recorded here
+        self.metrics = metrics
+        # Send each question batch a few sections plus the outline instead of the whole
+        # document, and answer each question from the sections it came from
+        if section_context and tokasaurus is not None:
+            raise ValueError("section_context is only supported through verdict, not the Tokasaurus engine")
+        self.section_context = section_context
+        self.questions_per_section = questions_per_section
+        self._section_plans: Dict[str, SectionPlan] = {}
+        # If set, answer each question from its top BM25 passages instead of the whole document
+        if retrieval is not None and (tokasaurus is not None or section_context):
+            raise ValueError("retrieval is only supported through verdict and without section_context")
+        self.retrieval = retrieval
+        self._retriever: Optional[DocumentRetriever] = None
 
         self._document: Optional[str] = None
 
     def _load_document(self) -> str:
         """Load document from markdown file."""
         if self._document is None:
-            file_path = self.dataset_directory / self.filename
-            with open(file_path, "r", encoding="utf-8") as f:
-                self._document = f.read()
+            self._document = read_markdown(self.dataset_directory / self.filename)
         return self._document
 
-    def create_pipeline(self) -> Pipeline:
-        """Create complete pipeline: questions (single) -> answers (fan-out)."""
-
-        questions = QuestionsUnit(self.prompt_template, self.num_questions)
-        answers = Layer(AnswerUnit(), inner="none", outer="dense", repeat=self.num_questions)
-        pipeline = (
-            Pipeline(name=f"GenConvoBench-{self.prompt_type}") 
-            >> questions
-            >> answers
+    def _load_sidecar(self, tokenizers: Optional[Dict[str, Any]] = None) -> DocumentSidecar:
+        """The document's sidecar (hash, sections, token counts), built on first use."""
+        return ensure_sidecar(self.dataset_directory / self.filename, self._load_document(), tokenizers)
+
+    def _attach(self, unit, prompt_type: str):
+        # Attach before Layer copies the prototype so every copy shares these
+        unit.worker_pool = self.worker_pool
+        # The warmup gate is keyed by the whole document, which section-targeted calls never send
+        unit.cache_warmup = None if self.section_context else self.cache_warmup
+        unit.journal = self.journal
+        unit.prompt_type = prompt_type
+        unit.model_name = self._journal_model
+        unit.response_cache = self.response_cache
+        unit.metrics = self.metrics
+        unit.section_plan = self._section_plans.get(prompt_type)
+        if isinstance(unit, AnswerUnit) and self._retriever is not None:
+            # Retrieved answers differ from full-context ones; the questions are shared
+            unit.retriever = self._retriever
+            unit.model_name = f"{unit.model_name}@retrieval"
+            # Passages are not the document prefix the warmup gate primes, so don't wait on it
+            unit.cache_warmup = None
+        if isinstance(unit, AnswerUnit) and self._writers:
+            unit.answer_listener = self._stream_answer
+        return unit
+
+    @property
+    def _journal_model(self) -> str:
+        # Section-targeted questions differ from whole-document ones, so they are journaled apart
+        return f"{self.model_name}@sections" if self.section_context else self.model_name
+
+    def _provenance(self, prompt_type: str, index: int, question: str) -> str:
+        plan = self._section_plans.get(prompt_type)
+        if plan is not None:
+            return plan.provenance(index)
+        if self._retriever is not None:
+            return self._retriever.provenance(question)
+        return ""
+
+    def _on_answer(
+        self, prompt_type: str, index: int, question: str, answer: str, capture: Optional[TokenCapture] = None
+    ) -> None:
+        if capture is not None:
+            self._captures[(prompt_type, index)] = capture
+        if self._writers:
+            self._stream_answer(prompt_type, index, question, answer, capture)
+
+    def _stream_answer(
+        self, prompt_type: str, index: int, question: str, answer: str, capture: Optional[TokenCapture] = None
+    ) -> None:
+        self._writers[prompt_type].write(
+            QAPair(
+                run_id=self._run_id,
+                prompt_type=prompt_type,
+                question=question,
+                answer=answer,
+                model=self.model_name,
+                temperature=self.temperature,
+                filename=self.filename,
+                document_hash=self._document_hash,
+                layer_index=index,
+                timestamp=datetime.now().isoformat(),
+                sections=self._provenance(prompt_type, index, question),
+                capture=capture,
+            )
         )
 
+    def _answer_layer(self, prompt_type: str, name: Optional[str] = None) -> Layer:
+        """Answer fan-out: one unit per question, or per `questions_per_call` questions."""
+        if self.questions_per_call == 1:
+            answer = self._attach(AnswerUnit(name=name), prompt_type)
+            return Layer(answer, inner="none", outer="dense", repeat=self.num_questions)
+        answer = self._attach(BatchedAnswerUnit(self.questions_per_call, name=name), prompt_type)
+        repeat = math.ceil(self.num_questions / self.questions_per_call)
+        return Layer(answer, inner="none", outer="dense", repeat=repeat)
+
+    def create_pipeline(self) -> Pipeline:
+        """Create complete pipeline: questions (single) -> answers (fan-out), per prompt type."""
+        pipeline = Pipeline(name=f"GenConvoBench-{self.prompt_type}")
+
+        if len(self.prompt_types) == 1:
+            template = self.prompt_templates[self.prompt_type]
+            questions = self._attach(QuestionsUnit(template, self.num_questions), self.prompt_type)
+            answers = self._answer_layer(self.prompt_type)
+            pipeline = pipeline >> questions >> answers
+        else:
+            # Independent branches in one block; unit names tag result keys with the prompt type.
+            # All branches carry the same document, so the cache warmup gate lets the first
+            # question call write the cache and releases the other branches onto it.
+            for prompt_type, template in self.prompt_templates.items():
+                questions = self._attach(QuestionsUnit(template, self.num_questions, name=prompt_type), prompt_type)
+                answers = self._answer_layer(prompt_type, name=prompt_type)
+                pipeline.block.setup_link(questions, answers)
+
         return pipeline.via(
             self.model_name,  # type: ignore
             temperature=self.temperature
@@ -71,14 +235,62 @@ class GenConvoSynthesizer:
         """Run the complete pipeline."""
         document = self._load_document()
         input_data = DocumentInput(document=document)
-        pipeline = self.create_pipeline()
+        dataset_manager = GenConvoDatasetManager()
+
+        self._run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        sidecar = self._load_sidecar()
+        self._document_hash = sidecar.document_hash
+        if self.section_context:
+            sections = sidecar.markdown_sections(document)
+            self._section_plans = {
+                pt: plan_sections(document, pt, self.num_questions, self.questions_per_section, sections=sections)
+                for pt in self.prompt_types
+            }
+        if self.retrieval is not None:
+            tokenizer, tokenizer_name = load_tokenizer()
+            sidecar = self._load_sidecar({tokenizer_name: tokenizer})
+            index = load_or_build_index(
+                self.dataset_directory / self.filename, document, sidecar.markdown_sections(document)
+            )
+            self._retriever = DocumentRetriever(
+                document, index, self.retrieval, token_counter(tokenizer), sidecar.document_tokens(tokenizer_name)
+            )
+        # The main answers come from the cartridge only in "cartridge" mode
+        split_name = CARTRIDGE_SPLIT if self.answer_context == "cartridge" else None
+        if self.stream_batch_size is not None:
+            self._writers = {
+                pt: dataset_manager.open_stream(
+                    pt, self.model_name, self.filename, self._run_id, split_name=split_name,
+                    batch_size=self.stream_batch_size, capture=self.capture_tokens,
+                )
+                for pt in self.prompt_types
+            }
 
         # Run pipeline - should return structured question-answer pairs
-        results = pipeline.run(
-            input_data=input_data,  # type: ignore
-            max_workers=self.max_workers,  # type: ignore
-            display=True,  # type: ignore
-        )
+        try:
+            if self.tokasaurus is not None:
+                branches = self.tokasaurus.generate(
+                    document,
+                    self.prompt_templates,
+                    self.num_questions,
+                    self.temperature,
+                    journal=self.journal,
+                    model_name=self.model_name,
+                    answer_listener=self._on_answer if self._writers or self.capture_tokens else None,
+                    capture=self.capture_tokens,
+                    cartridge=self.cartridge if self.answer_context == "cartridge" else None,
+                )
+                results = layout_results(document, branches, name=f"GenConvoBench-{self.prompt_type}")
+            else:
+                results = self.create_pipeline().run(
+                    input_data=input_data,  # type: ignore
+                    max_workers=self.max_workers,  # type: ignore
+                    display=self.display,  # type: ignore
+                )
+        finally:
+            # Close streams even on failure so the partial output is a loadable dataset
+            streamed_paths = {pt: writer.close() for pt, writer in self._writers.items()}
+            self._writers = {}
 
         # Parse results into Q&A pairs
         parse_context = ParseContext(
@@ -87,22 +299,97 @@ class GenConvoSynthesizer:
             model=self.model_name,
             temperature=self.temperature,
             prompt_type=self.prompt_type,
+            document_hash=self._document_hash,
         )
-        qa_pairs = parse_results(results, parse_context)
+        qa_pairs = parse_results(results, parse_context, run_id=self._run_id)
+        for pair in qa_pairs:
+            pair.capture = self._captures.get((pair.prompt_type, pair.layer_index))
+            pair.sections = self._provenance(pair.prompt_type, pair.layer_index, pair.question)
+        self._captures = {}
         
-        # Save Q&A pairs to dataset
-        dataset_manager = GenConvoDatasetManager()
-        dataset_path = dataset_manager.save_qa_pairs(qa_pairs)
+        # Save Q&A pairs to dataset, one per prompt type (already on disk if streamed)
+        if streamed_paths:
+            dataset_paths = streamed_paths
+        else:
+            dataset_paths = dataset_manager.save_qa_pairs_by_prompt_type(
+                qa_pairs, split_name=split_name, capture=self.capture_tokens
+            )
+
+        comparison = None
+        cartridge_paths = None
+        if self.answer_context == "both":
+            comparison, cartridge_paths = self._answer_from_cartridge(
+                document, branches, parse_context, dataset_manager
+            )
 
         return {
             # Use dataclass helper for JSON-friendly dict
             "context": parse_context.to_dict(),
             "results": results,
             "qa_pairs": qa_pairs,
-            "dataset_path": dataset_path,
-            "total_questions": self.num_questions,
+            "dataset_path": dataset_paths.get(self.prompt_type),
+            "dataset_paths": dataset_paths,
+            "total_questions": self.num_questions * len(self.prompt_types),
+            "journal": self.journal.stats(),
+            "cache_warmup": self.cache_warmup.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "cartridge_dataset_paths": cartridge_paths,
+            "cartridge_comparison": comparison,
+            "metrics": self.metrics.snapshot() if self.metrics else None,
+            "section_context": self._section_summary(document) if self.section_context else None,
+            "retrieval": self._retriever.stats() if self._retriever else None,
         }
 
+    def _section_summary(self, document: str) -> Dict[str, Any]:
+        """Per prompt type: sections targeted and system prompt size against the whole document."""
+        summary: Dict[str, Any] = {}
+        for prompt_type, plan in self._section_plans.items():
+            answer_chars = [len(plan.answer_context([i])) for i in range(len(plan.targets))]
+            summary[prompt_type] = {
+                "sections": len(plan.sections()),
+                "document_chars": len(document),
+                "question_context_chars": len(plan.question_context()),
+                "mean_answer_context_chars": sum(answer_chars) / max(1, len(answer_chars)),
+            }
+        return summary
+
+    def _answer_from_cartridge(
+        self,
+        document: str,
+        branches: Dict[str, Tuple[List[str], Dict[int, str]]],
+        parse_context: ParseContext,
+        dataset_manager: GenConvoDatasetManager,
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Answer the run's questions again from the cartridge, save them and compare to the full-context answers."""
+        assert self.tokasaurus is not None and self.cartridge is not None
+        questions = {pt: qs for pt, (qs, _) in branches.items()}
+        answers = self.tokasaurus.answer(
+            document, questions, self.temperature, self.journal, self.model_name, cartridge=self.cartridge
+        )
+        results = layout_results(
+            document,
+            {pt: (questions[pt], answers[pt]) for pt in questions},
+            name=f"GenConvoBench-{self.prompt_type}",
+        )
+        qa_pairs = parse_results(results, parse_context, run_id=self._run_id)
+        paths = dataset_manager.save_qa_pairs_by_prompt_type(qa_pairs, split_name=CARTRIDGE_SPLIT)
+
+        tokenizer, tokenizer_name = load_tokenizer()
+        document_tokens = count_message_tokens(tokenizer, "system", "") + (
+            self._load_sidecar({tokenizer_name: tokenizer}).document_tokens(tokenizer_name) or 0
+        )
+        comparison: Dict[str, Any] = {}
+        for prompt_type, (qs, full_context) in branches.items():
+            stats = compare_answers(full_context, answers[prompt_type])
+            question_tokens = [count_message_tokens(tokenizer, "user", q) for q in qs]
+            mean_question = sum(question_tokens) / max(1, len(question_tokens))
+            stats["prompt_tokens_per_answer"] = {
+                "document": document_tokens + mean_question,
+                "cartridge": mean_question,
+            }
+            comparison[prompt_type] = stats
+        return comparison, paths
+
     def save_results(self, results: Dict[str, Any], output_path: str):
         """Save results to JSON file."""
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,265 @@
+"""
+Self-hosted Tokasaurus backend for GenConvoSynthesizer.
+
+Instead of verdict's one-request-per-unit calls, a document is processed in two
+batches on TokasaurusClient's /batch/chat/completions endpoint: one with a
+question chat per prompt type, then one with every answer chat for the
+document. Every chat starts with the same document, so the server can share
+that prefix in its KV cache, and there are no per-request API rate limits.
+Answers are journaled and written out as they come back; with `sub_batch_size`
+set on the client config, the answer batch is split into concurrent
+sub-batches and early answers are saved while the rest are still generating.
+"""
+
+import asyncio
+import json
+import re
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .clients.base import CartridgeConfig, ClientSample
+from .clients.tokasaurus import MultiTokasaurusClient, TokasaurusClient
+from .units.answer import AnswerUnit
+from .units.question import QuestionsUnit
+from .utils.journal import RunJournal
+from .utils.prompt_cache import document_key
+from .utils.token_capture import TokenCapture
+
+QUESTION_FORMAT = "Return the questions as a JSON list of strings, with no other text."
+ANSWER_FORMAT = 'End your reply with the final answer alone as JSON: {"answer": "..."}'
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)]|\[\d+\])\s*")
+_ANSWER_OBJECT = re.compile(r"\{[^{}]*\"answer\"[^{}]*\}", re.DOTALL)
+_ANSWER_LABEL = re.compile(r"^\s*(?:final\s+)?answer\s*[:\-]\s*", re.IGNORECASE)
+
+
+def parse_questions(text: str) -> List[str]:
+    """Questions from a completion: a JSON list if one is present, else one question per line."""
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if match:
+        try:
+            items = json.loads(match.group(0))
+            if isinstance(items, list) and all(isinstance(q, str) for q in items):
+                return [q.strip() for q in items if q.strip()]
+        except json.JSONDecodeError:
+            pass
+    lines = (_LIST_MARKER.sub("", line).strip() for line in text.splitlines())
+    return [line for line in lines if line.endswith("?")]
+
+
+def parse_answer(text: str) -> str:
+    """The final answer from a completion: the last {"answer": ...} object, else its last line.
+
+    Verdict stores only the structured `answer` field, so the reasoning before it is
+    dropped here to give the dataset's answer column the same meaning.
+    """
+    for match in reversed(_ANSWER_OBJECT.findall(text)):
+        try:
+            answer = json.loads(match).get("answer")
+        except json.JSONDecodeError:
+            continue
+        if answer is not None and str(answer).strip():
+            return str(answer).strip()
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return _ANSWER_LABEL.sub("", lines[-1]).strip() if lines else ""
+
+
+class TokasaurusBackend:
+    """Generates one document's questions and answers with batched Tokasaurus chats."""
+
+    def __init__(
+        self,
+        client: Union[TokasaurusClient, MultiTokasaurusClient],
+        max_completion_tokens: int = 1024,
+        capture_top_logprobs: Optional[int] = None,
+    ):
+        self.client = client
+        self.max_completion_tokens = max_completion_tokens
+        # Top-k logprobs requested per answer token when generate(capture=True)
+        self.capture_top_logprobs = capture_top_logprobs
+
+        # One long-lived loop so the client's pooled session (bound to a loop) is reused
+        # across documents and by every job thread
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="tokasaurus-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self) -> None:
+        """Close the client's connection pool and stop the event loop."""
+        if self._loop.is_running():
+            self._run(self.client.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.client.pool_stats()
+
+    @classmethod
+    def from_url(cls, url: Union[str, List[str]], model_name: str = "default", **kwargs) -> "TokasaurusBackend":
+        """Backend for one server URL, or several replica URLs routed by document."""
+        urls = [url] if isinstance(url, str) else list(url)
+        if len(urls) == 1:
+            client = TokasaurusClient.Config(url=urls[0], model_name=model_name).instantiate()
+        else:
+            client = MultiTokasaurusClient.Config(urls=urls, model_name=model_name).instantiate()
+        return cls(client, **kwargs)
+
+    def _chats(self, document: Optional[str], users: List[str]) -> List[List[Dict[str, Any]]]:
+        if document is None:
+            return [[{"role": "user", "content": user}] for user in users]
+        return [[{"role": "system", "content": document}, {"role": "user", "content": user}] for user in users]
+
+    def _chat(self, document: str, users: List[str], temperature: float) -> List[str]:
+        if not users:
+            return []
+        response = self._run(
+            self.client.chat(
+                self._chats(document, users),
+                max_completion_tokens=self.max_completion_tokens,
+                temperature=temperature,
+                # Same upstream id for the whole document keeps it on one replica's KV cache
+                modal_upstream_id=document_key(document),
+            )
+        )
+        return [sample.text for sample in response.samples]
+
+    def _chat_stream(
+        self,
+        document: str,
+        users: List[str],
+        temperature: float,
+        top_logprobs: Optional[int] = None,
+        cartridge: Optional[CartridgeConfig] = None,
+    ) -> Iterator[Tuple[int, ClientSample]]:
+        """(index into users, sample) in completion order, iterated on the calling thread."""
+        if not users:
+            return
+        stream: AsyncIterator = self.client.chat_stream(
+            self._chats(None if cartridge is not None else document, users),
+            max_completion_tokens=self.max_completion_tokens,
+            temperature=temperature,
+            top_logprobs=top_logprobs,
+            modal_upstream_id=document_key(document),
+            cartridges=None if cartridge is None else [cartridge.model_dump()],
+        )
+        try:
+            while True:
+                try:
+                    yield self._run(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(stream.aclose())
+
+    def generate(
+        self,
+        document: str,
+        prompt_templates: Dict[str, str],
+        num_questions: int,
+        temperature: float,
+        journal: Optional[RunJournal] = None,
+        model_name: str = "",
+        answer_listener: Optional[Callable[..., None]] = None,
+        capture: bool = False,
+        cartridge: Optional[CartridgeConfig] = None,
+    ) -> Dict[str, Tuple[List[str], Dict[int, str]]]:
+        """Questions and answers per prompt type, as layout_results expects.
+
+        Completed chats are written to `journal` (keyed by `model_name`); with a
+        resuming journal, finished work is replayed and only missing chats are sent.
+        `answer_listener(prompt_type, index, question, answer, capture)` is called for
+        every answer; with `capture`, generated answers carry their TokenCapture
+        (replayed ones have none). With `cartridge`, answers use it instead of the
+        document (see `answer`).
+        """
+        doc_hash = document_key(document)
+
+        questions: Dict[str, List[str]] = {}
+        pending_types = []
+        for prompt_type in prompt_templates:
+            replayed = journal.completed_questions(doc_hash, prompt_type, model_name, num_questions) if journal else None
+            if replayed is not None:
+                questions[prompt_type] = replayed[:num_questions]
+            else:
+                pending_types.append(prompt_type)
+
+        users = [
+            QuestionsUnit.format_user(prompt_templates[pt], num_questions) + "\n\n" + QUESTION_FORMAT
+            for pt in pending_types
+        ]
+        for prompt_type, text in zip(pending_types, self._chat(document, users, temperature)):
+            parsed = parse_questions(text)[:num_questions]
+            if not parsed:
+                raise ValueError(f"Could not parse any {prompt_type} questions from the Tokasaurus response")
+            questions[prompt_type] = parsed
+            if journal is not None:
+                journal.record_questions(doc_hash, prompt_type, model_name, parsed, num_questions)
+
+        answers = self.answer(
+            document, questions, temperature, journal, model_name, answer_listener, capture, cartridge
+        )
+        return {pt: (questions[pt], answers[pt]) for pt in prompt_templates}
+
+    def answer(
+        self,
+        document: str,
+        questions: Dict[str, List[str]],
+        temperature: float,
+        journal: Optional[RunJournal] = None,
+        model_name: str = "",
+        answer_listener: Optional[Callable[..., None]] = None,
+        capture: bool = False,
+        cartridge: Optional[CartridgeConfig] = None,
+    ) -> Dict[str, Dict[int, str]]:
+        """Answers to `questions` per prompt type, in one batch for the document.
+
+        With `cartridge`, the chats carry only the question and reference the
+        cartridge trained on the document instead of inlining the document; those
+        answers are journaled under their own model key.
+        """
+        doc_hash = document_key(document)
+        if cartridge is not None:
+            model_name = f"{model_name}@cartridge:{cartridge.id}"
+
+        answers: Dict[str, Dict[int, str]] = {pt: {} for pt in questions}
+        pending: List[Tuple[str, int]] = []
+        for prompt_type, qs in questions.items():
+            for index, question in enumerate(qs):
+                replayed = (
+                    journal.completed_answer(doc_hash, prompt_type, model_name, index, question)
+                    if journal else None
+                )
+                if replayed is not None:
+                    # Older journals hold the whole completion
+                    answers[prompt_type][index] = parse_answer(replayed)
+                else:
+                    pending.append((prompt_type, index))
+
+        if answer_listener is not None:
+            for prompt_type, by_index in answers.items():
+                for index, text in sorted(by_index.items()):
+                    answer_listener(prompt_type, index, questions[prompt_type][index], text, None)
+
+        # Every answer for the document in one batch (unless the client config sets sub_batch_size),
+        # each journaled and streamed as soon as it comes back
+        users = [AnswerUnit.format_user(questions[pt][i]) + "\n\n" + ANSWER_FORMAT for pt, i in pending]
+        top_logprobs = self.capture_top_logprobs if capture else None
+        for position, sample in self._chat_stream(document, users, temperature, top_logprobs, cartridge):
+            # Failed requests come back empty when the client is set to on_failure="continue"
+            text = parse_answer(sample.text or "")
+            if not text:
+                continue
+            prompt_type, index = pending[position]
+            answers[prompt_type][index] = text
+            if journal is not None:
+                journal.record_answer(
+                    doc_hash, prompt_type, model_name, index, questions[prompt_type][index], text
+                )
+            if answer_listener is not None:
+                token_capture = TokenCapture.from_sample(sample) if capture else None
+                answer_listener(prompt_type, index, questions[prompt_type][index], text, token_capture)
+
+        return answers
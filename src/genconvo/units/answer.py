@@ -1,7 +1,16 @@
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
 
+from instructor.exceptions import InstructorRetryException
+from pydantic import ValidationError
+from verdict.extractor import StructuredOutputExtractor
 from verdict.schema import Schema
+from verdict.util.exceptions import VerdictExecutionTimeError
+from verdict.util.log import logger as base_logger
 
+from ..utils.cached_prompt import CachedPromptMessage
+from ..utils.prompt_cache import document_key
+from ..utils.retrieval import DocumentRetriever
+from ..utils.sections import SectionPlan
 from .base import BaseCachedUnit
 
 
@@ -15,25 +24,67 @@ class AnswerUnit(BaseCachedUnit):
     class ResponseSchema(Schema):
         answer: str
 
-    def __init__(self):
-        super().__init__()
+    # Optional callback(prompt_type, index, question, answer) fired as each answer completes,
+    # e.g. to stream Q&A pairs to disk while the rest of the fan-out is still running.
+    answer_listener: Optional[Callable[[str, int, str, str], None]] = None
+    # Optional section targets; each question is answered from the sections it was generated from
+    section_plan: Optional[SectionPlan] = None
+    # Optional BM25 retriever; questions are answered from their top passages instead of the document
+    retriever: Optional[DocumentRetriever] = None
 
-    def populate_prompt_message(self, input_data, logger):
-        """Use BaseCachedUnit to wrap with cache control after building messages."""
-        # Use the instance index assigned by Layer via idx(), defaulting to 0
-        idx = int(getattr(self, "index", 0))
+    def __init__(self, name: Optional[str] = None):
+        super().__init__(name=name)
 
-        question_text = input_data.questions[idx]
-        self._system_text = input_data.document
-        self._user_text = (
+    @staticmethod
+    def format_user(question_text: str) -> str:
+        return (
             "Answer this question based on the document above:\n\n"
             f"{question_text}\n\n"
             "You may need to think about the question before answering."
             " But once done, provide a single word, entity, number, or choice answer."
         )
+
+    def populate_prompt_message(self, input_data, logger):
+        """Use BaseCachedUnit to wrap with cache control after building messages."""
+        # Use the instance index assigned by Layer via idx(), defaulting to 0
+        idx = int(getattr(self, "index", 0))
+
+        question_text = input_data.questions[idx]
+        self._system_text = self._context(input_data, [idx])
+        self._user_text = self.format_user(question_text)
         # Build prompt immediately without additional diagnostics/delays
         return super().populate_prompt_message(input_data, logger)
 
+    def replay(self, input_data):
+        if self.journal is None:
+            return None
+        idx = int(getattr(self, "index", 0))
+        answer = self.journal.completed_answer(
+            document_key(input_data.document), self.prompt_type or "", self.model_name or "",
+            idx, input_data.questions[idx],
+        )
+        return None if answer is None else self.ResponseSchema(answer=answer)
+
+    def record(self, input_data, output):
+        if self.journal is not None:
+            idx = int(getattr(self, "index", 0))
+            self.journal.record_answer(
+                document_key(input_data.document), self.prompt_type or "", self.model_name or "",
+                idx, input_data.questions[idx], output.answer,
+            )
+
+    def on_output(self, input_data, output):
+        if self.answer_listener is not None:
+            idx = int(getattr(self, "index", 0))
+            self.answer_listener(self.prompt_type or "", idx, input_data.questions[idx], output.answer)
+
+    def _context(self, input_data, indices: List[int]) -> str:
+        if self.section_plan is not None:
+            return self.section_plan.answer_context(indices)
+        if self.retriever is not None:
+            return self.retriever.context([input_data.questions[i] for i in indices])
+        return input_data.document
+
     # Layer(...) calls idx(i+1) on repeated nodes. Capture it once to avoid parsing prefixes.
     def idx(self, value: int) -> int:  # type: ignore[override]
         self.index = max(0, value - 1)
@@ -44,3 +95,127 @@ class AnswerUnit(BaseCachedUnit):
 
     def build_user(self, input_data) -> str:
         return getattr(self, "_user_text", "")
+
+
+def _unparsed(error: Optional[BaseException]) -> bool:
+    """Whether a failed call got a reply that did not fit the response schema."""
+    while error is not None:
+        if isinstance(error, (InstructorRetryException, ValidationError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class AnswerItem(Schema):
+    index: int
+    answer: str
+
+
+class BatchedAnswerUnit(AnswerUnit):
+    """Answer `questions_per_call` questions in one call with document cached in system message.
+
+    Layer instance i covers questions [i*k, (i+1)*k). Items missing from the structured
+    response (wrong index, duplicate or empty answer) are re-asked one question per call,
+    and so is every question when the response does not parse at all.
+    """
+
+    class ResponseSchema(Schema):
+        answers: List[AnswerItem]
+
+    class OutputSchema(Schema):
+        indices: List[int]
+        answers: List[str]
+
+    def __init__(self, questions_per_call: int, name: Optional[str] = None):
+        super().__init__(name=name)
+        self.questions_per_call = questions_per_call
+
+    def _indices(self, input_data) -> List[int]:
+        start = int(getattr(self, "index", 0)) * self.questions_per_call
+        return list(range(start, min(start + self.questions_per_call, len(input_data.questions))))
+
+    @staticmethod
+    def format_user_batch(question_texts: List[str]) -> str:
+        numbered = "\n".join(f"[{i}] {q}" for i, q in enumerate(question_texts, start=1))
+        return (
+            "Answer each of these questions based on the document above:\n\n"
+            f"{numbered}\n\n"
+            "You may need to think about each question before answering."
+            " But once done, provide a single word, entity, number, or choice answer for each,"
+            " tagged with the question's number in brackets as its index."
+        )
+
+    def populate_prompt_message(self, input_data, logger):
+        self._system_text = self._context(input_data, self._indices(input_data))
+        self._user_text = self.format_user_batch([input_data.questions[i] for i in self._indices(input_data)])
+        return BaseCachedUnit.populate_prompt_message(self, input_data, logger)
+
+    def _answer_single(self, input_data, index: int) -> str:
+        """Fallback: ask one question in its own call, through the same client and rate limit."""
+        client = next(self.model_selection_policy.get_clients())  # type: ignore[union-attr]
+        message = CachedPromptMessage(
+            system=self._context(input_data, [index]),
+            user=self.format_user(input_data.questions[index]),
+            input_schema=input_data,
+        )
+        client.model.rate_limit.acquire({"requests": 1, "tokens": len(client.encode(message.user))}).wait()
+        usage = None
+        try:
+            extractor = StructuredOutputExtractor()
+            extractor.response_schema = AnswerUnit.ResponseSchema
+            response, usage = extractor.extract(client, message, base_logger)
+        finally:
+            client.model.rate_limit.release({"tokens": max(usage.out_tokens, 0) if usage is not None else 0})
+        return response.answer
+
+    def _send(self, input, execution_context):
+        try:
+            return super()._send(input, execution_context)
+        except VerdictExecutionTimeError as e:
+            if not _unparsed(e):
+                raise
+            indices = self._indices(input)
+            base_logger.warning(f"Batched answers for questions {indices} did not parse; asking one at a time")
+            return self.OutputSchema(indices=indices, answers=[self._answer_single(input, i) for i in indices])
+
+    def process(self, input_data, response: "BatchedAnswerUnit.ResponseSchema") -> "BatchedAnswerUnit.OutputSchema":
+        indices = self._indices(input_data)
+        by_position: Dict[int, str] = {}
+        for item in response.answers:
+            if 1 <= item.index <= len(indices) and item.index not in by_position and item.answer.strip():
+                by_position[item.index] = item.answer
+        answers = [
+            by_position.get(pos) or self._answer_single(input_data, i)
+            for pos, i in enumerate(indices, start=1)
+        ]
+        return self.OutputSchema(indices=indices, answers=answers)
+
+    def _response_from_output(self, output: "BatchedAnswerUnit.OutputSchema") -> Dict[str, Any]:
+        return {"answers": [{"index": pos, "answer": a} for pos, a in enumerate(output.answers, start=1)]}
+
+    def replay(self, input_data):
+        if self.journal is None:
+            return None
+        answers = []
+        for i in self._indices(input_data):
+            answer = self.journal.completed_answer(
+                document_key(input_data.document), self.prompt_type or "", self.model_name or "",
+                i, input_data.questions[i],
+            )
+            if answer is None:
+                return None
+            answers.append(answer)
+        return self.OutputSchema(indices=self._indices(input_data), answers=answers)
+
+    def record(self, input_data, output):
+        if self.journal is not None:
+            for i, answer in zip(output.indices, output.answers):
+                self.journal.record_answer(
+                    document_key(input_data.document), self.prompt_type or "", self.model_name or "",
+                    i, input_data.questions[i], answer,
+                )
+
+    def on_output(self, input_data, output):
+        if self.answer_listener is not None:
+            for i, answer in zip(output.indices, output.answers):
+                self.answer_listener(self.prompt_type or "", i, input_data.questions[i], answer)
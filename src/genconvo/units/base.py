@@ -1,10 +1,64 @@
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import Any
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 
 from verdict import Unit
+from verdict.extractor import StructuredOutputExtractor
 from verdict.schema import Schema
 
+from ..clients.usage import Usage
 from ..utils.cached_prompt import CachedPromptMessage
+from ..utils.journal import RunJournal
+from ..utils.metrics import RunMetrics
+from ..utils.prompt_cache import DocumentCacheWarmup, document_key
+from ..utils.response_cache import ResponseCache
+from ..utils.worker_pool import SharedWorkerPool
+
+
+def provider_usage(raw_response: Any) -> Tuple[Optional[Usage], int]:
+    """(Usage, cache write tokens) from a LiteLLM response, or (None, 0) if it reports none."""
+    usage = getattr(raw_response, "usage", None)
+    if usage is None:
+        return None, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(usage, "cache_read_input_tokens", None) or getattr(details, "cached_tokens", None) or 0
+    return (
+        Usage(
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            cached_prompt_tokens=cached,
+        ),
+        getattr(usage, "cache_creation_input_tokens", None) or 0,
+    )
+
+
+@lru_cache(maxsize=None)
+def _schema_key(schema: type) -> str:
+    """Identifies a response schema by its JSON schema (every unit names its class ResponseSchema)."""
+    return json.dumps(schema.model_json_schema(), sort_keys=True)
+
+
+class UsageExtractor(StructuredOutputExtractor):
+    """Structured output extraction that times the provider call and keeps its reported usage on the unit.
+
+    Verdict's own Usage is a local token estimate; the provider's reply (kept by
+    instructor on the response as _raw_response) also says how much of the prompt
+    came from the prompt cache.
+    """
+
+    def inject(self, unit) -> None:
+        super().inject(unit)
+        self._unit = unit
+
+    def extract(self, client_wrapper, prompt_message, logger):  # type: ignore[override]
+        started = time.monotonic()
+        response, usage = super().extract(client_wrapper, prompt_message, logger)
+        self._unit._call_started = started
+        self._unit._call_latency = time.monotonic() - started
+        self._unit._provider_usage = provider_usage(getattr(response, "_raw_response", None))
+        return response, usage
 
 
 class BaseCachedUnit(Unit, ABC):
@@ -13,11 +67,39 @@ class BaseCachedUnit(Unit, ABC):
     Subclasses implement build_system/build_user; self.prompt is a minimal stub.
     """
 
-    def __init__(self) -> None:
-        super().__init__()
+    # Optional process-wide pool shared by several pipelines (see genconvo.batch).
+    # Set on the prototype unit before it is copied into layers.
+    worker_pool: Optional[SharedWorkerPool] = None
+    # Optional gate so one request writes the document prompt cache before the rest run,
+    # and re-primes it before its TTL runs out.
+    cache_warmup: Optional[DocumentCacheWarmup] = None
+    # Optional completion journal; with journal.resume, finished work is replayed
+    # instead of re-sent. Entries are keyed by prompt_type and model_name.
+    journal: Optional[RunJournal] = None
+    prompt_type: Optional[str] = None
+    model_name: Optional[str] = None
+    # Optional persistent response cache, consulted before any provider call
+    response_cache: Optional[ResponseCache] = None
+    # Optional run metrics; every provider call is recorded under this unit's type and prompt_type
+    metrics: Optional[RunMetrics] = None
+    # Monotonic time this unit's request was handed to verdict (after any worker slot wait)
+    _sent_at: Optional[float] = None
+    # Monotonic time this unit started waiting on the cache warmup gate and worker pool
+    _queued_at: Optional[float] = None
+    # Set by UsageExtractor for the last provider call
+    _call_started: Optional[float] = None
+    _call_latency: float = 0.0
+    _provider_usage: Tuple[Optional[Usage], int] = (None, 0)
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        # Verdict puts the name in the result key prefix (unit[Unit <name>]),
+        # which is how multi-prompt pipelines tell their branches apart.
+        super().__init__(name=name)
         # Minimal stub to satisfy Verdict's requirement that a prompt exists.
         # Real prompt is built in populate_prompt_message.
         self.prompt("stub")
+        # A class, so verdict makes a fresh extractor (bound to the executing copy) per call
+        self.extract(UsageExtractor)  # type: ignore[arg-type]
 
     # Satisfy UnitRegistry requirements with minimal schemas
     class ResponseSchema(Schema):
@@ -39,3 +121,121 @@ class BaseCachedUnit(Unit, ABC):
         user_text = self.build_user(input_data)
         return CachedPromptMessage(system=system_text, user=user_text, input_schema=input_data)
 
+    def replay(self, input_data: Any) -> Optional[Schema]:
+        """Return this unit's journaled output to skip the provider call, or None."""
+        return None
+
+    def record(self, input_data: Any, output: Schema) -> None:
+        """Write a completed output to the journal."""
+
+    def on_output(self, input_data: Any, output: Schema) -> None:
+        """Called with every output, whether freshly generated or replayed."""
+
+    def execute(self, input, execution_context=None):  # type: ignore[override]
+        output = self.replay(input)
+        if output is None:
+            output = self._execute_cached(input, execution_context)
+            if output is not None:
+                self.record(input, output)
+        if output is not None:
+            self.on_output(input, output)
+        return output
+
+    def _response_cache_key(self, input_data: Any) -> str:
+        message = self.populate_prompt_message(input_data, None)
+        model, _, inference_parameters = self.model_selection_policy.client_configs[0]  # type: ignore[union-attr]
+        return ResponseCache.key(
+            model=getattr(model, "name", str(model)),
+            params=inference_parameters,
+            system=message.system,
+            user=message.user,
+            schema=_schema_key(self.ResponseSchema),
+        )
+
+    def _response_from_output(self, output: Schema) -> Dict[str, Any]:
+        # Our units' process() keeps the response fields on the output, so the
+        # response can be recovered from it without keeping the raw provider reply.
+        return {name: getattr(output, name) for name in self.ResponseSchema.model_fields}
+
+    def _execute_cached(self, input, execution_context):
+        cache = self.response_cache
+        if cache is None or not cache.enabled:
+            return self._execute_warm(input, execution_context)
+
+        key = self._response_cache_key(input)
+        while True:
+            cached = cache.get(key)
+            if cached is None:
+                is_owner, cached = cache.begin(key)
+                if is_owner:
+                    break
+            if cached is not None:
+                return self.process(input, self.ResponseSchema(**cached))
+            # The identical in-flight request failed; try again as the owner
+
+        response = None
+        try:
+            output = self._execute_warm(input, execution_context)
+            if output is not None:
+                response = self._response_from_output(output)
+                cache.put(key, response)
+            return output
+        finally:
+            cache.end(key, response)
+
+    def _execute_warm(self, input, execution_context):
+        self._queued_at = time.monotonic()
+        document = getattr(input, "document", None)
+        if self.cache_warmup is None or not isinstance(document, str):
+            return self._execute_in_pool(input, execution_context)
+
+        # Wait for the cache before taking a worker slot so waiters never block the leader
+        key = document_key(document)
+        is_leader = self.cache_warmup.acquire(key)
+        try:
+            output = self._execute_in_pool(input, execution_context)
+        except Exception:
+            if is_leader:
+                self.cache_warmup.release(key, success=False)
+            raise
+        if is_leader:
+            self.cache_warmup.release(key, success=output is not None, sent_at=self._sent_at)
+        elif output is not None:
+            self.cache_warmup.touch(key, sent_at=self._sent_at)
+        return output
+
+    def _execute_in_pool(self, input, execution_context):
+        if self.worker_pool is None:
+            return self._send(input, execution_context)
+        with self.worker_pool.slot():
+            return self._send(input, execution_context)
+
+    def _send(self, input, execution_context):
+        # Each layer copy executes once, so per-instance state is safe here
+        self._sent_at = time.monotonic()
+        self._call_started = None
+        output = None
+        try:
+            output = super().execute(input, execution_context=execution_context)
+            return output
+        finally:
+            if self.metrics is not None:
+                self._record_metrics(output)
+
+    def _record_metrics(self, output) -> None:
+        assert self.metrics is not None
+        unit_type, prompt_type = type(self).__name__, self.prompt_type or ""
+        if output is None or self._call_started is None:
+            self.metrics.record_failure(unit_type, prompt_type)
+            return
+        usage, cache_write_tokens = self._provider_usage
+        queued_at = self._queued_at if self._queued_at is not None else self._sent_at
+        self.metrics.record(
+            unit_type,
+            prompt_type,
+            latency=self._call_latency,
+            # Cache warmup gate, worker slot and verdict's rate limiter
+            queue_wait=max(0.0, self._call_started - (queued_at or self._call_started)),
+            usage=usage,
+            cache_write_tokens=cache_write_tokens,
+        )
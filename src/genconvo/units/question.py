@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Optional
 
 from verdict.schema import Schema
 
+from ..utils.prompt_cache import document_key
 from ..utils.schemas import DocumentInput
+from ..utils.sections import SectionPlan
 from .base import BaseCachedUnit
 
 
@@ -19,27 +21,56 @@ class QuestionsUnit(BaseCachedUnit):
         document: str
         questions: List[str]
 
-    def __init__(self, prompt_template: str, num_questions: int):
-        super().__init__()
+    # Optional section targets; the call then sees the outline and those sections, not the document
+    section_plan: Optional[SectionPlan] = None
+
+    def __init__(self, prompt_template: str, num_questions: int, name: Optional[str] = None):
+        super().__init__(name=name)
         self.prompt_template = prompt_template
         self.num_questions = num_questions
 
     # Use BaseCachedUnit's populate_prompt_message which calls these hooks
     def build_system(self, input_data: DocumentInput) -> str:
+        if self.section_plan is not None:
+            return self.section_plan.question_context()
         # Use original pipeline source document bytes if available
         source = getattr(self, "source_input", None)
         source_document = getattr(source, "document", None)
         return source_document if isinstance(source_document, str) else input_data.document
 
-    def build_user(self, input_data: DocumentInput) -> str:
+    @staticmethod
+    def format_user(prompt_template: str, num_questions: int) -> str:
         return (
-            f"{self.prompt_template}\n\n"
-            f"Generate exactly {self.num_questions} unique and diverse questions based on the document above."
+            f"{prompt_template}\n\n"
+            f"Generate exactly {num_questions} unique and diverse questions based on the document above."
         )
 
+    def build_user(self, input_data: DocumentInput) -> str:
+        user = self.format_user(self.prompt_template, self.num_questions)
+        if self.section_plan is not None:
+            user += "\n\n" + self.section_plan.question_instructions()
+        return user
+
     def populate_prompt_message(self, input_data: DocumentInput, logger):
         return super().populate_prompt_message(input_data, logger)
 
+    def replay(self, input_data: DocumentInput) -> Optional["QuestionsUnit.OutputSchema"]:
+        if self.journal is None:
+            return None
+        questions = self.journal.completed_questions(
+            document_key(input_data.document), self.prompt_type or "", self.model_name or "", self.num_questions
+        )
+        if questions is None:
+            return None
+        return self.OutputSchema(document=input_data.document, questions=questions[:self.num_questions])
+
+    def record(self, input_data: DocumentInput, output: "QuestionsUnit.OutputSchema") -> None:
+        if self.journal is not None:
+            self.journal.record_questions(
+                document_key(input_data.document), self.prompt_type or "", self.model_name or "", output.questions,
+                self.num_questions,
+            )
+
     def process(
         self, input_data: DocumentInput, response: "QuestionsUnit.ResponseSchema"
     ) -> "QuestionsUnit.OutputSchema":
@@ -0,0 +1,43 @@
+"""
+Agreement between two sets of answers to the same questions, e.g. answers from a
+cartridge against answers with the full document in context.
+"""
+
+import re
+import string
+from collections import Counter
+from typing import Any, Dict, List
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+
+
+def _tokens(text: str) -> List[str]:
+    return _PUNCTUATION.sub(" ", text.lower()).split()
+
+
+def token_f1(reference: str, candidate: str) -> float:
+    """SQuAD-style token overlap F1 after lowercasing and stripping punctuation."""
+    ref, cand = _tokens(reference), _tokens(candidate)
+    if not ref or not cand:
+        return float(ref == cand)
+    overlap = sum((Counter(ref) & Counter(cand)).values())
+    if overlap == 0:
+        return 0.0
+    precision, recall = overlap / len(cand), overlap / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def compare_answers(reference: Dict[int, str], candidate: Dict[int, str]) -> Dict[str, Any]:
+    """Exact-match rate, mean token F1 and mean length ratio over questions both sets answered."""
+    common = sorted(reference.keys() & candidate.keys())
+    if not common:
+        return {"questions": 0, "exact_match": 0.0, "mean_token_f1": 0.0, "mean_length_ratio": 0.0}
+    exact = sum(_tokens(reference[i]) == _tokens(candidate[i]) for i in common)
+    f1 = sum(token_f1(reference[i], candidate[i]) for i in common)
+    ratio = sum(len(candidate[i]) / max(1, len(reference[i])) for i in common)
+    return {
+        "questions": len(common),
+        "exact_match": exact / len(common),
+        "mean_token_f1": f1 / len(common),
+        "mean_length_ratio": ratio / len(common),
+    }
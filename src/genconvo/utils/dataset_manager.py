@@ -2,11 +2,123 @@
 Dataset manager for GenConvoBench Q&A pairs using HuggingFace datasets.
 """
 
+import json
+import sys
+import threading
+from dataclasses import asdict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from datasets import Dataset, DatasetDict
+from typing import List, Dict, Any, Iterator, Optional
 
-from .parser import QAPair, qa_pairs_to_dataset
+import pyarrow as pa
+from datasets import Dataset, DatasetDict, Features, Value
+
+from .parser import QAPair, qa_fields, qa_pairs_to_dataset
+from .token_capture import CAPTURE_FEATURES, capture_columns
+
+
+# Single-shard layout written by Dataset.save_to_disk, so load_from_disk can open streamed output
+ARROW_FILENAME = "data-00000-of-00001.arrow"
+
+_ARROW_DTYPES = {str: "string", float: "float64", int: "int64"}
+
+# Column types of a saved Q&A dataset; stays in sync with QAPair fields
+QA_FEATURES = Features({f.name: Value(_ARROW_DTYPES[f.type]) for f in qa_fields()})
+
+# With captured completion tokens and top-k logprobs (see utils/token_capture.py)
+QA_CAPTURE_FEATURES = Features({**QA_FEATURES, **CAPTURE_FEATURES})
+
+
+def qa_pairs_to_table(qa_pairs: List[QAPair], capture: bool = False) -> pa.Table:
+    """Arrow table of Q&A pairs, with the capture columns if `capture`."""
+    table = pa.Table.from_pydict(qa_pairs_to_dataset(qa_pairs), schema=QA_FEATURES.arrow_schema)
+    if capture:
+        for name, column in capture_columns([pair.capture for pair in qa_pairs]).items():
+            table = table.append_column(name, column)
+        table = table.cast(QA_CAPTURE_FEATURES.arrow_schema)
+    return table
+
+
+class StreamingQAWriter:
+    """Writes Q&A pairs to a dataset directory in bounded-size Arrow record batches.
+
+    Pairs are buffered until `batch_size` is reached and then appended to an Arrow
+    IPC stream (the format `save_to_disk` uses) and flushed, so memory stays bounded
+    and readers can tail the file while the run is still going. `close` writes the
+    dataset metadata; after that the directory opens with `Dataset.load_from_disk`.
+    """
+
+    def __init__(self, output_path: str, batch_size: int = 64, capture: bool = False):
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.output_path = Path(output_path)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.arrow_path = self.output_path / ARROW_FILENAME
+        self.batch_size = batch_size
+        self.capture = capture
+        self.num_rows = 0
+
+        self._schema = (QA_CAPTURE_FEATURES if capture else QA_FEATURES).arrow_schema
+        self._lock = threading.Lock()
+        self._buffer: List[QAPair] = []
+        self._sink = pa.OSFile(str(self.arrow_path), "wb")
+        self._writer = pa.ipc.new_stream(self._sink, self._schema)
+        self._closed = False
+
+    def write(self, qa_pair: QAPair) -> None:
+        with self._lock:
+            if self._closed:
+                raise ValueError("StreamingQAWriter is closed")
+            self._buffer.append(qa_pair)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        self._writer.write_table(qa_pairs_to_table(self._buffer, self.capture))
+        self._sink.flush()
+        self.num_rows += len(self._buffer)
+        self._buffer.clear()
+
+    def close(self) -> str:
+        """Flush remaining pairs and write dataset metadata. Returns the dataset path."""
+        with self._lock:
+            if self._closed:
+                return str(self.output_path)
+            self._flush_locked()
+            self._writer.close()
+            self._sink.close()
+            self._closed = True
+
+        # Memory-mapped; only used to derive the metadata save_to_disk would write
+        dataset = Dataset.from_file(str(self.arrow_path))
+        state = {
+            "_data_files": [{"filename": ARROW_FILENAME}],
+            "_fingerprint": dataset._fingerprint,
+            "_format_columns": None,
+            "_format_kwargs": {},
+            "_format_type": None,
+            "_output_all_columns": False,
+            "_split": None,
+        }
+        with open(self.output_path / "state.json", "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        dataset_info = asdict(dataset.info)
+        with open(self.output_path / "dataset_info.json", "w", encoding="utf-8") as f:
+            json.dump({key: dataset_info[key] for key in sorted(dataset_info)}, f, indent=2)
+
+        print(f"Saved {self.num_rows} Q&A pairs to {self.output_path}", file=sys.stderr)
+        return str(self.output_path)
+
+    def __enter__(self) -> "StreamingQAWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
 
 class GenConvoDatasetManager:
@@ -16,13 +128,16 @@ class GenConvoDatasetManager:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
     
-    def save_qa_pairs(self, qa_pairs: List[QAPair], split_name: Optional[str] = None) -> str:
+    def save_qa_pairs(
+        self, qa_pairs: List[QAPair], split_name: Optional[str] = None, capture: bool = False
+    ) -> str:
         """
         Save Q&A pairs to HuggingFace dataset.
         
         Args:
             qa_pairs: List of Q&A pairs to save
             split_name: Optional split name (e.g., 'train', 'test')
+            capture: Also save completion token ids and top-k logprobs (QAPair.capture)
         
         Returns:
             Path to saved dataset
@@ -30,28 +145,109 @@ class GenConvoDatasetManager:
         if not qa_pairs:
             raise ValueError("No Q&A pairs provided")
         
-        # Convert to dataset format
-        dataset_dict = qa_pairs_to_dataset(qa_pairs)
-        
         # Create dataset
-        dataset = Dataset.from_dict(dataset_dict)
-        
-        # Generate filename
-        run_id = qa_pairs[0].run_id
-        prompt_type = qa_pairs[0].prompt_type
-        model = qa_pairs[0].model.replace('-', '_')
-        
-        if split_name:
-            filename = f"{prompt_type}_{model}_{split_name}_{run_id}"
+        if capture:
+            dataset = Dataset(qa_pairs_to_table(qa_pairs, capture=True))
         else:
-            filename = f"{prompt_type}_{model}_{run_id}"
+            dataset = Dataset.from_dict(qa_pairs_to_dataset(qa_pairs), features=QA_FEATURES)
         
         # Save as HuggingFace dataset directory
-        output_path = self.data_dir / filename
+        first = qa_pairs[0]
+        output_path = self.dataset_path(first.prompt_type, first.model, first.filename, first.run_id, split_name)
         dataset.save_to_disk(str(output_path))
         
-        print(f"Saved {len(qa_pairs)} Q&A pairs to {output_path}")
+        print(f"Saved {len(qa_pairs)} Q&A pairs to {output_path}", file=sys.stderr)
         return str(output_path)
+
+    def dataset_path(
+        self, prompt_type: str, model: str, filename: str, run_id: str, split_name: Optional[str] = None
+    ) -> Path:
+        """Directory a run's dataset is saved to."""
+        model = model.replace('-', '_')
+        # Batch runs save several documents within the same second, so the
+        # document stem is part of the name to keep directories distinct.
+        doc = Path(filename).stem
+        
+        if split_name:
+            name = f"{prompt_type}_{model}_{doc}_{split_name}_{run_id}"
+        else:
+            name = f"{prompt_type}_{model}_{doc}_{run_id}"
+        return self.data_dir / name
+
+    def open_stream(
+        self,
+        prompt_type: str,
+        model: str,
+        filename: str,
+        run_id: str,
+        split_name: Optional[str] = None,
+        batch_size: int = 64,
+        capture: bool = False,
+    ) -> StreamingQAWriter:
+        """
+        Open a streaming writer for one run's Q&A pairs.
+        
+        Args:
+            prompt_type, model, filename, run_id: Used to name the dataset directory
+            split_name: Optional split name (e.g., 'train', 'test')
+            batch_size: Number of pairs per Arrow record batch
+            capture: Also write completion token ids and top-k logprobs
+        
+        Returns:
+            StreamingQAWriter; call close() to finish the dataset
+        """
+        output_path = self.dataset_path(prompt_type, model, filename, run_id, split_name)
+        return StreamingQAWriter(str(output_path), batch_size=batch_size, capture=capture)
+
+    def tail_qa_pairs(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield rows from a dataset directory, including one that is still being streamed.
+        
+        Only complete record batches are read; a batch that is mid-write is skipped.
+        
+        Args:
+            file_path: Path to dataset directory
+        
+        Returns:
+            Iterator of row dicts
+        """
+        with pa.OSFile(str(Path(file_path) / ARROW_FILENAME), "rb") as f:
+            reader = pa.ipc.open_stream(f)
+            while True:
+                try:
+                    batch = reader.read_next_batch()
+                except StopIteration:
+                    break
+                except (pa.ArrowInvalid, OSError):
+                    # Reached the partially written tail of a live stream
+                    break
+                yield from batch.to_pylist()
+    
+    def save_qa_pairs_by_prompt_type(
+        self, qa_pairs: List[QAPair], split_name: Optional[str] = None, capture: bool = False
+    ) -> Dict[str, str]:
+        """
+        Save Q&A pairs as one dataset per prompt type.
+        
+        Args:
+            qa_pairs: Q&A pairs from one or more prompt types
+            split_name: Optional split name (e.g., 'train', 'test')
+            capture: Also save completion token ids and top-k logprobs
+        
+        Returns:
+            Mapping of prompt type to saved dataset path
+        """
+        if not qa_pairs:
+            raise ValueError("No Q&A pairs provided")
+
+        by_prompt_type: Dict[str, List[QAPair]] = {}
+        for pair in qa_pairs:
+            by_prompt_type.setdefault(pair.prompt_type, []).append(pair)
+
+        return {
+            prompt_type: self.save_qa_pairs(pairs, split_name=split_name, capture=capture)
+            for prompt_type, pairs in by_prompt_type.items()
+        }
     
     def load_qa_pairs(self, file_path: str) -> Dataset:
         """
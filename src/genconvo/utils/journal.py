@@ -0,0 +1,146 @@
+"""
+Append-only completion journal so interrupted GenConvo runs can be resumed.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RunJournal:
+    """Append-only JSONL record of completed question batches and answers.
+
+    Every completed provider call is written (and fsynced) as soon as it finishes,
+    keyed by document hash, prompt type, model and question index. One file is kept
+    per document hash. When a run is resumed, units look up their entry here and
+    skip the provider call if the work is already done.
+
+    Entries:
+        {"kind": "questions", "document_hash", "prompt_type", "model", "questions", "num_questions", "timestamp"}
+        {"kind": "answer", "document_hash", "prompt_type", "model", "index", "question", "answer", "timestamp"}
+    """
+
+    def __init__(self, journal_dir: str = "data/journal", resume: bool = False):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.resume = resume
+
+        self._lock = threading.Lock()
+        self._loaded: set[str] = set()
+        # Key -> (questions, number of questions asked for, None in older journals)
+        self._questions: Dict[Tuple[str, str, str], Tuple[List[str], Optional[int]]] = {}
+        self._answers: Dict[Tuple[str, str, str, int], Tuple[str, str]] = {}
+
+        self.replayed = 0
+        self.recorded = 0
+
+    def path_for(self, document_hash: str) -> Path:
+        return self.journal_dir / f"{document_hash}.jsonl"
+
+    def _load(self, document_hash: str) -> None:
+        """Read a document's journal once; later entries win. Caller holds the lock."""
+        if document_hash in self._loaded:
+            return
+        self._loaded.add(document_hash)
+
+        path = self.path_for(document_hash)
+        if not path.exists():
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partial last line; everything before it is intact
+                    continue
+                self._index(entry)
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        key = (entry["document_hash"], entry["prompt_type"], entry["model"])
+        if entry["kind"] == "questions":
+            self._questions[key] = (entry["questions"], entry.get("num_questions"))
+        elif entry["kind"] == "answer":
+            self._answers[(*key, int(entry["index"]))] = (entry["question"], entry["answer"])
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        entry["timestamp"] = datetime.now().isoformat()
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._load(entry["document_hash"])
+            with open(self.path_for(entry["document_hash"]), "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._index(entry)
+            self.recorded += 1
+
+    def record_questions(
+        self, document_hash: str, prompt_type: str, model: str, questions: List[str], num_questions: Optional[int] = None
+    ) -> None:
+        self._append({
+            "kind": "questions",
+            "document_hash": document_hash,
+            "prompt_type": prompt_type,
+            "model": model,
+            "questions": list(questions),
+            "num_questions": num_questions,
+        })
+
+    def record_answer(
+        self, document_hash: str, prompt_type: str, model: str, index: int, question: str, answer: str
+    ) -> None:
+        self._append({
+            "kind": "answer",
+            "document_hash": document_hash,
+            "prompt_type": prompt_type,
+            "model": model,
+            "index": index,
+            "question": question,
+            "answer": answer,
+        })
+
+    def completed_questions(
+        self, document_hash: str, prompt_type: str, model: str, num_questions: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """Journaled question batch, or None if not resuming / not done yet.
+
+        With `num_questions`, a batch counts as done if it was asked for that many
+        questions (even if the model returned fewer) or holds at least that many.
+        """
+        if not self.resume:
+            return None
+        with self._lock:
+            self._load(document_hash)
+            entry = self._questions.get((document_hash, prompt_type, model))
+            if entry is None:
+                return None
+            questions, requested = entry
+            if num_questions is not None and requested != num_questions and len(questions) < num_questions:
+                return None
+            self.replayed += 1
+            return questions
+
+    def completed_answer(
+        self, document_hash: str, prompt_type: str, model: str, index: int, question: str
+    ) -> Optional[str]:
+        """Journaled answer for this question index, or None if missing or the question changed."""
+        if not self.resume:
+            return None
+        with self._lock:
+            self._load(document_hash)
+            entry = self._answers.get((document_hash, prompt_type, model, index))
+            if entry is None or entry[0] != question:
+                return None
+            self.replayed += 1
+            return entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "journal_dir": str(self.journal_dir),
+            "resume": self.resume,
+            "replayed": self.replayed,
+            "recorded": self.recorded,
+        }
@@ -3,21 +3,35 @@ Modified from
     https://github.com/HazyResearch/cartridges/blob/main/cartridges/contexts/finance/markdown.py
 """
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
 import re
 import os
 
 
 @dataclass
 class MarkdownSection:
+    """A header and everything under it, as `text[start:end]` of the parsed document.
+
+    Sections hold offsets rather than copies, so a document parsed into N nested
+    sections costs O(N) memory on top of the text; `content` slices on access.
+    """
     level: int
     title: str
     name: str
     path: str
-    content: str
+    start: int
+    end: int
+    text: str = field(repr=False, compare=False)
     desc: str = ""
 
+    @property
+    def content(self) -> str:
+        return self.text[self.start:self.end]
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
 
 def _to_camel_case(title: str) -> str:
     """Convert title to camel case for use as name."""
@@ -59,47 +73,67 @@ def _is_header(line: str) -> tuple[bool, Optional[int], Optional[str]]:
     return False, None, None
 
 
-def markdown_to_sections(text: str, root: str = "root") -> List[MarkdownSection]:
-    """Parse markdown text into sections."""
-    base_section = MarkdownSection(
-        level=0, title=root, path=root, name=root, content=""
-    )
-    sections: List[MarkdownSection] = [base_section]
-    active_sections: List[MarkdownSection] = [base_section]
-    current_section = base_section
+_HEADER_LEVEL = re.compile(r"^(#+)\s")
+_NON_SPACE = re.compile(r"\S")
+
+
+def _paragraphs(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) of each "\n\n"-separated paragraph, as text.split("\n\n") would give."""
+    start = 0
+    while True:
+        end = text.find("\n\n", start)
+        if end == -1:
+            yield start, len(text)
+            return
+        yield start, end
+        start = end + 2
 
-    # Determine bold header level based on max markdown header level
-    lines = text.split("\n\n")
+
+def markdown_to_sections(text: str, root: str = "root") -> List[MarkdownSection]:
+    """Parse markdown text into sections.
+
+    A section spans from its header paragraph to the next header at the same or a
+    shallower level (or the end of the text); the root spans the whole text. Built
+    in one pass over the paragraphs plus one over the headers found.
+    """
+    # Only paragraphs starting with '#' or '*' can be headers, so only those are copied out
+    headers: List[Tuple[int, Optional[int], str]] = []
     max_level = 0
-    for line in lines:
-        if match := re.match(r"^(#+)\s", line.lstrip()):
+    for start, end in _paragraphs(text):
+        first = _NON_SPACE.search(text, start, end)
+        if first is None or text[first.start()] not in "#*":
+            continue
+        paragraph = text[start:end]
+        if match := _HEADER_LEVEL.match(paragraph.lstrip()):
             max_level = max(max_level, len(match.group(1)))
+        is_header, level, header_text = _is_header(paragraph)
+        if is_header and header_text:
+            headers.append((start, level, header_text))
+    # Bold headers sit one level below the deepest markdown header
     bold_level = max_level + 1
 
-    for line in lines:
-        is_header, level, header_text = _is_header(line)
-
-        if is_header and header_text:
-            # Use bold_level for bold headers
-            if level is None:
-                level = bold_level
-
-            name = _to_camel_case(header_text)
-            path = _build_path(current_section, level, name)
-            current_section = MarkdownSection(
-                level=level, title=header_text, name=name, path=path, content=""
-            )
-
-            sections.append(current_section)
-            # Keep only sections at deeper levels
-            active_sections = [s for s in active_sections if s.level < level]
-            active_sections.append(current_section)
-
-        # Add line to all active sections
-        for active_section in active_sections:
-            active_section.content += line + "\n\n"
-
-    # Filter out empty sections
-    return [
-        section for section in sections if section.content.replace("\n", "").strip()
-    ]
+    base_section = MarkdownSection(
+        level=0, title=root, path=root, name=root, start=0, end=len(text), text=text
+    )
+    sections: List[MarkdownSection] = [base_section]
+    open_sections: List[MarkdownSection] = [base_section]
+    current_section = base_section
+    for start, level, header_text in headers:
+        if level is None:
+            level = bold_level
+        # A header closes every open section at its level or deeper
+        while open_sections[-1].level >= level:
+            open_sections.pop().end = start
+
+        name = _to_camel_case(header_text)
+        path = _build_path(current_section, level, name)
+        current_section = MarkdownSection(
+            level=level, title=header_text, name=name, path=path, start=start, end=len(text), text=text
+        )
+        sections.append(current_section)
+        open_sections.append(current_section)
+
+    # Every header section contains its non-empty title; only the root can be empty
+    if _NON_SPACE.search(text) is None:
+        sections = sections[1:]
+    return sections
@@ -0,0 +1,136 @@
+"""
+Benchmark markdown_to_sections against the previous copy-based parser.
+
+    python -m genconvo.utils.markdown_benchmark                 # every FinanceBench markdown
+    python -m genconvo.utils.markdown_benchmark a.md b.md --repeat 5
+
+For each document it reports the best-of-`repeat` parse time and the peak memory
+allocated while parsing (tracemalloc) for both parsers, and checks that they find
+the same sections with the same content.
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from .markdown import _build_path, _is_header, _to_camel_case, markdown_to_sections
+
+
+class _LegacySection:
+    def __init__(self, level: int, title: str, name: str, path: str):
+        self.level, self.title, self.name, self.path = level, title, name, path
+        self.content = ""
+
+
+def legacy_markdown_to_sections(text: str, root: str = "root") -> List[_LegacySection]:
+    """The previous parser: every paragraph is appended to every open ancestor's content."""
+    base_section = _LegacySection(level=0, title=root, path=root, name=root)
+    sections = [base_section]
+    active_sections = [base_section]
+    current_section: Any = base_section
+
+    lines = text.split("\n\n")
+    max_level = 0
+    for line in lines:
+        if match := re.match(r"^(#+)\s", line.lstrip()):
+            max_level = max(max_level, len(match.group(1)))
+    bold_level = max_level + 1
+
+    for line in lines:
+        is_header, level, header_text = _is_header(line)
+        if is_header and header_text:
+            if level is None:
+                level = bold_level
+            name = _to_camel_case(header_text)
+            path = _build_path(current_section, level, name)
+            current_section = _LegacySection(level=level, title=header_text, name=name, path=path)
+            sections.append(current_section)
+            active_sections = [s for s in active_sections if s.level < level]
+            active_sections.append(current_section)
+        for active_section in active_sections:
+            active_section.content += line + "\n\n"
+
+    return [s for s in sections if s.content.replace("\n", "").strip()]
+
+
+def _measure(parse: Callable[[str], list], text: str, repeat: int) -> Tuple[float, int, list]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    sections = parse(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, sections
+
+
+def _same_sections(old: list, new: list, text: str) -> bool:
+    if len(old) != len(new):
+        return False
+    for o, n in zip(old, new):
+        if (o.level, o.title, o.path) != (n.level, n.title, n.path):
+            return False
+        # The old parser also appended a separator after the last paragraph
+        expected = n.content + "\n\n" if n.end == len(text) else n.content
+        if o.content != expected:
+            return False
+    return True
+
+
+def benchmark(paths: List[Path], repeat: int = 3) -> List[Dict[str, Any]]:
+    rows = []
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        old_seconds, old_peak, old = _measure(legacy_markdown_to_sections, text, repeat)
+        new_seconds, new_peak, new = _measure(markdown_to_sections, text, repeat)
+        rows.append({
+            "document": path.stem,
+            "chars": len(text),
+            "sections": len(new),
+            "max_depth": max((s.level for s in new), default=0),
+            "legacy_seconds": old_seconds,
+            "seconds": new_seconds,
+            "legacy_peak_bytes": old_peak,
+            "peak_bytes": new_peak,
+            "matches": _same_sections(old, new, text),
+        })
+    return rows
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark markdown_to_sections on large markdowns.")
+    parser.add_argument("paths", nargs="*", help="Markdown files (default: every FinanceBench markdown)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per parser; the best is kept")
+    args = parser.parse_args(argv)
+
+    if args.paths:
+        paths = [Path(p) for p in args.paths]
+    else:
+        from ..data.finance import FINANCE_BENCH_PATH
+
+        paths = sorted(Path(FINANCE_BENCH_PATH).glob("*.md"))
+    if not paths:
+        parser.error("no markdown files found")
+
+    rows = benchmark(paths, args.repeat)
+    print(f"{'document':<28} {'MB':>6} {'sections':>8} {'depth':>5} {'legacy s':>9} {'new s':>8} "
+          f"{'speedup':>8} {'legacy MB':>10} {'new MB':>8} {'match':>5}")
+    for r in rows:
+        print(
+            f"{r['document'][:28]:<28} {r['chars'] / 1e6:>6.2f} {r['sections']:>8} {r['max_depth']:>5} "
+            f"{r['legacy_seconds']:>9.3f} {r['seconds']:>8.3f} {r['legacy_seconds'] / max(r['seconds'], 1e-9):>7.1f}x "
+            f"{r['legacy_peak_bytes'] / 1e6:>10.1f} {r['peak_bytes'] / 1e6:>8.1f} {'yes' if r['matches'] else 'NO':>5}"
+        )
+    legacy = sum(r["legacy_seconds"] for r in rows)
+    new = sum(r["seconds"] for r in rows)
+    print(f"Total: {legacy:.2f}s -> {new:.2f}s ({legacy / max(new, 1e-9):.1f}x) over {len(rows)} documents")
+    return 0 if all(r["matches"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,251 @@
+"""
+Live run metrics for provider calls, per unit type and prompt type.
+
+Each provider call made by a unit is recorded with its latency, the time it
+waited before being sent (cache warmup gate, worker slot and rate limiter) and
+the token usage the provider reported, including prompt-cache reads and writes.
+`snapshot()` summarizes them as JSON; `to_prometheus()` renders the same series
+in the Prometheus text format. With output paths set, both files are rewritten
+every `flush_interval` seconds during the run (e.g. for a node_exporter textfile
+collector) and once more by `flush()` at the end.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..clients.usage import Usage
+
+# Upper bounds (seconds) of the Prometheus latency histogram buckets
+LATENCY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+# Percentiles are computed over this many of the most recent calls per series
+PERCENTILE_WINDOW = 10_000
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class _Series:
+    """Counters for one (unit type, prompt type)."""
+    requests: int = 0
+    failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_hit_requests: int = 0
+    latency_sum: float = 0.0
+    queue_wait_sum: float = 0.0
+    latency_buckets: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=PERCENTILE_WINDOW))
+    queue_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=PERCENTILE_WINDOW))
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+
+
+def _percentiles(values: Deque[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{p}": None for p in PERCENTILES}
+    # Nearest-rank percentile
+    return {f"p{p}": ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] for p in PERCENTILES}
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # Readers (a scraper, a tail -f) never see a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+class RunMetrics:
+    """Thread-safe collector of per-call latency, queue wait and token usage.
+
+    Shared by every unit of a run (and across jobs in a batch). Token rates are
+    tokens per second of wall-clock time between a series' first call start and
+    its last call end. The prompt-cache hit ratio is cached prompt tokens over
+    prompt tokens.
+    """
+
+    def __init__(
+        self,
+        json_path: Optional[str] = None,
+        prometheus_path: Optional[str] = None,
+        flush_interval: float = 10.0,
+    ):
+        self.json_path = Path(json_path) if json_path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.flush_interval = flush_interval
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._started = time.time()
+
+    def record(
+        self,
+        unit_type: str,
+        prompt_type: str,
+        latency: float,
+        queue_wait: float = 0.0,
+        usage: Optional[Usage] = None,
+        cache_write_tokens: int = 0,
+    ) -> None:
+        """Record one completed provider call."""
+        now = time.monotonic()
+        with self._lock:
+            s = self._series.setdefault((unit_type, prompt_type), _Series())
+            s.requests += 1
+            s.latency_sum += latency
+            s.queue_wait_sum += queue_wait
+            s.latencies.append(latency)
+            s.queue_waits.append(queue_wait)
+            index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+            if index < len(LATENCY_BUCKETS):
+                s.latency_buckets[index] += 1
+            if usage is not None:
+                s.prompt_tokens += usage.prompt_tokens
+                s.completion_tokens += usage.completion_tokens
+                s.cached_prompt_tokens += usage.cached_prompt_tokens
+                s.cache_hit_requests += usage.cached_prompt_tokens > 0
+            s.cache_write_tokens += cache_write_tokens
+            start = now - latency
+            s.first_start = start if s.first_start is None else min(s.first_start, start)
+            s.last_end = now if s.last_end is None else max(s.last_end, now)
+        self._maybe_flush()
+
+    def record_failure(self, unit_type: str, prompt_type: str) -> None:
+        """Record a provider call that raised after verdict's retries."""
+        with self._lock:
+            self._series.setdefault((unit_type, prompt_type), _Series()).failures += 1
+        self._maybe_flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly summary: one entry per series plus run totals."""
+        with self._lock:
+            items = sorted(self._series.items())
+            series = []
+            for (unit_type, prompt_type), s in items:
+                elapsed = (s.last_end - s.first_start) if s.first_start is not None else 0.0
+                series.append({
+                    "unit_type": unit_type,
+                    "prompt_type": prompt_type,
+                    "requests": s.requests,
+                    "failures": s.failures,
+                    "latency_seconds": {"mean": _ratio(s.latency_sum, s.requests), **_percentiles(s.latencies)},
+                    "queue_wait_seconds": {
+                        "mean": _ratio(s.queue_wait_sum, s.requests), **_percentiles(s.queue_waits)
+                    },
+                    "tokens": {
+                        "prompt": s.prompt_tokens,
+                        "completion": s.completion_tokens,
+                        "cached_prompt": s.cached_prompt_tokens,
+                        "cache_write": s.cache_write_tokens,
+                    },
+                    "tokens_per_second": {
+                        "input": _ratio(s.prompt_tokens, elapsed),
+                        "output": _ratio(s.completion_tokens, elapsed),
+                        "cached": _ratio(s.cached_prompt_tokens, elapsed),
+                    },
+                    "prompt_cache_hit_ratio": _ratio(s.cached_prompt_tokens, s.prompt_tokens),
+                    "cache_hit_request_ratio": _ratio(s.cache_hit_requests, s.requests),
+                })
+        prompt = sum(s["tokens"]["prompt"] for s in series)
+        cached = sum(s["tokens"]["cached_prompt"] for s in series)
+        return {
+            "started_at": self._started,
+            "updated_at": time.time(),
+            "totals": {
+                "requests": sum(s["requests"] for s in series),
+                "failures": sum(s["failures"] for s in series),
+                "prompt_tokens": prompt,
+                "completion_tokens": sum(s["tokens"]["completion"] for s in series),
+                "cached_prompt_tokens": cached,
+                "cache_write_tokens": sum(s["tokens"]["cache_write"] for s in series),
+                "prompt_cache_hit_ratio": _ratio(cached, prompt),
+            },
+            "series": series,
+        }
+
+    def to_prometheus(self) -> str:
+        """The collected series in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP genconvo_{name} {help_text}")
+            lines.append(f"# TYPE genconvo_{name} {kind}")
+
+        with self._lock:
+            items = sorted(self._series.items())
+            labelled = [
+                (f'unit_type="{_escape(unit_type)}",prompt_type="{_escape(prompt_type)}"', s)
+                for (unit_type, prompt_type), s in items
+            ]
+            counters = [
+                ("requests_total", "Provider calls completed", lambda s: s.requests),
+                ("request_failures_total", "Provider calls that failed after retries", lambda s: s.failures),
+                ("prompt_tokens_total", "Prompt tokens reported by the provider", lambda s: s.prompt_tokens),
+                ("completion_tokens_total", "Completion tokens reported by the provider", lambda s: s.completion_tokens),
+                ("cached_prompt_tokens_total", "Prompt tokens read from the prompt cache", lambda s: s.cached_prompt_tokens),
+                ("cache_write_tokens_total", "Prompt tokens written to the prompt cache", lambda s: s.cache_write_tokens),
+                ("queue_wait_seconds_total", "Time calls waited before being sent", lambda s: s.queue_wait_sum),
+            ]
+            for name, help_text, value in counters:
+                family(name, "counter", help_text)
+                lines.extend(f"genconvo_{name}{{{labels}}} {value(s)}" for labels, s in labelled)
+
+            family("request_latency_seconds", "histogram", "Provider call latency")
+            for labels, s in labelled:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, s.latency_buckets):
+                    cumulative += count
+                    lines.append(f'genconvo_request_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'genconvo_request_latency_seconds_bucket{{{labels},le="+Inf"}} {s.requests}')
+                lines.append(f"genconvo_request_latency_seconds_sum{{{labels}}} {s.latency_sum}")
+                lines.append(f"genconvo_request_latency_seconds_count{{{labels}}} {s.requests}")
+
+            family("prompt_cache_hit_ratio", "gauge", "Cached prompt tokens over prompt tokens")
+            lines.extend(
+                f"genconvo_prompt_cache_hit_ratio{{{labels}}} {_ratio(s.cached_prompt_tokens, s.prompt_tokens) or 0.0}"
+                for labels, s in labelled
+            )
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        """Write the JSON snapshot and the Prometheus file, if their paths are set."""
+        with self._flush_lock:
+            self._write()
+
+    def _write(self) -> None:
+        self._last_flush = time.monotonic()
+        if self.json_path is not None:
+            _write_atomic(self.json_path, json.dumps(self.snapshot(), indent=2))
+        if self.prometheus_path is not None:
+            _write_atomic(self.prometheus_path, self.to_prometheus())
+
+    def _maybe_flush(self) -> None:
+        if self.json_path is None and self.prometheus_path is None:
+            return
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        # One writer at a time; calls landing during a write skip it rather than queue up
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self._write()
+            finally:
+                self._flush_lock.release()
@@ -2,13 +2,16 @@
 Parser for extracting Q&A pairs from GenConvoBench pipeline results.
 """
 
-from typing import Dict, List, Any, Tuple, Iterable, Mapping, Optional
+from typing import TYPE_CHECKING, Dict, List, Any, Tuple, Iterable, Mapping, Optional
 from dataclasses import dataclass, fields
 from datetime import datetime
-import hashlib
 import re
+from .prompt_cache import document_key
 from .schemas import ParseContext
 
+if TYPE_CHECKING:
+    from .token_capture import TokenCapture
+
 
 @dataclass
 class QAPair:
@@ -23,6 +26,12 @@ class QAPair:
     document_hash: str
     layer_index: int
     timestamp: str
+    # JSON list of the sections ({title, path, start, end}) the question was generated
+    # from in section-targeted runs; empty when the whole document was used
+    sections: str = ""
+    # Completion tokens and top-k logprobs, when the run captures them; saved as
+    # separate columns (see utils/token_capture.py), not as a field of its own
+    capture: Optional["TokenCapture"] = None
 
 
 def _keys_with_suffix(items: Iterable[str], suffix: str) -> List[str]:
@@ -32,74 +41,127 @@ def _first_str_value_by_suffix(mapping: Mapping[str, Any], suffix: str) -> str:
     return next((v for k, v in mapping.items() if k.endswith(suffix) and isinstance(v, str)), "")
 
 
+def _branch_prompt_type(questions_key: str, default: str) -> str:
+    """Prompt type of a branch from its named QuestionsUnit key, e.g. `...unit[Unit factual]_questions`."""
+    match = re.search(r'unit\[Unit (\w+)\]_questions$', questions_key)
+    return match.group(1) if match else default
+
+
 def parse_results(
     results: Tuple[Dict[str, Any], List[str]],
     context: ParseContext,
+    run_id: Optional[str] = None,
 ) -> List[QAPair]:
     """
     Parse verdict pipeline results into Q&A pairs.
+
+    Handles both the single prompt type pipeline and the multi-prompt pipeline,
+    where each branch is a QuestionsUnit named after its prompt type.
     
     Args:
         results: A tuple of (results_dict, leaf_prefixes) from the pipeline
         context: Immutable parse context with metadata
+        run_id: Optional run id; defaults to the current timestamp
     
     Returns:
         List of QAPair objects
     """
     qa_pairs = []
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
 
     # Find document and questions once
     results_dict, leaf_prefixes = results
 
     document = _first_str_value_by_suffix(results_dict, "_document")
-    questions_key = _keys_with_suffix(results_dict.keys(), "_questions")[0]
+    document_hash = context.document_hash or document_key(document or "")
     answer_keys: List[str] = _keys_with_suffix(leaf_prefixes, "_answer")
 
-    document_hash = hashlib.md5((document or "").encode()).hexdigest()
-    questions = results_dict.get(questions_key, [])
-
-    # Extract layer indices from answer keys and create a mapping
-    answer_key_to_index = {}
-    for a_key in answer_keys:
-        # Extract layer index from key pattern: ...layer[{i}].unit[Unit]_answer
-        match = re.search(r'layer\[(\d+)\]', a_key)
-        if match:
-            layer_index = int(match.group(1))
-            answer_key_to_index[a_key] = layer_index
-        else:
-            # Fallback: use the order in the list (original behavior)
-            answer_key_to_index[a_key] = len(answer_key_to_index)
-
-    # Sort answer keys by their layer index to ensure correct ordering
-    sorted_answer_keys = sorted(answer_keys, key=lambda k: answer_key_to_index[k])
-
-    for a_key in sorted_answer_keys:
-        answer_text = results_dict.get(a_key, "")
-        layer_index = answer_key_to_index[a_key]
-        question_text = questions[layer_index]
-
-        qa_pairs.append(
-            QAPair(
-                run_id=run_id,
-                prompt_type=context.prompt_type,
-                question=question_text,
-                answer=answer_text,
-                model=context.model,
-                temperature=context.temperature,
-                filename=context.filename,
-                document_hash=document_hash,
-                layer_index=layer_index,
-                timestamp=datetime.now().isoformat(),
+    for questions_key in sorted(_keys_with_suffix(results_dict.keys(), "_questions")):
+        branch_prefix = questions_key[: -len("_questions")] + "."
+        prompt_type = _branch_prompt_type(questions_key, context.prompt_type)
+        questions = results_dict.get(questions_key, [])
+        branch_answer_keys = [k for k in answer_keys if k.startswith(branch_prefix)]
+
+        # Extract layer indices from answer keys and create a mapping
+        answers_by_index: Dict[int, Any] = {}
+        for a_key in branch_answer_keys:
+            # Extract layer index from key pattern: ...layer[{i}].unit[Unit]_answer
+            match = re.search(r'layer\[(\d+)\]', a_key[len(branch_prefix):])
+            if match:
+                layer_index = int(match.group(1))
+            else:
+                # Fallback: use the order in the list (original behavior)
+                layer_index = len(answers_by_index)
+            answers_by_index[layer_index] = results_dict.get(a_key, "")
+
+        # Batched answering (questions_per_call > 1): each unit reports the question
+        # indices it answered next to its answers, e.g. ...layer[{i}].unit[Unit]_indices
+        for i_key in _keys_with_suffix(leaf_prefixes, "_indices"):
+            if not i_key.startswith(branch_prefix):
+                continue
+            batch_answers = results_dict.get(i_key[: -len("_indices")] + "_answers", [])
+            for layer_index, answer_text in zip(results_dict.get(i_key, []), batch_answers):
+                answers_by_index[int(layer_index)] = answer_text
+
+        # Sort by layer index to ensure correct ordering
+        for layer_index in sorted(answers_by_index):
+            answer_text = answers_by_index[layer_index]
+            question_text = questions[layer_index]
+
+            qa_pairs.append(
+                QAPair(
+                    run_id=run_id,
+                    prompt_type=prompt_type,
+                    question=question_text,
+                    answer=answer_text,
+                    model=context.model,
+                    temperature=context.temperature,
+                    filename=context.filename,
+                    document_hash=document_hash,
+                    layer_index=layer_index,
+                    timestamp=datetime.now().isoformat(),
+                )
             )
-        )
     
     return qa_pairs
 
 
+def layout_results(
+    document: str,
+    branches: Mapping[str, Tuple[List[str], Mapping[int, str]]],
+    name: str = "GenConvoBench",
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Lay out Q&A generated outside verdict under the keys of a named multi-branch pipeline.
+
+    Args:
+        document: The source document
+        branches: prompt_type -> (questions, {question index: answer}); missing answers are skipped
+        name: Pipeline name used in the key prefix
+
+    Returns:
+        (results_dict, leaf_prefixes), ready for parse_results
+    """
+    results_dict: Dict[str, Any] = {}
+    leaf_prefixes: List[str] = []
+    for prompt_type, (questions, answers) in branches.items():
+        branch = f"{name}_root.block.unit[Unit {prompt_type}]"
+        results_dict[f"{branch}_document"] = document
+        results_dict[f"{branch}_questions"] = list(questions)
+        for index in sorted(answers):
+            key = f"{branch}.block.layer[{index}].unit[Unit {prompt_type}]_answer"
+            results_dict[key] = answers[index]
+            leaf_prefixes.append(key)
+    return results_dict, leaf_prefixes
+
+
 def qa_pairs_to_dataset(qa_pairs: List[QAPair]):
     """Convert Q&A pairs to HuggingFace dataset format (dict of column lists).
 
-    Automatically stays in sync with QAPair fields.
+    Automatically stays in sync with QAPair fields (captures become their own columns).
     """
-    return {f.name: [getattr(pair, f.name) for pair in qa_pairs] for f in fields(QAPair)}
\ No newline at end of file
+    return {f.name: [getattr(pair, f.name) for pair in qa_pairs] for f in qa_fields()}
+
+
+def qa_fields():
+    """QAPair fields stored as one column each."""
+    return [f for f in fields(QAPair) if f.name != "capture"]
\ No newline at end of file
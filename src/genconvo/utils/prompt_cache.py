@@ -0,0 +1,137 @@
+"""
+Scheduling helpers for Anthropic prompt caching of the document system message.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Keys of recently seen documents by identity. A run hands the same str object to
+# every unit, so each unit call finds the key here instead of re-hashing the text.
+# Entries keep their documents alive, so only a few concurrent jobs' worth are kept.
+_KEYS: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+_KEYS_LOCK = threading.Lock()
+_MAX_KEYS = 8
+
+
+def document_key(document: str) -> str:
+    """Stable key for a document's cached system prompt."""
+    with _KEYS_LOCK:
+        entry = _KEYS.get(id(document))
+        if entry is not None and entry[0] is document:
+            _KEYS.move_to_end(id(document))
+            return entry[1]
+    key = hashlib.md5(document.encode()).hexdigest()
+    remember_document_key(document, key)
+    return key
+
+
+def remember_document_key(document: str, key: str) -> None:
+    """Record `key` (e.g. from a document sidecar) as the key of this document object."""
+    with _KEYS_LOCK:
+        # The entry holds the document, so its id cannot be reused while it is cached
+        _KEYS[id(document)] = (document, key)
+        _KEYS.move_to_end(id(document))
+        while len(_KEYS) > _MAX_KEYS:
+            _KEYS.popitem(last=False)
+
+
+class _WarmupState:
+    __slots__ = ("event", "priming", "expires_at")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.priming = False
+        # Monotonic time the provider cache is expected to expire; 0 means cold
+        self.expires_at = 0.0
+
+
+class DocumentCacheWarmup:
+    """Lets one request write the document cache before the others are released.
+
+    Concurrent requests that carry the same document under `cache_control` race
+    each other: if they all start before the first cache write lands, each pays
+    full input price and counts the whole document against the token limit. The
+    first caller for a document becomes the leader and sends its request; everyone
+    else blocks in `acquire` until the leader calls `release`. If the leader fails,
+    a waiter is promoted to leader instead.
+
+    State is keyed by document hash, so one warmup shared across pipelines covers
+    every prompt type on that document. Each request that uses the cache extends
+    its expiry by `ttl_seconds` (Anthropic's ephemeral cache is 5 minutes, refreshed
+    on every hit). Once a document is within `reprime_margin_seconds` of expiring,
+    the next caller re-primes it as a new leader and the burst waits again.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, reprime_margin_seconds: float = 30.0) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.reprime_margin_seconds = reprime_margin_seconds
+        self._lock = threading.Lock()
+        self._states: Dict[str, _WarmupState] = {}
+
+        self.primes = 0
+        self.reprimes = 0
+        self.waits = 0
+
+    def acquire(self, key: str) -> bool:
+        """Block until the document is warm. Returns True if the caller must prime it."""
+        waited = False
+        while True:
+            with self._lock:
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = _WarmupState()
+                if not state.priming:
+                    if time.monotonic() < state.expires_at - self.reprime_margin_seconds:
+                        return False
+                    if state.expires_at:
+                        self.reprimes += 1
+                    else:
+                        self.primes += 1
+                    state.priming = True
+                    state.event = threading.Event()
+                    return True
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                event = state.event
+            event.wait()
+
+    def release(self, key: str, success: bool, sent_at: Optional[float] = None) -> None:
+        """Called by the leader once its request finished.
+
+        `sent_at` is the monotonic time the request went out (defaults to now).
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            state.priming = False
+            if success:
+                self._extend(state, sent_at)
+            else:
+                # Let a waiter retry as the new leader
+                state.expires_at = 0.0
+            state.event.set()
+
+    def touch(self, key: str, sent_at: Optional[float] = None) -> None:
+        """Record that a non-leader request read (and so refreshed) the cache."""
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state.expires_at:
+                self._extend(state, sent_at)
+
+    def _extend(self, state: _WarmupState, sent_at: Optional[float]) -> None:
+        sent_at = time.monotonic() if sent_at is None else sent_at
+        state.expires_at = max(state.expires_at, sent_at + self.ttl_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._states),
+                "primes": self.primes,
+                "reprimes": self.reprimes,
+                "waits": self.waits,
+            }
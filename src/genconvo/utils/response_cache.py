@@ -0,0 +1,167 @@
+"""
+Persistent, content-addressed cache of LLM responses for GenConvo units.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Literal, Optional, Tuple
+
+CacheMode = Literal["read-write", "read-only", "bypass"]
+
+
+class _InFlight:
+    __slots__ = ("done", "value")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Optional[Dict[str, Any]] = None
+
+
+class ResponseCache:
+    """On-disk response cache keyed by model, sampling params, system and user text.
+
+    Entries live in a single SQLite file and are evicted least-recently-used
+    first once their total size exceeds `max_bytes`. Identical requests that are
+    in flight at the same time are coalesced: the first caller sends the request
+    and the rest wait for its result instead of paying for their own.
+
+    Modes:
+        read-write: serve hits and store new responses
+        read-only:  serve hits, never write
+        bypass:     no lookups, no writes
+    """
+
+    def __init__(
+        self,
+        path: str = "data/response_cache.sqlite",
+        max_bytes: int = 2 * 1024**3,
+        mode: CacheMode = "read-write",
+    ):
+        if mode not in ("read-write", "read-only", "bypass"):
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.mode = mode
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, "_InFlight"] = {}
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, params: Dict[str, Any], system: str, user: str, schema: str = "") -> str:
+        """Content hash identifying one request."""
+        payload = json.dumps(
+            {"model": model, "params": params, "system": system, "user": user, "schema": schema},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "bypass"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for `key` (and mark it recently used), or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "read-write":
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.mode != "read-write":
+            return
+        data = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self.writes += 1
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def begin(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Claim `key` for an in-flight request.
+
+        Returns (True, None) if the caller should send the request; it must then
+        call `end`. Otherwise waits for the identical in-flight request and returns
+        (False, its response), which is None if that request failed.
+        """
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                self._inflight[key] = _InFlight()
+                return True, None
+            self.coalesced += 1
+        inflight.done.wait()
+        return False, inflight.value
+
+    def end(self, key: str, value: Optional[Dict[str, Any]] = None) -> None:
+        """Release `key` and hand `value` (None on failure) to any coalesced waiters."""
+        with self._lock:
+            inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            inflight.value = value
+            inflight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
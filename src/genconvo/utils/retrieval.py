@@ -0,0 +1,371 @@
+"""
+BM25 retrieval over a document's sections, for answering from a few excerpts
+instead of the whole document.
+
+The document is cut into passages at every markdown header (see
+markdown_to_sections); passages longer than `PASSAGE_CHARS` are split at paragraph
+breaks. Each passage is indexed with the titles of the sections it belongs to.
+The index is a CSR inverted index in NumPy arrays, built once per document and
+saved next to the markdown as `<name>.bm25.npz`; it is rebuilt when the
+document's hash no longer matches.
+
+`DocumentRetriever.retrieve` scores passages for a question and keeps the top-k
+that fit in a token budget. When the kept passages cover too little of the
+question's terms (weighted by IDF), the retrieval is marked as a fallback and the
+full document is used instead.
+"""
+
+import io
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..clients.usage import TokenCounter
+from .markdown import MarkdownSection, markdown_to_sections
+from .prompt_cache import document_key
+from .sections import split_span
+
+# Bump when passages or terms change so saved indexes are rebuilt
+INDEX_VERSION = 1
+PASSAGE_CHARS = 4000
+# Passages shorter than this are merged into the next one
+MIN_PASSAGE_CHARS = 200
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERM = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it its of on or that the their "
+    "this to was were what when which who whom why will with".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    """Lowercased word and number terms, without stopwords; a plural "s" is dropped."""
+    out = []
+    for term in _TERM.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss") and term.isalpha():
+            term = term[:-1]
+        out.append(term)
+    return out
+
+
+def index_path(markdown_path: Path) -> Path:
+    return Path(markdown_path).with_suffix(".bm25.npz")
+
+
+@dataclass
+class RetrievalConfig:
+    """How many passages to send and when to fall back to the full document."""
+    top_k: int = 5
+    # Passages are added best-first until the next one would exceed this
+    token_budget: int = 8000
+    # Fraction of the question's IDF mass the kept passages must contain
+    min_coverage: float = 0.6
+
+
+@dataclass
+class Retrieval:
+    """Passages kept for one query, in document order, or a fallback to the full document."""
+    passages: List[int]
+    scores: List[float]
+    coverage: float
+    tokens: int
+    fallback: bool
+
+
+class BM25Index:
+    """Inverted index of a document's passages: term -> (passage ids, term frequencies)."""
+
+    def __init__(
+        self,
+        document_hash: str,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        headings: List[str],
+        lengths: np.ndarray,
+        vocabulary: List[str],
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+    ):
+        self.document_hash = document_hash
+        self.starts = starts
+        self.ends = ends
+        self.headings = headings
+        self.lengths = lengths
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.postings = postings
+        self.frequencies = frequencies
+        self._term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self._average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, text: str, sections: Optional[List[MarkdownSection]] = None) -> "BM25Index":
+        spans: List[Tuple[int, int, str]] = []
+        for start, end, heading in _passages(text, sections):
+            if spans and spans[-1][1] - spans[-1][0] < MIN_PASSAGE_CHARS and end - spans[-1][0] <= PASSAGE_CHARS:
+                # A header with little text under it joins the passage that follows
+                start = spans.pop()[0]
+            spans.append((start, end, heading))
+
+        counts = [Counter(terms(heading) + terms(text[start:end])) for start, end, heading in spans]
+        vocabulary = sorted({term for c in counts for term in c})
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        rows: List[List[Tuple[int, int]]] = [[] for _ in vocabulary]
+        for passage, c in enumerate(counts):
+            for term, tf in c.items():
+                rows[term_ids[term]].append((passage, tf))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+        flat = [pair for r in rows for pair in r]
+        return cls(
+            document_hash=document_key(text),
+            starts=np.array([s for s, _, _ in spans], dtype=np.int64),
+            ends=np.array([e for _, e, _ in spans], dtype=np.int64),
+            headings=[h for _, _, h in spans],
+            lengths=np.array([sum(c.values()) for c in counts], dtype=np.int32),
+            vocabulary=vocabulary,
+            indptr=indptr,
+            postings=np.array([p for p, _ in flat], dtype=np.int32),
+            frequencies=np.array([tf for _, tf in flat], dtype=np.int32),
+        )
+
+    def save(self, path: Path) -> None:
+        meta = {"version": INDEX_VERSION, "document_hash": self.document_hash}
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            meta=np.array(json.dumps(meta)),
+            starts=self.starts,
+            ends=self.ends,
+            headings=np.array(self.headings, dtype=str),
+            lengths=self.lengths,
+            vocabulary=np.array(self.vocabulary, dtype=str),
+            indptr=self.indptr,
+            postings=self.postings,
+            frequencies=self.frequencies,
+        )
+        # Several jobs on one document may build it at once; the last complete write wins
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(buffer.getvalue())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """The saved index, or None if it is missing, unreadable or from another index version."""
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != INDEX_VERSION:
+                    return None
+                return cls(
+                    document_hash=meta["document_hash"],
+                    starts=data["starts"],
+                    ends=data["ends"],
+                    headings=data["headings"].tolist(),
+                    lengths=data["lengths"],
+                    vocabulary=data["vocabulary"].tolist(),
+                    indptr=data["indptr"],
+                    postings=data["postings"],
+                    frequencies=data["frequencies"],
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def idf(self, term: str) -> float:
+        term_id = self._term_ids.get(term)
+        df = 0 if term_id is None else int(self.indptr[term_id + 1] - self.indptr[term_id])
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def score(self, query_terms: List[str]) -> np.ndarray:
+        """BM25 score of every passage for the distinct `query_terms`."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self._average_length, 1e-9))
+        for term in set(query_terms):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            passages, tf = self.postings[lo:hi], self.frequencies[lo:hi]
+            # A term occurs once per passage in its postings, so plain fancy-index += is safe
+            scores[passages] += self.idf(term) * tf * (BM25_K1 + 1) / (tf + norm[passages])
+        return scores
+
+    def contains(self, passage: int, term: str) -> bool:
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return False
+        lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+        position = lo + np.searchsorted(self.postings[lo:hi], passage)
+        return bool(position < hi and self.postings[position] == passage)
+
+
+def _passages(text: str, sections: Optional[List[MarkdownSection]] = None) -> List[Tuple[int, int, str]]:
+    """(start, end, heading) cut at every header, with " > "-joined titles of the enclosing sections."""
+    sections = sorted(sections or markdown_to_sections(text), key=lambda s: (s.start, s.level))
+    boundaries: List[Tuple[int, str]] = []
+    stack: List[MarkdownSection] = []
+    for section in sections:
+        while stack and stack[-1].end <= section.start:
+            stack.pop()
+        stack.append(section)
+        heading = " > ".join(s.title for s in stack if s.level > 0)
+        if boundaries and boundaries[-1][0] == section.start:
+            boundaries[-1] = (section.start, heading)
+        else:
+            boundaries.append((section.start, heading))
+    if not boundaries or boundaries[0][0] > 0:
+        boundaries.insert(0, (0, ""))
+
+    passages = []
+    for i, (start, heading) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(text)
+        passages.extend((s, e, heading) for s, e in split_span(text, start, end, PASSAGE_CHARS))
+    return passages
+
+
+def load_or_build_index(
+    markdown_path: Path, text: str, sections: Optional[List[MarkdownSection]] = None
+) -> BM25Index:
+    """The saved index for `text` if it is current, else a fresh one (saved when the directory is writable).
+
+    `sections` (e.g. from the document sidecar) saves parsing `text` again.
+    """
+    path = index_path(markdown_path)
+    index = BM25Index.load(path)
+    if index is not None and index.document_hash == document_key(text):
+        return index
+    index = BM25Index.build(text, sections)
+    try:
+        index.save(path)
+    except OSError:
+        pass
+    return index
+
+
+class DocumentRetriever:
+    """Answer contexts for questions about one document, with running stats.
+
+    Shared by every answer unit of a run, so it is thread-safe.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        index: BM25Index,
+        config: RetrievalConfig,
+        counter: TokenCounter,
+        document_tokens: Optional[int] = None,
+    ):
+        self.text = text
+        self.index = index
+        self.config = config
+        self.document_tokens = counter.count(text) if document_tokens is None else document_tokens
+        self._passage_tokens = counter.count_batch(
+            [self._render_passage(i) for i in range(len(index))]
+        )
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Retrieval] = {}
+        self._contexts = 0
+        self._fallbacks = 0
+        self._context_tokens = 0
+
+    def retrieve(self, query: str) -> Retrieval:
+        with self._lock:
+            cached = self._cache.get(query)
+        if cached is not None:
+            return cached
+        retrieval = self._retrieve(query)
+        with self._lock:
+            self._cache[query] = retrieval
+        return retrieval
+
+    def _retrieve(self, query: str) -> Retrieval:
+        if self.document_tokens <= self.config.token_budget:
+            # The whole document already fits the budget
+            return Retrieval([], [], 1.0, self.document_tokens, fallback=True)
+        query_terms = sorted(set(terms(query)))
+        scores = self.index.score(query_terms)
+
+        kept: List[int] = []
+        tokens = 0
+        for passage in np.argsort(-scores, kind="stable")[: self.config.top_k]:
+            passage = int(passage)
+            if scores[passage] <= 0:
+                break
+            if tokens + self._passage_tokens[passage] > self.config.token_budget:
+                continue
+            kept.append(passage)
+            tokens += self._passage_tokens[passage]
+
+        weights = {term: self.index.idf(term) for term in query_terms}
+        matched = sum(w for term, w in weights.items() if any(self.index.contains(p, term) for p in kept))
+        coverage = matched / sum(weights.values()) if weights else 0.0
+        kept.sort()
+        return Retrieval(
+            passages=kept,
+            scores=[float(scores[p]) for p in kept],
+            coverage=coverage,
+            tokens=tokens,
+            fallback=not kept or coverage < self.config.min_coverage,
+        )
+
+    def context(self, questions: List[str]) -> str:
+        """System text for answering `questions`: their passages, or the whole document if any falls back."""
+        retrievals = [self.retrieve(q) for q in questions]
+        if any(r.fallback for r in retrievals):
+            context, tokens, fallback = self.text, self.document_tokens, True
+        else:
+            passages = sorted({p for r in retrievals for p in r.passages})
+            context = "\n\n---\n\n".join(self._render_passage(p) for p in passages)
+            tokens, fallback = sum(self._passage_tokens[p] for p in passages), False
+        with self._lock:
+            self._contexts += 1
+            self._fallbacks += fallback
+            self._context_tokens += tokens
+        return context
+
+    def provenance(self, question: str) -> str:
+        """JSON list of the passages retrieved for `question`; empty when it fell back."""
+        retrieval = self.retrieve(question)
+        if retrieval.fallback:
+            return ""
+        return json.dumps([
+            {
+                "title": self.index.headings[p],
+                "start": int(self.index.starts[p]),
+                "end": int(self.index.ends[p]),
+                "score": round(score, 4),
+            }
+            for p, score in zip(retrieval.passages, retrieval.scores)
+        ])
+
+    def _render_passage(self, passage: int) -> str:
+        start, end = int(self.index.starts[passage]), int(self.index.ends[passage])
+        heading = self.index.headings[passage] or "Untitled"
+        return f"Excerpt: {heading}\n\n{self.text[start:end].strip()}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "passages": len(self.index),
+                "document_tokens": self.document_tokens,
+                "contexts": self._contexts,
+                "fallbacks": self._fallbacks,
+                "mean_context_tokens": self._context_tokens / self._contexts if self._contexts else None,
+            }
@@ -1,6 +1,6 @@
 import json
 from dataclasses import dataclass
-from typing import Any, Mapping, Dict
+from typing import Any, Mapping, Dict, Optional
 
 from verdict.schema import Schema
 
@@ -17,6 +17,8 @@ class ParseContext:
     model: str
     temperature: float
     prompt_type: str
+    # From the document sidecar; parse_results hashes the document when it is missing
+    document_hash: Optional[str] = None
 
     @classmethod
     def from_mapping(cls, mapping: Mapping[str, Any]) -> "ParseContext":
@@ -27,6 +29,7 @@ class ParseContext:
             model=str(mapping["model"]),
             temperature=float(mapping["temperature"]),
             prompt_type=str(mapping["prompt_type"]),
+            document_hash=mapping.get("document_hash"),
         )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -36,6 +39,7 @@ class ParseContext:
             "model": self.model,
             "temperature": self.temperature,
             "prompt_type": self.prompt_type,
+            "document_hash": self.document_hash,
         }
 
     def to_json(self) -> str:
@@ -0,0 +1,194 @@
+"""
+Section-targeted context: send a few sections of the document plus its outline
+instead of the whole document.
+
+`plan_sections` picks the sections each question of a prompt type is about. The
+question call sees the outline and every picked section, labelled [S1], [S2], ...,
+and is told which excerpt(s) each question must come from. The answer call for a
+question then sees only the outline and that question's sections. Disjoint
+questions get a pair of distant, non-overlapping sections.
+
+Plans are seeded by the document and prompt type, so a resumed run picks the
+same sections again.
+"""
+
+import json
+import math
+import random
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .markdown import MarkdownSection, markdown_to_sections
+from .prompt_cache import document_key
+
+# Prompt types whose questions each span two distant sections
+PAIRED_PROMPT_TYPES = ("disjoint",)
+
+
+def candidate_sections(
+    text: str,
+    min_chars: int = 400,
+    max_chars: int = 12_000,
+    sections: Optional[List[MarkdownSection]] = None,
+) -> List[MarkdownSection]:
+    """Sections that can be sent on their own: between `min_chars` and `max_chars`
+    long, and without a nested section that also qualifies (so candidates never
+    overlap). Documents without usable headers are cut into paragraph-aligned
+    chunks of up to `max_chars` instead.
+
+    `sections` (e.g. from the document sidecar) saves parsing `text` again.
+    """
+    sections = [s for s in (sections or markdown_to_sections(text)) if s.level > 0]
+    fits = [min_chars <= len(s) <= max_chars for s in sections]
+    has_fitting_child = [False] * len(sections)
+    ancestors: List[int] = []
+    for i, section in enumerate(sections):
+        # Sections come in document order, so ancestors of i are a stack
+        while ancestors and sections[ancestors[-1]].end <= section.start:
+            ancestors.pop()
+        if fits[i]:
+            for a in ancestors:
+                has_fitting_child[a] = True
+        ancestors.append(i)
+    candidates = [s for s, fit, nested in zip(sections, fits, has_fitting_child) if fit and not nested]
+    return candidates if len(candidates) >= 2 else _chunks(text, max_chars)
+
+
+def split_span(text: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Cut text[start:end] into non-blank pieces of at most `max_chars`, at the last
+    paragraph break before the limit, else the last line break, else anywhere."""
+    pieces: List[Tuple[int, int]] = []
+    while start < end:
+        stop = min(start + max_chars, end)
+        if stop < end:
+            cut = text.rfind("\n\n", start, stop)
+            if cut <= start:
+                cut = text.rfind("\n", start, stop)
+            stop = cut if cut > start else stop
+        if text[start:stop].strip():
+            pieces.append((start, stop))
+        start = stop
+        while start < end and text[start] == "\n":
+            start += 1
+    return pieces
+
+
+def _chunks(text: str, max_chars: int) -> List[MarkdownSection]:
+    return [_chunk(text, i, start, end) for i, (start, end) in enumerate(split_span(text, 0, len(text), max_chars))]
+
+
+def _chunk(text: str, index: int, start: int, end: int) -> MarkdownSection:
+    return MarkdownSection(
+        level=1, title=f"Part {index + 1}", name=f"part_{index + 1}", path=f"root/part_{index + 1}",
+        start=start, end=end, text=text,
+    )
+
+
+def document_outline(text: str, max_chars: int = 4000, sections: Optional[List[MarkdownSection]] = None) -> str:
+    """Indented header titles; the deepest levels are dropped until it fits in `max_chars`."""
+    sections = [s for s in (sections or markdown_to_sections(text)) if s.level > 0]
+    if not sections:
+        return ""
+    levels = sorted({s.level for s in sections})
+    for depth in reversed(levels):
+        top = levels[0]
+        lines = ["  " * (s.level - top) + "- " + s.title for s in sections if s.level <= depth]
+        outline = "\n".join(lines)
+        if len(outline) <= max_chars:
+            return outline
+    return outline[:max_chars].rsplit("\n", 1)[0] + "\n- ..."
+
+
+def _distant_partner(
+    section: MarkdownSection, candidates: List[MarkdownSection], rng: random.Random
+) -> Optional[MarkdownSection]:
+    """A random non-overlapping section at least a quarter of the document away, else the farthest one."""
+    others = [c for c in candidates if c.end <= section.start or c.start >= section.end]
+    if not others:
+        return None
+    middle = (section.start + section.end) / 2
+    distance = {id(c): abs((c.start + c.end) / 2 - middle) for c in others}
+    far = [c for c in others if distance[id(c)] >= len(section.text) / 4]
+    return rng.choice(far) if far else max(others, key=lambda c: distance[id(c)])
+
+
+@dataclass
+class SectionPlan:
+    """Sections targeted by each question index of one prompt type, plus the document outline."""
+    outline: str
+    targets: List[Tuple[MarkdownSection, ...]]
+
+    def sections(self) -> List[MarkdownSection]:
+        """Distinct targeted sections in document order; [S1] is the first."""
+        unique = {(s.start, s.end): s for target in self.targets for s in target}
+        return [unique[key] for key in sorted(unique)]
+
+    def _labels(self) -> Dict[Tuple[int, int], str]:
+        return {(s.start, s.end): f"S{i}" for i, s in enumerate(self.sections(), start=1)}
+
+    def _render(self, sections: Iterable[MarkdownSection]) -> str:
+        labels = self._labels()
+        parts = []
+        if self.outline:
+            parts.append(f"Document outline:\n{self.outline}")
+        for s in sorted(sections, key=lambda s: s.start):
+            parts.append(f"[{labels[(s.start, s.end)]}] Excerpt: {s.title}\n\n{s.content.strip()}")
+        return "\n\n---\n\n".join(parts)
+
+    def question_context(self) -> str:
+        """System text for the question call: the outline and every targeted section."""
+        return self._render(self.sections())
+
+    def question_instructions(self) -> str:
+        """User text telling the question call which excerpt(s) each question must come from."""
+        labels = self._labels()
+        lines = [
+            f"Question {i}: " + " and ".join(f"[{labels[(s.start, s.end)]}]" for s in target)
+            for i, target in enumerate(self.targets, start=1)
+        ]
+        return (
+            "The document above is shown as an outline and excerpts. Base each question only on the "
+            "excerpt(s) listed for it, in this order:\n" + "\n".join(lines)
+        )
+
+    def answer_context(self, indices: Iterable[int]) -> str:
+        """System text for answering the questions at `indices`: the outline and their sections."""
+        unique = {(s.start, s.end): s for i in indices for s in self.targets[i]}
+        return self._render(unique.values())
+
+    def provenance(self, index: int) -> str:
+        """JSON list of the sections question `index` was generated from."""
+        return json.dumps([
+            {"title": s.title, "path": s.path, "start": s.start, "end": s.end} for s in self.targets[index]
+        ])
+
+
+def plan_sections(
+    text: str,
+    prompt_type: str,
+    num_questions: int,
+    questions_per_section: int = 2,
+    min_chars: int = 400,
+    max_chars: int = 12_000,
+    outline_chars: int = 4000,
+    sections: Optional[List[MarkdownSection]] = None,
+) -> SectionPlan:
+    """Pick ceil(num_questions / questions_per_section) sections (pairs for disjoint) and
+    assign them round-robin to the question indices."""
+    candidates = candidate_sections(text, min_chars, max_chars, sections)
+    rng = random.Random(f"{document_key(text)}:{prompt_type}")
+    count = min(len(candidates), math.ceil(num_questions / max(1, questions_per_section)))
+    pool = sorted(rng.sample(candidates, count), key=lambda s: s.start)
+
+    targets: List[Tuple[MarkdownSection, ...]] = []
+    for section in pool:
+        partner = _distant_partner(section, candidates, rng) if prompt_type in PAIRED_PROMPT_TYPES else None
+        targets.append((section,) if partner is None else tuple(sorted((section, partner), key=lambda s: s.start)))
+    if not targets:
+        # Nothing to target (an empty document); fall back to the whole text
+        whole = MarkdownSection(level=0, title="root", name="root", path="root", start=0, end=len(text), text=text)
+        targets = [(whole,)]
+    return SectionPlan(
+        outline=document_outline(text, outline_chars, sections),
+        targets=[targets[i % len(targets)] for i in range(num_questions)],
+    )
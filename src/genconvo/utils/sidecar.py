@@ -0,0 +1,210 @@
+"""
+Precomputed per-document facts, saved next to the markdown as `<name>.sidecar.json`.
+
+A sidecar holds the document hash used by journals and datasets, its length, its
+section tree (as character offsets into the text) and token counts of the
+document and of every section, per tokenizer.
+`genconvo index` writes them ahead of a run; runs and plans also create or extend
+them on first use.
+
+A sidecar is current while the markdown's size and mtime match. When they differ,
+the file is hashed through a memory map (without decoding it); an unchanged hash
+only refreshes the recorded stat, otherwise the sidecar is rebuilt.
+
+Section token counts are summed over the text between consecutive headers, so
+they can differ by a few tokens from encoding a section on its own.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..clients.usage import token_counter
+from .markdown import MarkdownSection, markdown_to_sections
+from .prompt_cache import document_key, remember_document_key
+
+# Bump when the layout or the section parser changes so old sidecars are rebuilt
+SIDECAR_VERSION = 2
+
+
+def sidecar_path(markdown_path: Path) -> Path:
+    return Path(markdown_path).with_suffix(".sidecar.json")
+
+
+def _map(path: Path):
+    """Read-only memory map of `path`, or None for an empty file (which cannot be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_markdown(path: Path) -> str:
+    """The markdown's text as runs, plans and sidecars see it (UTF-8, newlines translated)."""
+    return Path(path).read_text(encoding="utf-8")
+
+
+def _content_hash(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    mapped = _map(path)
+    if mapped is not None:
+        with mapped:
+            digest.update(mapped)
+    return digest.hexdigest()
+
+
+@dataclass
+class SectionEntry:
+    level: int
+    title: str
+    name: str
+    path: str
+    start: int
+    end: int
+
+
+@dataclass
+class DocumentSidecar:
+    markdown_size: int
+    markdown_mtime_ns: int
+    content_hash: str
+    document_hash: str
+    chars: int
+    sections: List[SectionEntry]
+    # Tokenizer name -> {"document": int, "sections": [int, ...]} (sections in `sections` order)
+    tokens: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    version: int = SIDECAR_VERSION
+
+    @classmethod
+    def build(cls, markdown_path: Path, text: Optional[str] = None) -> "DocumentSidecar":
+        markdown_path = Path(markdown_path)
+        stat = markdown_path.stat()
+        text = read_markdown(markdown_path) if text is None else text
+        sections = markdown_to_sections(text)
+        return cls(
+            markdown_size=stat.st_size,
+            markdown_mtime_ns=stat.st_mtime_ns,
+            content_hash=_content_hash(markdown_path),
+            document_hash=document_key(text),
+            chars=len(text),
+            sections=[SectionEntry(s.level, s.title, s.name, s.path, s.start, s.end) for s in sections],
+        )
+
+    def markdown_sections(self, text: str) -> List[MarkdownSection]:
+        """The section tree as MarkdownSections over `text`, without re-parsing it."""
+        return [
+            MarkdownSection(
+                level=s.level, title=s.title, name=s.name, path=s.path, start=s.start, end=s.end, text=text
+            )
+            for s in self.sections
+        ]
+
+    def document_tokens(self, tokenizer_name: str) -> Optional[int]:
+        counts = self.tokens.get(tokenizer_name)
+        return counts["document"] if counts else None
+
+    def add_tokens(self, tokenizer_name: str, tokenizer: Any, text: str) -> None:
+        """Count the document and its sections with `tokenizer`, stored under `tokenizer_name`."""
+        counter = token_counter(tokenizer)
+        # Split at every section boundary; each section's count is the sum over its pieces
+        cuts = sorted({0, len(text), *(o for s in self.sections for o in (s.start, s.end))})
+        piece_tokens = counter.count_batch([text[a:b] for a, b in zip(cuts, cuts[1:])])
+        prefix = [0]
+        for count in piece_tokens:
+            prefix.append(prefix[-1] + count)
+        position = {offset: i for i, offset in enumerate(cuts)}
+        self.tokens[tokenizer_name] = {
+            "document": counter.count(text),
+            "sections": [prefix[position[s.end]] - prefix[position[s.start]] for s in self.sections],
+        }
+
+    def is_current(self, markdown_path: Path) -> bool:
+        """Whether this describes the markdown as it is now; refreshes the stat if only it changed."""
+        if self.version != SIDECAR_VERSION:
+            return False
+        try:
+            stat = Path(markdown_path).stat()
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) == (self.markdown_size, self.markdown_mtime_ns):
+            return True
+        if stat.st_size != self.markdown_size or _content_hash(Path(markdown_path)) != self.content_hash:
+            return False
+        # Touched or copied but unchanged
+        self.markdown_mtime_ns = stat.st_mtime_ns
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "DocumentSidecar":
+        fields = dict(data)
+        fields["sections"] = [SectionEntry(**s) for s in data["sections"]]
+        return cls(**fields)
+
+    def save(self, markdown_path: Path) -> None:
+        path = sidecar_path(markdown_path)
+        # Concurrent jobs on one document may save at once; the last complete write wins
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self.to_dict()), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _read(markdown_path: Path) -> Optional[DocumentSidecar]:
+    try:
+        data = json.loads(sidecar_path(markdown_path).read_text(encoding="utf-8"))
+        return DocumentSidecar.from_dict(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_sidecar(markdown_path: Path) -> Optional[DocumentSidecar]:
+    """The saved sidecar if it is current for the markdown, else None."""
+    sidecar = _read(markdown_path)
+    return sidecar if sidecar is not None and sidecar.is_current(markdown_path) else None
+
+
+def ensure_sidecar(
+    markdown_path: Path,
+    text: Optional[str] = None,
+    tokenizers: Optional[Mapping[str, Any]] = None,
+    force: bool = False,
+) -> DocumentSidecar:
+    """The current sidecar with counts for every tokenizer in `tokenizers` (name -> tokenizer).
+
+    Builds or extends it as needed and saves it when anything changed; a read-only
+    directory only skips the save. `text` is read from the markdown only if needed.
+    """
+    markdown_path = Path(markdown_path)
+    sidecar = None if force else _read(markdown_path)
+    changed = False
+    if sidecar is not None:
+        mtime_ns = sidecar.markdown_mtime_ns
+        if sidecar.is_current(markdown_path):
+            changed = sidecar.markdown_mtime_ns != mtime_ns
+        else:
+            sidecar = None
+    if sidecar is None:
+        text = read_markdown(markdown_path) if text is None else text
+        sidecar = DocumentSidecar.build(markdown_path, text)
+        changed = True
+    for name, tokenizer in (tokenizers or {}).items():
+        if name not in sidecar.tokens:
+            text = read_markdown(markdown_path) if text is None else text
+            sidecar.add_tokens(name, tokenizer, text)
+            changed = True
+    if text is not None:
+        # Units hash the document for journal keys; give them the sidecar's hash
+        remember_document_key(text, sidecar.document_hash)
+    if changed:
+        try:
+            sidecar.save(markdown_path)
+        except OSError:
+            pass
+    return sidecar
@@ -0,0 +1,116 @@
+"""
+Captured completion tokens and top-k logprobs, stored as compact dataset columns.
+
+With capture on, each answer's completion token ids and its flattened top-k
+logprobs (`FlatTopLogprobs`) are saved next to the text columns as Arrow list
+columns: one contiguous values buffer plus int32 offsets per column, with ids as
+int32 and logprobs as float16. The dataset's Arrow file is memory-mapped when
+loaded, so `iter_token_batches` hands a training loader zero-copy NumPy views
+instead of Python lists.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from datasets import Dataset, Features, Sequence, Value
+
+from ..clients.base import ClientSample, FlatTopLogprobs, RaggedTopLogprobs
+
+# Cumulative probability kept per position when flattening top-k logprobs
+LOGPROB_THRESHOLD = 0.99
+
+CAPTURE_FEATURES = Features({
+    "token_ids": Sequence(Value("int32")),
+    "topk_token_idx": Sequence(Value("int32")),
+    "topk_token_ids": Sequence(Value("int32")),
+    "topk_logprobs": Sequence(Value("float16")),
+    "topk_num_tokens": Value("int32"),
+    "topk_k": Value("int32"),
+})
+
+
+@dataclass
+class TokenCapture:
+    """Completion token ids and flattened top-k logprobs of one answer."""
+    token_ids: np.ndarray
+    top_logprobs: Optional[FlatTopLogprobs] = None
+
+    @classmethod
+    def from_sample(cls, sample: ClientSample, threshold: float = LOGPROB_THRESHOLD) -> Optional["TokenCapture"]:
+        if sample.token_ids is None:
+            return None
+        return cls(
+            token_ids=np.asarray(sample.token_ids, dtype=np.int32),
+            top_logprobs=None if sample.top_logprobs is None else sample.top_logprobs.flatten(threshold),
+        )
+
+
+def _list_array(parts: List[Optional[np.ndarray]], dtype: str) -> pa.ListArray:
+    """One list column from per-row arrays (None -> null) without going through Python lists."""
+    lengths = np.array([0 if p is None else len(p) for p in parts], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+    present = [np.asarray(p, dtype=dtype) for p in parts if p is not None]
+    values = np.concatenate(present) if present else np.zeros(0, dtype=dtype)
+    mask = pa.array([p is None for p in parts], type=pa.bool_())
+    return pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), pa.array(values), mask=mask)
+
+
+def capture_columns(captures: List[Optional[TokenCapture]]) -> Dict[str, pa.Array]:
+    """Arrow arrays for CAPTURE_FEATURES, one row per capture."""
+    tops = [None if c is None else c.top_logprobs for c in captures]
+    return {
+        "token_ids": _list_array([None if c is None else c.token_ids for c in captures], "int32"),
+        "topk_token_idx": _list_array([None if t is None else t.token_idx for t in tops], "int32"),
+        "topk_token_ids": _list_array([None if t is None else t.token_id for t in tops], "int32"),
+        "topk_logprobs": _list_array([None if t is None else t.logprobs for t in tops], "float16"),
+        "topk_num_tokens": pa.array([None if t is None else t.shape[0] for t in tops], type=pa.int32()),
+        "topk_k": pa.array([None if t is None else t.shape[1] for t in tops], type=pa.int32()),
+    }
+
+
+@dataclass
+class TokenBatch:
+    """Capture columns of one Arrow record batch as NumPy views into the memory-mapped file.
+
+    Row r's token ids are token_ids[token_offsets[r]:token_offsets[r + 1]]; rows
+    without a capture are empty. `top_logprobs` holds the same rows' flattened
+    top-k logprobs.
+    """
+    token_ids: np.ndarray
+    token_offsets: np.ndarray
+    top_logprobs: RaggedTopLogprobs
+
+
+def _values_and_offsets(column: pa.ListArray):
+    offsets = column.offsets.to_numpy(zero_copy_only=True)
+    # A sliced column's offsets point into the middle of the shared values buffer
+    values = column.values.to_numpy(zero_copy_only=True)[offsets[0]:offsets[-1]]
+    return values, offsets - offsets[0]
+
+
+def iter_token_batches(dataset_path: str) -> Iterator[TokenBatch]:
+    """Yield the capture columns of a saved dataset, one TokenBatch per Arrow record batch."""
+    table = Dataset.load_from_disk(str(Path(dataset_path))).data.table
+    for batch in table.to_batches():
+        token_ids, token_offsets = _values_and_offsets(batch.column("token_ids"))
+        token_idx, top_offsets = _values_and_offsets(batch.column("topk_token_idx"))
+        top_ids, _ = _values_and_offsets(batch.column("topk_token_ids"))
+        logprobs, _ = _values_and_offsets(batch.column("topk_logprobs"))
+        shapes = np.stack([
+            batch.column("topk_num_tokens").fill_null(0).to_numpy(),
+            batch.column("topk_k").fill_null(0).to_numpy(),
+        ], axis=1)
+        yield TokenBatch(
+            token_ids=token_ids,
+            token_offsets=token_offsets,
+            top_logprobs=RaggedTopLogprobs(
+                token_idx=token_idx,
+                token_id=top_ids,
+                logprobs=logprobs,
+                offsets=top_offsets,
+                shapes=shapes,
+            ),
+        )
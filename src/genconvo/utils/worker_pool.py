@@ -0,0 +1,42 @@
+"""
+Process-wide worker pool shared by several GenConvo pipelines.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class SharedWorkerPool:
+    """Caps the number of in-flight provider calls across every pipeline in a process.
+
+    Each Verdict pipeline owns its own thread pool, so running several documents
+    side by side would multiply the configured worker count. Units acquire a slot
+    from this pool around each provider call instead, which keeps the total
+    concurrency at `max_workers` no matter how many jobs are active.
+    """
+
+    def __init__(self, max_workers: int):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.max_workers = max_workers
+        self._semaphore = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._active = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one worker slot for the duration of the block."""
+        self._semaphore.acquire()
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._semaphore.release()
+
+    @property
+    def active(self) -> int:
+        return self._active
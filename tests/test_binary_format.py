@@ -0,0 +1,92 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from genconvo.clients import binary_format
+
+
+def _response(content, tokens, k=3, **overrides):
+    response = {
+        "content": content,
+        "finish_reason": "stop",
+        "prompt_tokens": 11,
+        "completion_tokens": tokens,
+        "completion_ids": np.arange(tokens, dtype=np.int32),
+        "topk_ids": np.arange(tokens * k, dtype=np.int32).reshape(tokens, k),
+        "topk_logprobs": -np.linspace(0, 1, tokens * k, dtype=np.float32).reshape(tokens, k),
+    }
+    response.update(overrides)
+    return response
+
+
+def test_round_trip():
+    responses = [_response("first", 5), _response("second", 2, k=4)]
+    decoded = binary_format.decode(binary_format.encode(responses))
+
+    assert len(decoded) == 2
+    for original, result in zip(responses, decoded):
+        assert result.content == original["content"]
+        assert result.finish_reason == "stop"
+        assert result.error is None
+        assert result.prompt_tokens == 11
+        assert result.completion_tokens == original["completion_tokens"]
+        np.testing.assert_array_equal(result.completion_ids, original["completion_ids"])
+        np.testing.assert_array_equal(result.topk_ids, original["topk_ids"])
+        np.testing.assert_array_equal(result.topk_logprobs, original["topk_logprobs"])
+        assert result.topk_ids.shape == original["topk_ids"].shape
+
+
+def test_empty_sample():
+    decoded = binary_format.decode(binary_format.encode([_response("", 0), _response("after", 3)]))
+
+    assert decoded[0].content == ""
+    assert decoded[0].completion_ids.shape == (0,)
+    assert decoded[0].topk_ids.shape == (0, 3)
+    np.testing.assert_array_equal(decoded[1].completion_ids, [0, 1, 2])
+
+
+def test_sample_without_logprobs():
+    decoded = binary_format.decode(
+        binary_format.encode([_response("plain", 4, topk_ids=None, topk_logprobs=None)])
+    )
+
+    np.testing.assert_array_equal(decoded[0].completion_ids, [0, 1, 2, 3])
+    assert decoded[0].topk_ids is None
+    assert decoded[0].topk_logprobs is None
+
+
+def test_failed_request():
+    decoded = binary_format.decode(binary_format.encode([
+        {"error": "out of memory"},
+        _response("ok", 1),
+    ]))
+
+    assert decoded[0].error == "out of memory"
+    assert decoded[0].content is None
+    assert decoded[0].completion_ids is None
+    assert decoded[0].prompt_tokens == 0
+    assert decoded[1].content == "ok"
+
+
+def test_empty_batch():
+    assert binary_format.decode(binary_format.encode([])) == []
+
+
+def test_arrays_are_aligned_views_into_the_payload():
+    payload = binary_format.encode([_response("a", 3), _response("bb", 5)])
+    (header_len,) = struct.unpack_from("<I", payload, 4)
+    header = json.loads(payload[8:8 + header_len])
+
+    for entry in header["responses"]:
+        for field in ("completion_ids", "topk_ids", "topk_logprobs"):
+            assert entry[field][0] % 8 == 0
+    decoded = binary_format.decode(payload)
+    assert not decoded[0].completion_ids.flags.owndata
+    assert not decoded[0].completion_ids.flags.writeable
+
+
+def test_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        binary_format.decode(b"\x80\x04]\x94.")
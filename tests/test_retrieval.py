@@ -0,0 +1,173 @@
+import json
+
+import numpy as np
+
+from genconvo.clients.usage import token_counter
+from genconvo.utils import retrieval
+from genconvo.utils.retrieval import BM25Index, DocumentRetriever, RetrievalConfig, index_path, load_or_build_index
+
+
+def _section(title, sentence, repeat):
+    return f"# {title}\n\n" + " ".join([sentence] * repeat) + "\n\n"
+
+
+DOCUMENT = (
+    _section("Revenue", "Net revenue from cloud subscriptions grew in every region.", 40)
+    + _section("Employees", "Headcount in engineering and sales rose after the hiring plan.", 40)
+    + _section("Litigation", "The patent lawsuit against the company was settled out of court.", 40)
+    + _section("Dividends", "The board approved a quarterly dividend for shareholders.", 4)
+)
+
+
+def _retriever(text=DOCUMENT, **config):
+    return DocumentRetriever(
+        text, BM25Index.build(text), RetrievalConfig(**config), token_counter(None)
+    )
+
+
+def test_build_indexes_each_section():
+    index = BM25Index.build(DOCUMENT)
+
+    assert index.headings == ["Revenue", "Employees", "Litigation", "Dividends"]
+    assert index.document_hash == retrieval.document_key(DOCUMENT)
+    litigation = index.headings.index("Litigation")
+    assert index.contains(litigation, "lawsuit")
+    assert not index.contains(litigation, "dividend")
+    assert int(np.argmax(index.score(retrieval.terms("Who settled the patent lawsuit?")))) == litigation
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(DOCUMENT)
+    path = tmp_path / "doc.bm25.npz"
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert loaded.document_hash == index.document_hash
+    assert loaded.headings == index.headings
+    assert loaded.vocabulary == index.vocabulary
+    for field in ("starts", "ends", "lengths", "indptr", "postings", "frequencies"):
+        np.testing.assert_array_equal(getattr(loaded, field), getattr(index, field))
+    query = retrieval.terms("quarterly dividend for shareholders")
+    np.testing.assert_allclose(loaded.score(query), index.score(query))
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_load_rejects_missing_corrupt_and_old_indexes(tmp_path, monkeypatch):
+    path = tmp_path / "doc.bm25.npz"
+    assert BM25Index.load(path) is None
+    path.write_bytes(b"not an index")
+    assert BM25Index.load(path) is None
+
+    BM25Index.build(DOCUMENT).save(path)
+    monkeypatch.setattr(retrieval, "INDEX_VERSION", retrieval.INDEX_VERSION + 1)
+    assert BM25Index.load(path) is None
+
+
+def test_load_or_build_reuses_current_index(tmp_path):
+    markdown = tmp_path / "doc.md"
+    markdown.write_text(DOCUMENT)
+    load_or_build_index(markdown, DOCUMENT)
+    saved = index_path(markdown)
+    assert saved.exists()
+
+    # A current index is loaded as is, even if it was saved with a different passage layout
+    with np.load(saved) as data:
+        arrays = dict(data)
+    arrays["headings"] = np.array(["Saved"] * len(arrays["headings"]), dtype=str)
+    np.savez(saved, **arrays)
+    assert load_or_build_index(markdown, DOCUMENT).headings[0] == "Saved"
+
+
+def test_load_or_build_rebuilds_stale_index(tmp_path, monkeypatch):
+    markdown = tmp_path / "doc.md"
+    load_or_build_index(markdown, DOCUMENT)
+    edited = DOCUMENT + _section("Outlook", "Guidance for next year assumes flat margins.", 4)
+
+    # Another document hash: rebuilt for the edited text and saved over the old index
+    index = load_or_build_index(markdown, edited)
+    assert index.headings[-1] == "Outlook"
+    assert BM25Index.load(index_path(markdown)).document_hash == retrieval.document_key(edited)
+
+    # Another index version: rebuilt even though the document is unchanged
+    monkeypatch.setattr(retrieval, "INDEX_VERSION", retrieval.INDEX_VERSION + 1)
+    with np.load(index_path(markdown)) as data:
+        meta = json.loads(str(data["meta"]))
+    assert meta["version"] == retrieval.INDEX_VERSION - 1
+    assert load_or_build_index(markdown, edited).headings == index.headings
+    with np.load(index_path(markdown)) as data:
+        assert json.loads(str(data["meta"]))["version"] == retrieval.INDEX_VERSION
+
+
+def test_retrieves_matching_passage():
+    retriever = _retriever(token_budget=1000)
+    result = retriever.retrieve("Who settled the patent lawsuit?")
+
+    assert not result.fallback
+    assert retriever.index.headings[result.passages[0]] == "Litigation"
+    assert result.coverage >= 0.6
+    context = retriever.context(["Who settled the patent lawsuit?"])
+    assert context.startswith("Excerpt: Litigation")
+    assert "cloud subscriptions" not in context
+
+
+def test_falls_back_below_min_coverage():
+    question = "Did the patent lawsuit affect the merger with Initech?"
+    retriever = _retriever(token_budget=1000, min_coverage=0.6)
+    result = retriever.retrieve(question)
+
+    # The lawsuit passage is found, but "merger" and "initech" are in no passage
+    assert result.passages
+    assert 0 < result.coverage < 0.6
+    assert result.fallback
+    assert retriever.context([question]) == DOCUMENT
+    assert retriever.provenance(question) == ""
+    assert retriever.stats()["fallbacks"] == 1
+
+    assert not _retriever(token_budget=1000, min_coverage=result.coverage).retrieve(question).fallback
+
+
+def test_falls_back_when_nothing_matches():
+    result = _retriever(token_budget=1000).retrieve("What is the capital of France?")
+
+    assert result.passages == []
+    assert result.fallback
+
+
+def test_short_document_is_sent_whole():
+    retriever = _retriever(token_budget=10_000)
+    result = retriever.retrieve("Who settled the patent lawsuit?")
+
+    assert result.fallback
+    assert result.tokens == retriever.document_tokens
+
+
+def test_token_budget_skips_passages_that_do_not_fit():
+    question = "Was the quarterly dividend for shareholders approved before the lawsuit?"
+    retriever = _retriever(token_budget=1000)
+    by_heading = {h: i for i, h in enumerate(retriever.index.headings)}
+    litigation, dividends = by_heading["Litigation"], by_heading["Dividends"]
+    scores = retriever.index.score(retrieval.terms(question))
+    assert scores[dividends] > scores[litigation] > 0
+
+    both = retriever.retrieve(question)
+    assert both.passages == sorted([litigation, dividends])
+    assert both.tokens == retriever._passage_tokens[litigation] + retriever._passage_tokens[dividends]
+
+    # The best passage fills the budget; the next one no longer fits and is skipped
+    budget = retriever._passage_tokens[dividends] + retriever._passage_tokens[litigation] - 1
+    tight = _retriever(token_budget=budget).retrieve(question)
+    assert tight.passages == [dividends]
+    assert tight.tokens <= budget
+
+    # A lower-ranked passage that fits is still kept after a bigger one is skipped
+    question = "Was the patent lawsuit settled out of court before the dividend?"
+    scores = retriever.index.score(retrieval.terms(question))
+    assert scores[litigation] > scores[dividends] > 0
+    budget = retriever._passage_tokens[dividends]
+    assert budget < retriever._passage_tokens[litigation]
+    assert _retriever(token_budget=budget, min_coverage=0).retrieve(question).passages == [dividends]
+
+def test_top_k_limits_passages():
+    question = "Did revenue, headcount, the lawsuit and the dividend all change?"
+    assert len(_retriever(token_budget=1000, min_coverage=0).retrieve(question).passages) > 1
+    assert len(_retriever(token_budget=1000, top_k=1, min_coverage=0).retrieve(question).passages) == 1
@@ -0,0 +1,162 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from genconvo.clients.base import ClientResponse, ClientSample
+from genconvo.clients.routing import ConsistentHashRing
+from genconvo.clients.tokasaurus import MultiTokasaurusClient, ServerUnreachableError, TokasaurusClient
+from genconvo.clients.usage import Usage
+
+NODES = [f"http://replica-{i}:8080" for i in range(4)]
+KEYS = [f"document-{i}" for i in range(2000)]
+
+
+def test_same_key_goes_to_same_node():
+    ring = ConsistentHashRing(NODES)
+    rebuilt = ConsistentHashRing(reversed(NODES))
+
+    for key in KEYS:
+        assert ring.get(key) == ring.get(key) == rebuilt.get(key)
+        assert ring.preference(key) == rebuilt.preference(key)
+
+
+def test_keys_spread_over_nodes():
+    counts = Counter(ConsistentHashRing(NODES).get(key) for key in KEYS)
+
+    assert set(counts) == set(NODES)
+    assert min(counts.values()) > len(KEYS) / len(NODES) / 2
+
+
+def test_removing_node_moves_only_its_keys():
+    ring = ConsistentHashRing(NODES)
+    before = {key: ring.get(key) for key in KEYS}
+    ring.remove(NODES[1])
+
+    for key, owner in before.items():
+        if owner == NODES[1]:
+            assert ring.get(key) == ConsistentHashRing(NODES).preference(key)[1]
+        else:
+            assert ring.get(key) == owner
+
+
+def test_adding_node_takes_keys_only_for_itself():
+    ring = ConsistentHashRing(NODES[:3])
+    before = {key: ring.get(key) for key in KEYS}
+    ring.add(NODES[3])
+
+    moved = [key for key in KEYS if ring.get(key) != before[key]]
+    assert moved
+    assert all(ring.get(key) == NODES[3] for key in moved)
+
+
+def test_preference_lists_every_node_once():
+    ring = ConsistentHashRing(NODES)
+
+    for key in KEYS[:50]:
+        preference = ring.preference(key)
+        assert preference[0] == ring.get(key)
+        assert sorted(preference) == sorted(NODES)
+
+
+def test_empty_ring():
+    ring = ConsistentHashRing()
+
+    assert not ring
+    assert ring.get("document") is None
+    assert ring.preference("document") == []
+
+
+def _sample(text):
+    return ClientSample(text=text, token_ids=None, top_logprobs=None)
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """Replicas served in-process: urls in `down` are unreachable, `calls` lists the urls tried."""
+    state = {"down": set(), "calls": []}
+
+    async def chat(self, chats, max_completion_tokens, modal_upstream_id=None, **kwargs):
+        state["calls"].append(self.config.url)
+        if self.config.url in state["down"]:
+            raise ServerUnreachableError(f"{self.config.url} did not answer")
+        return ClientResponse(
+            samples=[_sample(self.config.url) for _ in chats], usage=Usage(prompt_tokens=0, completion_tokens=0)
+        )
+
+    async def chat_stream(self, chats, max_completion_tokens, modal_upstream_id=None, **kwargs):
+        state["calls"].append(self.config.url)
+        for i in range(len(chats)):
+            if self.config.url in state["down"]:
+                raise ServerUnreachableError(f"{self.config.url} did not answer")
+            yield i, _sample(self.config.url)
+            if self.config.url in state.get("drops_after_first", ()):
+                state["down"].add(self.config.url)
+
+    monkeypatch.setattr(TokasaurusClient, "chat", chat)
+    monkeypatch.setattr(TokasaurusClient, "chat_stream", chat_stream)
+    return state
+
+
+def _client(on_failure="raise"):
+    # model_name "default" skips the served-model check, so no server is needed
+    return MultiTokasaurusClient(MultiTokasaurusClient.Config(
+        model_name="default", urls=NODES, on_failure=on_failure, health_check_interval=3600,
+    ))
+
+
+CHATS = [[{"role": "system", "content": "document"}, {"role": "user", "content": f"q{i}"}] for i in range(3)]
+
+
+def test_batches_for_one_document_stay_on_one_replica(replicas):
+    client = _client()
+    owner = client.ring.get(client._routing_key(CHATS, None))
+
+    for _ in range(3):
+        response = asyncio.run(client.chat(CHATS, 16))
+        assert [s.text for s in response.samples] == [owner] * len(CHATS)
+    assert replicas["calls"] == [owner] * 3
+
+
+def test_fails_over_to_next_replica(replicas):
+    client = _client()
+    preference = client.ring.preference(client._routing_key(CHATS, None))
+    replicas["down"].add(preference[0])
+
+    response = asyncio.run(client.chat(CHATS, 16))
+
+    assert [s.text for s in response.samples] == [preference[1]] * len(CHATS)
+    assert replicas["calls"] == preference[:2]
+    assert preference[0] not in client.ring
+    assert client.pool_stats()["failovers"] == 1
+
+    # The next batch goes straight to the new owner
+    asyncio.run(client.chat(CHATS, 16))
+    assert replicas["calls"][-1] == preference[1]
+
+
+def test_all_replicas_down(replicas):
+    replicas["down"].update(NODES)
+
+    with pytest.raises(Exception, match="any Tokasaurus replica") as excinfo:
+        asyncio.run(_client(on_failure="raise").chat(CHATS, 16))
+    assert isinstance(excinfo.value.__cause__, ServerUnreachableError)
+
+    response = asyncio.run(_client(on_failure="continue").chat(CHATS, 16))
+    assert [s.text for s in response.samples] == [""] * len(CHATS)
+
+
+def test_stream_fails_over_only_before_first_sample(replicas):
+    async def collect(client):
+        return [item async for item in client.chat_stream(CHATS, 16)]
+
+    client = _client()
+    preference = client.ring.preference(client._routing_key(CHATS, None))
+    replicas["down"].add(preference[0])
+    items = asyncio.run(collect(client))
+    assert [(i, s.text) for i, s in items] == [(i, preference[1]) for i in range(len(CHATS))]
+
+    # Samples already handed out cannot be taken back, so a replica dying mid-stream raises
+    replicas["drops_after_first"] = {preference[1]}
+    with pytest.raises(ServerUnreachableError):
+        asyncio.run(collect(client))